@@ -0,0 +1,98 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import msgspec
+
+from capture_pack import PACK_SUFFIX
+
+CAPTURE_INDEX_FILENAME = 'capture_index.msgpack'
+
+# Collection directories are listed in parallel to hide the latency of the NAS
+SCAN_WORKERS = 32
+
+# Listings of directories modified this shortly before they were scanned are
+# not trusted, as a change within the same mtime tick would go unnoticed
+RACY_MTIME_NS = 2 * 1000 * 1000 * 1000
+
+
+class CollectionListing(msgspec.Struct, kw_only=True, frozen=True):
+    mtime_ns: int
+    scanned_ns: int
+    subdirs: list[str]
+
+
+class CaptureIndex(msgspec.Struct, kw_only=True, frozen=True):
+    """
+    Subdirectories of every collection directory in a disk captures
+    directory, with packed captures listed under the name of the directory
+    they were packed from.  A listing stays valid as long as the mtime of
+    its collection directory does not change, which happens whenever a
+    capture, pack or _parsed directory is added, removed or renamed in it.
+    """
+    collections: dict[str, CollectionListing]
+
+
+def read_capture_index(disk_captures_dir: Path) -> CaptureIndex | None:
+    """Read the capture index, or None if there is none or it can't be read."""
+    try:
+        with open(disk_captures_dir / CAPTURE_INDEX_FILENAME, 'rb') as f:
+            return msgspec.msgpack.decode(f.read(), type=CaptureIndex)
+    except (FileNotFoundError, msgspec.DecodeError):
+        return None
+
+
+def write_capture_index(disk_captures_dir: Path, capture_index: CaptureIndex) -> None:
+    """Atomically write the capture index."""
+    tmp_path = disk_captures_dir / f"{CAPTURE_INDEX_FILENAME}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(msgspec.msgpack.encode(capture_index))
+    os.replace(tmp_path, disk_captures_dir / CAPTURE_INDEX_FILENAME)
+
+
+def is_collection_directory_name(name: str) -> bool:
+    """Hidden directories, such as the content store, are not collections."""
+    return not name.startswith('.')
+
+
+def _list_collection(entry: os.DirEntry, previous: CollectionListing | None) -> CollectionListing:
+    mtime_ns = entry.stat().st_mtime_ns
+    if previous is not None and previous.mtime_ns == mtime_ns and previous.scanned_ns - mtime_ns > RACY_MTIME_NS:
+        return previous
+
+    scanned_ns = time.time_ns()
+    with os.scandir(entry.path) as it:
+        # Hidden entries are work in progress, such as captures being unpacked
+        subdirs = sorted({subentry.name.removesuffix(PACK_SUFFIX) for subentry in it
+                          if not subentry.name.startswith('.')
+                          and (subentry.is_dir() or subentry.name.endswith(PACK_SUFFIX))})
+    return CollectionListing(mtime_ns=mtime_ns, scanned_ns=scanned_ns, subdirs=subdirs)
+
+
+def scan_capture_directories(disk_captures_dir: Path, workers: int = SCAN_WORKERS, use_index: bool = True) -> list[Path]:
+    """
+    List the subdirectories and packed captures of all collection
+    directories in sorted order.  Packed captures are returned as the path
+    of the directory they were packed from.
+
+    Directory types come from scandir, so only the collection directories
+    themselves are stat'ed.  Collections whose mtime matches the capture
+    index are not listed again.
+    """
+    capture_index = read_capture_index(disk_captures_dir) if use_index else None
+    previous = capture_index.collections if capture_index is not None else {}
+
+    with os.scandir(disk_captures_dir) as it:
+        entries = sorted((entry for entry in it if entry.is_dir() and is_collection_directory_name(entry.name)),
+                         key=lambda entry: entry.name)
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        listings = list(ex.map(lambda entry: _list_collection(entry, previous.get(entry.name)), entries))
+
+    collections = {entry.name: listing for entry, listing in zip(entries, listings)}
+    if use_index and collections != previous:
+        write_capture_index(disk_captures_dir, CaptureIndex(collections=collections))
+
+    return [disk_captures_dir / collection / subdir
+            for collection, listing in collections.items() for subdir in listing.subdirs]
@@ -0,0 +1,285 @@
+# Single file container for capture directories.  Shares and backups handle
+# one file much better than the ~164 small track files of a capture.
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import struct
+import tempfile
+
+import click
+import msgspec
+
+from leases import try_acquire_lease
+
+PACK_SUFFIX = '.hxcpack'
+
+# The header points at the index, which is written after the files
+PACK_MAGIC = b'HHCAPACK'
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct('<8sIQQ')  # magic, version, index offset, index size
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class PackedFile(msgspec.Struct, kw_only=True, frozen=True):
+    name: str
+    offset: int
+    size: int
+    mtime_ns: int
+    """Modification time of the file before it was packed, restored when unpacking."""
+    sha256: str
+
+
+class PackIndex(msgspec.Struct, kw_only=True, frozen=True):
+    files: list[PackedFile]
+
+
+def get_capture_pack_path(capture_dir: Path) -> Path:
+    """Packed captures take the place of their directory, with PACK_SUFFIX added."""
+    return capture_dir.with_name(capture_dir.name + PACK_SUFFIX)
+
+
+class CapturePack:
+    """Reads single files of a packed capture through their byte ranges."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        try:
+            magic, version, index_offset, index_size = PACK_HEADER.unpack(os.pread(self.fd, PACK_HEADER.size, 0))
+            if magic != PACK_MAGIC:
+                raise ValueError(f"{path} is not a packed capture")
+            if version != PACK_VERSION:
+                raise ValueError(f"{path} has unsupported version {version}")
+            index = msgspec.msgpack.decode(os.pread(self.fd, index_size, index_offset), type=PackIndex)
+        except (ValueError, struct.error, msgspec.DecodeError):
+            os.close(self.fd)
+            raise
+        self.files = {packed_file.name: packed_file for packed_file in index.files}
+
+    def __enter__(self) -> 'CapturePack':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def names(self) -> list[str]:
+        return list(self.files)
+
+    def read(self, name: str) -> bytes:
+        packed_file = self.files[name]
+        data = os.pread(self.fd, packed_file.size, packed_file.offset)
+        if len(data) != packed_file.size:
+            raise ValueError(f"{name} is truncated in {self.path}")
+        return data
+
+    def verify(self) -> None:
+        """Check every file against its hash, raising ValueError on a mismatch."""
+        for name, packed_file in self.files.items():
+            if hashlib.sha256(self.read(name)).hexdigest() != packed_file.sha256:
+                raise ValueError(f"{name} is corrupted in {self.path}")
+
+    def extract(self, output_dir: Path, names: list[str] | None = None) -> None:
+        """Write files into output_dir, with their original modification times."""
+        for name in self.names() if names is None else names:
+            path = output_dir / name
+            with open(path, 'wb') as f:
+                f.write(self.read(name))
+            os.utime(path, ns=(self.files[name].mtime_ns, self.files[name].mtime_ns))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class CaptureDirectory:
+    """Reads the files of a capture directory, with the same interface as CapturePack."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def __enter__(self) -> 'CaptureDirectory':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def names(self) -> list[str]:
+        with os.scandir(self.path) as it:
+            return [entry.name for entry in it if entry.is_file()]
+
+    def read(self, name: str) -> bytes:
+        with open(self.path / name, 'rb') as f:
+            return f.read()
+
+    def close(self) -> None:
+        pass
+
+
+def is_packed_capture(capture_dir: Path) -> bool:
+    """Check whether a capture directory was replaced by its pack."""
+    return not os.path.isdir(capture_dir) and os.path.exists(get_capture_pack_path(capture_dir))
+
+
+def open_capture(capture: Path) -> CapturePack | CaptureDirectory:
+    """
+    Open a capture given its directory, the path its directory had before
+    it was packed, or its pack.  The directory is preferred while both exist.
+    """
+    if capture.name.endswith(PACK_SUFFIX):
+        return CapturePack(capture)
+    if is_packed_capture(capture):
+        return CapturePack(get_capture_pack_path(capture))
+    return CaptureDirectory(capture)
+
+
+@contextmanager
+def open_capture_directory(capture_dir: Path) -> Iterator[Path]:
+    """
+    Get a directory with the files of a capture for tools which need real
+    files, unpacking a packed capture into a temporary directory.
+    """
+    if not is_packed_capture(capture_dir):
+        yield capture_dir
+        return
+
+    with tempfile.TemporaryDirectory(prefix=f"{capture_dir.name}_") as tmp_dir:
+        with CapturePack(get_capture_pack_path(capture_dir)) as pack:
+            pack.extract(Path(tmp_dir))
+        yield Path(tmp_dir)
+
+
+def pack_capture(capture_dir: Path) -> Path:
+    """Pack the files of a capture directory, returning the path of the pack."""
+    pack_path = get_capture_pack_path(capture_dir)
+    tmp_path = pack_path.with_name(f"{pack_path.name}.{os.getpid()}.tmp")
+
+    with os.scandir(capture_dir) as it:
+        entries = sorted((entry for entry in it if entry.is_file()), key=lambda entry: entry.name)
+
+    files: list[PackedFile] = []
+    with open(tmp_path, 'wb') as f_pack:
+        f_pack.write(bytes(PACK_HEADER.size))
+        for entry in entries:
+            offset = f_pack.tell()
+            digest = hashlib.sha256()
+            with open(entry.path, 'rb') as f:
+                while chunk := f.read(COPY_BUFFER_SIZE):
+                    digest.update(chunk)
+                    f_pack.write(chunk)
+            files.append(PackedFile(
+                name=entry.name,
+                offset=offset,
+                size=f_pack.tell() - offset,
+                mtime_ns=entry.stat().st_mtime_ns,
+                sha256=digest.hexdigest(),
+            ))
+
+        index = msgspec.msgpack.encode(PackIndex(files=files))
+        index_offset = f_pack.tell()
+        f_pack.write(index)
+        f_pack.seek(0)
+        f_pack.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, index_offset, len(index)))
+        f_pack.flush()
+        os.fsync(f_pack.fileno())
+
+    os.replace(tmp_path, pack_path)
+    return pack_path
+
+
+def unpack_capture(pack_path: Path) -> Path:
+    """
+    Unpack a packed capture into the directory it was packed from, returning
+    that directory.  It is unpacked under a hidden name first, so it is not
+    taken for a capture before it is complete.
+    """
+    capture_dir = pack_path.with_name(pack_path.name.removesuffix(PACK_SUFFIX))
+    tmp_dir = capture_dir.with_name(f".{capture_dir.name}.{os.getpid()}.tmp")
+    tmp_dir.mkdir()
+    try:
+        with CapturePack(pack_path) as pack:
+            pack.verify()
+            pack.extract(tmp_dir)
+        os.rename(tmp_dir, capture_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir)
+        raise
+    return capture_dir
+
+
+@click.group()
+def main():
+    """Pack capture directories into single files and back."""
+
+
+@main.command()
+@click.argument(
+    'capture_dirs',
+    nargs=-1,
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path)
+)
+@click.option(
+    '--remove',
+    is_flag=True,
+    help='Remove every capture directory once its pack has been written and verified'
+)
+def pack(capture_dirs: tuple[Path, ...], remove: bool):
+    """Pack capture directories into .hxcpack files next to them.
+
+    CAPTURE_DIRS: Directories containing the .hxcstream files of one capture each
+    """
+    for capture_dir in capture_dirs:
+        capture_dir = capture_dir.resolve()
+        if capture_dir.name.endswith(("_parsed", "_parsed_wip", "_parsed_old")):
+            raise click.BadParameter(f"{capture_dir.name} is not a capture directory", param_hint='CAPTURE_DIRS')
+        if not remove:
+            pack_path = pack_capture(capture_dir)
+            print(f"Packed {capture_dir.name} into {pack_path.name}")
+            continue
+
+        # The directory must not disappear under a conversion reading it
+        lease = try_acquire_lease(capture_dir)
+        if lease is None:
+            print(f"Skipping {capture_dir.name}, it is being converted")
+            continue
+        try:
+            pack_path = pack_capture(capture_dir)
+            with os.scandir(capture_dir) as it:
+                current = {entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns) for entry in it if entry.is_file()}
+            with CapturePack(pack_path) as packed:
+                packed.verify()
+                if current != {name: (f.size, f.mtime_ns) for name, f in packed.files.items()}:
+                    raise click.ClickException(f"{capture_dir.name} changed while it was packed, keeping it")
+            shutil.rmtree(capture_dir)
+        finally:
+            lease.release()
+        print(f"Packed {capture_dir.name} into {pack_path.name}")
+
+
+@main.command()
+@click.argument(
+    'pack_paths',
+    nargs=-1,
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path)
+)
+@click.option(
+    '--remove',
+    is_flag=True,
+    help='Remove every pack once it has been unpacked'
+)
+def unpack(pack_paths: tuple[Path, ...], remove: bool):
+    """Unpack packed captures into the directories they were packed from.
+
+    PACK_PATHS: Packed captures
+    """
+    for pack_path in pack_paths:
+        capture_dir = unpack_capture(pack_path)
+        if remove:
+            pack_path.unlink()
+        print(f"Unpacked {pack_path.name} into {capture_dir.name}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+from capture_index import is_collection_directory_name, scan_capture_directories
+from capture_pack import PACK_SUFFIX, get_capture_pack_path
+
+# A capture is converted once none of its files changed for this long
+SETTLE_SECONDS = 60
+
+# Full rescans of the disk captures directory, inotify only makes new captures show up sooner
+POLL_SECONDS = 30
+
+# How often captures which are still being uploaded are checked again
+SETTLE_CHECK_SECONDS = 5
+
+# How long a capture whose conversion failed is left alone before it is tried again
+RETRY_SECONDS = 10 * 60
+
+IN_CREATE = 0x00000100
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+CaptureSignature = tuple[tuple[str, int, int], ...]
+
+
+def is_capture_directory_name(name: str) -> bool:
+    return not name.startswith('.') and not name.endswith(("_parsed", "_parsed_wip", "_parsed_old"))
+
+
+def get_capture_signature(capture_dir: Path) -> CaptureSignature | None:
+    """
+    Get the names, sizes and mtimes of the files in a capture directory, or
+    of its pack if it was uploaded packed, or None if it is gone.
+    """
+    try:
+        with os.scandir(capture_dir) as it:
+            stats = [(entry.name, entry.stat()) for entry in it]
+    except FileNotFoundError:
+        pack_path = get_capture_pack_path(capture_dir)
+        try:
+            stats = [(pack_path.name, os.stat(pack_path))]
+        except FileNotFoundError:
+            return None
+    return tuple(sorted((name, stat.st_size, stat.st_mtime_ns) for name, stat in stats))
+
+
+def is_capture_settled(capture_dir: Path, settle_seconds: float = SETTLE_SECONDS) -> bool:
+    """Check whether nothing in a capture directory or pack changed for settle_seconds."""
+    signature = get_capture_signature(capture_dir)
+    if not signature:
+        return False
+    mtimes_ns = [mtime_ns for _, _, mtime_ns in signature]
+    try:
+        mtimes_ns.append(os.stat(capture_dir).st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return time.time_ns() - max(mtimes_ns) >= settle_seconds * 1e9
+
+
+class Inotify:
+    """Minimal inotify binding through ctypes."""
+
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches: dict[int, Path] = {}
+
+    def add_watch(self, path: Path, mask: int) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        self.watches[wd] = path
+
+    def read(self, timeout: float) -> list[tuple[Path | None, int, str]]:
+        """
+        Wait up to timeout seconds and return the (directory, mask, name)
+        of the events which arrived.  The directory is None for a queue overflow.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events: list[tuple[Path | None, int, str]] = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+            offset += name_length
+            events.append((self.watches.get(wd) if not mask & IN_Q_OVERFLOW else None, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class CaptureWatcher:
+    """
+    Waits for new capture directories in a disk captures directory and
+    returns them once they have settled, so half uploaded captures are
+    never converted.
+
+    New directories are found by rescanning every poll_seconds.  Where
+    inotify is available the root and collection directories are watched
+    as well, so new captures are noticed right away.  inotify does not see
+    changes made by other NFS clients, so the rescans are always kept.
+    """
+
+    def __init__(self, disk_captures_dir: Path, known_captures: set[Path], settle_seconds: float = SETTLE_SECONDS,
+                 poll_seconds: float = POLL_SECONDS, use_inotify: bool = True, use_capture_index: bool = True) -> None:
+        self.disk_captures_dir = disk_captures_dir
+        self.known_captures = set(known_captures)
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.use_capture_index = use_capture_index
+        self.pending: dict[Path, tuple[CaptureSignature | None, float]] = {}
+        self.retry_at: dict[Path, float] = {}
+        self.next_poll = 0.0
+
+        self.inotify: Inotify | None = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+                self.inotify.add_watch(disk_captures_dir, IN_CREATE | IN_MOVED_TO)
+                with os.scandir(disk_captures_dir) as it:
+                    for entry in it:
+                        if entry.is_dir() and is_collection_directory_name(entry.name):
+                            self.inotify.add_watch(Path(entry.path), IN_CREATE | IN_MOVED_TO)
+            except (OSError, AttributeError) as e:
+                print(f"inotify is not available, polling every {poll_seconds}s: {e}")
+                self.close()
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def retry_later(self, capture_dir: Path, retry_seconds: float = RETRY_SECONDS) -> None:
+        """Return a capture whose conversion failed once it has settled again after retry_seconds."""
+        self.known_captures.discard(capture_dir)
+        self.retry_at[capture_dir] = time.monotonic() + retry_seconds
+
+    def _add_candidate(self, capture_dir: Path) -> None:
+        if capture_dir in self.known_captures or capture_dir in self.pending:
+            return
+        if capture_dir in self.retry_at:
+            if time.monotonic() < self.retry_at[capture_dir]:
+                return
+            del self.retry_at[capture_dir]
+        if not is_capture_directory_name(capture_dir.name):
+            return
+        self.pending[capture_dir] = (None, time.monotonic())
+
+    def _poll(self) -> None:
+        for capture_dir in scan_capture_directories(self.disk_captures_dir, use_index=self.use_capture_index):
+            self._add_candidate(capture_dir)
+
+    def _handle_inotify_events(self, timeout: float) -> None:
+        assert self.inotify is not None
+        for directory, mask, name in self.inotify.read(timeout):
+            if directory is None:
+                # Events were lost, fall back to a full rescan
+                self.next_poll = 0.0
+            elif not mask & IN_ISDIR:
+                if directory != self.disk_captures_dir and name.endswith(PACK_SUFFIX):
+                    self._add_candidate(directory / name.removesuffix(PACK_SUFFIX))
+            elif directory == self.disk_captures_dir:
+                if not is_collection_directory_name(name):
+                    continue
+                collection_dir = directory / name
+                try:
+                    self.inotify.add_watch(collection_dir, IN_CREATE | IN_MOVED_TO)
+                except OSError as e:
+                    print(f"Can't watch {collection_dir}, it will be found by polling: {e}")
+                # Captures created before the watch was added
+                try:
+                    with os.scandir(collection_dir) as it:
+                        for entry in it:
+                            if entry.is_dir() or entry.name.endswith(PACK_SUFFIX):
+                                self._add_candidate(collection_dir / entry.name.removesuffix(PACK_SUFFIX))
+                except FileNotFoundError:
+                    pass
+            else:
+                self._add_candidate(directory / name)
+
+    def _take_settled(self) -> list[Path]:
+        now = time.monotonic()
+        settled: list[Path] = []
+        for capture_dir, (previous_signature, changed_at) in list(self.pending.items()):
+            signature = get_capture_signature(capture_dir)
+            if signature is None:
+                del self.pending[capture_dir]
+            elif signature != previous_signature:
+                self.pending[capture_dir] = (signature, now)
+            elif signature and now - changed_at >= self.settle_seconds:
+                del self.pending[capture_dir]
+                self.known_captures.add(capture_dir)
+                settled.append(capture_dir)
+        return sorted(settled)
+
+    def wait(self) -> list[Path]:
+        """Block until at least one new capture has settled and return the settled captures."""
+        next_settle_check = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= self.next_poll:
+                self._poll()
+                self.next_poll = now + self.poll_seconds
+
+            if self.pending and now >= next_settle_check:
+                settled = self._take_settled()
+                if settled:
+                    return settled
+                next_settle_check = now + SETTLE_CHECK_SECONDS
+
+            timeout = self.next_poll - now
+            if self.pending:
+                timeout = min(timeout, max(0.0, next_settle_check - now))
+
+            if self.inotify is not None:
+                self._handle_inotify_events(timeout)
+            else:
+                time.sleep(timeout)
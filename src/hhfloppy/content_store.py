@@ -0,0 +1,200 @@
+# Deduplicated and compressed storage of conversion outputs.  Identical
+# outputs, such as RAW_IMG and RAW_LOADER of most disks, are hardlinks to a
+# single copy in a content store shared by all _parsed directories.
+
+from compression import zstd
+import hashlib
+import os
+from pathlib import Path
+import shutil
+from typing import BinaryIO
+
+import click
+
+from conversion_manifest import CONVERSION_MANIFEST_FILENAME
+from leases import try_acquire_lease
+
+# Next to the collection directories, hidden so it is not taken for one
+CONTENT_STORE_DIRNAME = '.content_store'
+
+# Rarely read outputs, which are stored compressed with COMPRESSED_SUFFIX
+# added.  They are read through open_output, which decompresses them.
+# GENERIC_XML.xml is read by every summary, so it is kept uncompressed.
+COMPRESSED_FILENAMES = ['HXC_HFE.hfe', 'HXC_HFEV3.hfe', 'HXC_EXTHFE.hfe']
+COMPRESSED_SUFFIX = '.zst'
+
+# Outputs are compressed once and read rarely, decompression is fast at any level
+ZSTD_LEVEL = 10
+
+# Logs are appended to, so they must not be shared
+SKIPPED_FILENAMES = [CONVERSION_MANIFEST_FILENAME, 'stdout.txt', 'stderr.txt']
+
+
+def get_content_store_dir(parsed_dir: Path) -> Path:
+    """The content store is shared by all collections of a disk captures directory."""
+    return parsed_dir.parent.parent / CONTENT_STORE_DIRNAME
+
+
+def get_output_path(path: Path) -> Path:
+    """Get the path an output is stored at, which has COMPRESSED_SUFFIX added if it was compressed."""
+    compressed_path = path.with_name(path.name + COMPRESSED_SUFFIX)
+    if not os.path.exists(path) and os.path.exists(compressed_path):
+        return compressed_path
+    return path
+
+
+def output_exists(path: Path) -> bool:
+    return os.path.exists(get_output_path(path))
+
+
+def open_output(path: Path) -> BinaryIO:
+    """Open an output for reading, decompressing it if it was stored compressed."""
+    output_path = get_output_path(path)
+    if output_path.name.endswith(COMPRESSED_SUFFIX):
+        return zstd.open(output_path, 'rb')
+    return open(output_path, 'rb')
+
+
+def compress_output(path: Path) -> Path:
+    """Replace an output with its compressed version, returning the path of that."""
+    compressed_path = path.with_name(path.name + COMPRESSED_SUFFIX)
+    tmp_path = compressed_path.with_name(f"{compressed_path.name}.{os.getpid()}.tmp")
+    with open(path, 'rb') as f_in, zstd.open(tmp_path, 'wb', level=ZSTD_LEVEL) as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.replace(tmp_path, compressed_path)
+    os.unlink(path)
+    return compressed_path
+
+
+def decompress_output(compressed_path: Path) -> Path:
+    """Replace a compressed output with its decompressed version, returning the path of that."""
+    path = compressed_path.with_name(compressed_path.name.removesuffix(COMPRESSED_SUFFIX))
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with zstd.open(compressed_path, 'rb') as f_in, open(tmp_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.replace(tmp_path, path)
+    os.unlink(compressed_path)
+    return path
+
+
+def get_store_path(store_dir: Path, digest: str) -> Path:
+    return store_dir / digest[:2] / digest
+
+
+def link_to_store(path: Path, store_dir: Path) -> bool:
+    """
+    Put a file into the content store, or replace it with a hardlink to the
+    stored copy if one exists.  Returns whether it was a duplicate.
+
+    Stored files are made read-only, as writing through any of the links
+    would change all of them.
+    """
+    with open(path, 'rb') as f:
+        digest = hashlib.file_digest(f, 'sha256').hexdigest()
+    store_path = get_store_path(store_dir, digest)
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+
+    while True:
+        try:
+            os.link(path, store_path)
+            os.chmod(store_path, 0o444)
+            return False
+        except FileExistsError:
+            pass
+
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            if os.path.samefile(path, store_path):
+                return False
+            os.link(store_path, tmp_path)
+        except FileNotFoundError:
+            # Removed by collect_garbage in the meantime, store this copy instead
+            continue
+        os.replace(tmp_path, path)
+        return True
+
+
+def store_parsed_dir(parsed_dir: Path, store_dir: Path) -> int:
+    """
+    Compress the rarely read outputs of a _parsed directory and hardlink
+    all of them to the content store.  Returns the number of bytes saved.
+    """
+    saved = 0
+    for path in sorted(parsed_dir.iterdir()):
+        if path.name in SKIPPED_FILENAMES or path.name.endswith('.tmp') or not path.is_file():
+            continue
+        if path.name.endswith(COMPRESSED_SUFFIX) and path.name.removesuffix(COMPRESSED_SUFFIX) not in COMPRESSED_FILENAMES:
+            # Compressed by an earlier version which compressed more outputs
+            size = os.stat(path).st_size
+            path = decompress_output(path)
+            saved += size - os.stat(path).st_size
+        elif path.name in COMPRESSED_FILENAMES:
+            size = os.stat(path).st_size
+            path = compress_output(path)
+            saved += size - os.stat(path).st_size
+
+        stat = os.stat(path)
+        if stat.st_nlink == 1 and link_to_store(path, store_dir):
+            saved += stat.st_size
+    return saved
+
+
+def collect_garbage(store_dir: Path) -> int:
+    """Remove stored files which are no longer linked from any _parsed directory, returning the bytes freed."""
+    if not os.path.isdir(store_dir):
+        return 0
+    freed = 0
+    for prefix_dir in store_dir.iterdir():
+        for path in prefix_dir.iterdir():
+            stat = os.stat(path)
+            if stat.st_nlink == 1:
+                os.unlink(path)
+                freed += stat.st_size
+    return freed
+
+
+@click.group()
+def main():
+    """Deduplicate and compress the conversion outputs of disk captures."""
+
+
+@main.command()
+@click.argument(
+    'disk_captures_dir',
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path)
+)
+def store(disk_captures_dir: Path):
+    """Move the outputs of already converted captures into the content store.
+
+    DISK_CAPTURES_DIR: Directory containing floppy disk captures
+    """
+    store_dir = disk_captures_dir / CONTENT_STORE_DIRNAME
+    saved = 0
+    for parsed_dir in sorted(disk_captures_dir.glob('*/*_parsed')):
+        # Captures being converted are left for their conversion to store
+        lease = try_acquire_lease(parsed_dir.with_name(parsed_dir.name.removesuffix('_parsed')))
+        if lease is None:
+            print(f"Skipping {parsed_dir.name}, it is being converted")
+            continue
+        try:
+            saved += store_parsed_dir(parsed_dir, store_dir)
+        finally:
+            lease.release()
+    print(f"Saved {saved / 1024 / 1024:.1f} MiB")
+
+
+@main.command()
+@click.argument(
+    'disk_captures_dir',
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path)
+)
+def gc(disk_captures_dir: Path):
+    """Remove stored outputs which no _parsed directory uses anymore.
+
+    DISK_CAPTURES_DIR: Directory containing floppy disk captures
+    """
+    freed = collect_garbage(disk_captures_dir / CONTENT_STORE_DIRNAME)
+    print(f"Freed {freed / 1024 / 1024:.1f} MiB")
+
+if __name__ == '__main__':
+    main()
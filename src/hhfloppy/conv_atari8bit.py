@@ -1,31 +1,16 @@
-from dataclasses import dataclass
 from pathlib import Path
 import shlex
-import shutil
 import sys
 import tempfile
-import re
 import subprocess
 
-HXCFE_BINARY_PATH = '/home/sanqui/pauline/HxCFloppyEmulator_soft_beta/HxCFloppyEmulator_soft/HxCFloppyEmulator_Software/Windows_x64/hxcfe.exe'
+from capture_pack import PACK_SUFFIX, CaptureDirectory, CapturePack, open_capture
+from hxcstream import HxCStream, get_capture_track_names, get_stream_stats, parse_hxc_filename
 
-RE_HXC_TRACK = re.compile(r'track(\d+)\.(\d+)\.hxcstream')
+HXCFE_BINARY_PATH = '/home/sanqui/pauline/HxCFloppyEmulator_soft_beta/HxCFloppyEmulator_soft/HxCFloppyEmulator_Software/Windows_x64/hxcfe.exe'
 
 A8RAWCONV_BINARY_PATH = Path('deps/a8rawconv-0.95/a8rawconv.exe')
 
-@dataclass
-class TrackAndSide():
-    track: int
-    side: int
-
-
-def parse_hxc_filename(filename: str) -> TrackAndSide:
-    match = RE_HXC_TRACK.match(filename)
-    if not match:
-        raise ValueError(f"Error: Could not parse filename {filename}")
-
-    return TrackAndSide(track=int(match.group(1)), side=int(match.group(2)))
-
 def hxcfe_convert(first_filepath: Path, convert_format: str, output_filepath: Path):
     cmd = [
         HXCFE_BINARY_PATH,
@@ -40,36 +25,62 @@ def hxcfe_convert(first_filepath: Path, convert_format: str, output_filepath: Pa
 
 def conv_atari8bit(dirpath: Path):
     floppyname = dirpath.parent.name
+    with open_capture(dirpath) as capture:
+        conv_atari8bit_capture(capture, floppyname)
+
+def conv_atari8bit_capture(capture: CapturePack | CaptureDirectory, floppyname: str):
+    dirpath = capture.path
+    filenames = get_capture_track_names(capture)
+    # match "track80.0.hxcstream" with regex
+    last_track, _ = parse_hxc_filename(filenames[-1])
+    if last_track > 40:
+        # High density floppy dump, but Atari 8-bit didn't use those
+        # we have to remove odd tracks
+        remove_odd_tracks = True
+    else:
+        remove_odd_tracks = False
+
+    used_filenames = []
+    for filename in filenames:
+        track, side = parse_hxc_filename(filename)
+        if remove_odd_tracks and track % 2 == 1:
+            continue
+        if side == 1:
+            # Atari 8-bit only used side 0
+            continue
+        used_filenames.append(filename)
+
+    # Reading the flux directly is much faster than finding out the hard way through hxcfe
+    blank_tracks = []
+    for filename in used_filenames:
+        track, side = parse_hxc_filename(filename)
+        try:
+            stats = get_stream_stats(HxCStream.from_bytes(capture.read(filename)), track, side)
+        except (OSError, ValueError) as e:
+            # Left for hxcfe to judge, it may still read tracks the flux reader rejects
+            print(f"Warning: Could not read the flux of {filename}: {e}")
+            continue
+        if stats.blank:
+            blank_tracks.append(stats.track)
+    if len(blank_tracks) == len(used_filenames):
+        print(f"Warning: All tracks of {dirpath} are blank, skipping")
+        return
+    if blank_tracks:
+        print(f"Warning: Blank tracks {', '.join(map(str, blank_tracks))}")
+
     with tempfile.TemporaryDirectory(delete=False) as tmpdirname:
         tmpdirpath = Path(tmpdirname)
         print("tmp dir path", tmpdirpath)
 
-        filepaths = sorted(dirpath.glob('*.hxcstream'))
-        # match "track80.0.hxcstream" with regex
-        last = parse_hxc_filename(filepaths[-1].name)
-        if last.track > 40:
-            # High density floppy dump, but Atari 8-bit didn't use those
-            # we have to remove odd tracks
-            remove_odd_tracks = True
-        else:
-            remove_odd_tracks = False
-        
-        for filepath in filepaths:
-            track_and_side = parse_hxc_filename(filepath.name)
-            if remove_odd_tracks and track_and_side.track % 2 == 1:
-                continue
-            if track_and_side.side == 1:
-                # Atari 8-bit only used side 0
-                continue
-            
-            track = track_and_side.track
+        for filename in used_filenames:
+            track, side = parse_hxc_filename(filename)
             if remove_odd_tracks:
                 track //= 2
             
             # copy to temp dir
 
             
-            shutil.copy(filepath, tmpdirpath / f'track{track:02}.{track_and_side.side}.hxcstream')
+            (tmpdirpath / f'track{track:02}.{side}.hxcstream').write_bytes(capture.read(filename))
 
         print("Converting to HFE format...")
         hxcfe_convert(
@@ -108,9 +119,9 @@ def conv_dir(dirpath: Path):
         if not item.is_dir():
             continue
         
-        # Find subdirectories
+        # Find subdirectories, or packed captures
         subdirs = list(item.iterdir())
-        subdirs = [d for d in subdirs if d.is_dir()]
+        subdirs = [d for d in subdirs if d.is_dir() or d.name.endswith(PACK_SUFFIX)]
         
         if not subdirs:
             print(f"Warning: No subdirectories found in {item}")
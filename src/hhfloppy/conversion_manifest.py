@@ -0,0 +1,102 @@
+import hashlib
+import os
+from pathlib import Path
+
+import msgspec
+
+from capture_pack import CapturePack, get_capture_pack_path, is_packed_capture
+
+CONVERSION_MANIFEST_FILENAME = 'conversion_manifest.json'
+
+# Shared libraries hxcfe loads from its own directory (see LD_LIBRARY_PATH in pyhxcfe)
+HXCFE_LIBRARY_NAMES = ['libhxcfe.so', 'libusbhxcfe.so']
+
+
+class ConversionInput(msgspec.Struct, kw_only=True, frozen=True):
+    name: str
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class ConversionManifest(msgspec.Struct, kw_only=True, frozen=True):
+    """
+    Record of what a _parsed directory was converted from, stored next to
+    its outputs.  The outputs need to be converted again when the inputs or
+    the hxcfe build no longer match, formats missing from the list can be
+    added on their own.
+    """
+    inputs: list[ConversionInput]
+    hxcfe_fingerprint: str
+    formats: list[str]
+
+    def is_current(self, inputs: list[ConversionInput], hxcfe_fingerprint: str) -> bool:
+        return (
+            self.hxcfe_fingerprint == hxcfe_fingerprint
+            and [(i.name, i.sha256) for i in self.inputs] == [(i.name, i.sha256) for i in inputs]
+        )
+
+
+def _hash_file(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def get_hxcfe_fingerprint(hxcfe_binary_path: Path) -> str:
+    """Hash the hxcfe binary together with the libraries next to it."""
+    digest = hashlib.sha256()
+    for path in [hxcfe_binary_path] + [hxcfe_binary_path.parent / name for name in HXCFE_LIBRARY_NAMES]:
+        if not path.exists():
+            continue
+        digest.update(path.name.encode())
+        digest.update(_hash_file(path).encode())
+    return digest.hexdigest()
+
+
+def get_capture_inputs(floppy_subdir: Path, previous: ConversionManifest | None = None) -> list[ConversionInput]:
+    """
+    Describe the .hxcstream files of a capture directory.  Files whose size
+    and mtime match the previous manifest are not hashed again.  The inputs
+    of a packed capture come from its index, so packing a capture does not
+    make its conversion outdated.
+    """
+    if is_packed_capture(floppy_subdir):
+        with CapturePack(get_capture_pack_path(floppy_subdir)) as pack:
+            return [
+                ConversionInput(name=f.name, size=f.size, mtime_ns=f.mtime_ns, sha256=f.sha256)
+                for f in sorted(pack.files.values(), key=lambda f: f.name) if f.name.endswith('.hxcstream')
+            ]
+
+    previous_inputs = {i.name: i for i in previous.inputs} if previous is not None else {}
+
+    inputs: list[ConversionInput] = []
+    with os.scandir(floppy_subdir) as it:
+        entries = sorted((entry for entry in it if entry.name.endswith('.hxcstream')), key=lambda entry: entry.name)
+
+    for entry in entries:
+        stat = entry.stat()
+        previous_input = previous_inputs.get(entry.name)
+        if previous_input is not None and previous_input.size == stat.st_size and previous_input.mtime_ns == stat.st_mtime_ns:
+            sha256 = previous_input.sha256
+        else:
+            sha256 = _hash_file(Path(entry.path))
+        inputs.append(ConversionInput(name=entry.name, size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=sha256))
+
+    return inputs
+
+
+def read_manifest(parsed_dir: Path) -> ConversionManifest | None:
+    """Read the manifest of a _parsed directory, or None if it has none."""
+    try:
+        with open(parsed_dir / CONVERSION_MANIFEST_FILENAME, 'rb') as f:
+            return msgspec.json.decode(f.read(), type=ConversionManifest)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(parsed_dir: Path, manifest: ConversionManifest) -> None:
+    """Atomically write the manifest of a _parsed directory."""
+    tmp_path = parsed_dir / (CONVERSION_MANIFEST_FILENAME + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(msgspec.json.format(msgspec.json.encode(manifest)))
+    os.replace(tmp_path, parsed_dir / CONVERSION_MANIFEST_FILENAME)
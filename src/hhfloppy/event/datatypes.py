@@ -32,6 +32,11 @@ class FloppyInfoFromXML(HHFloppyTaggedStruct, kw_only=True, frozen=True):
     bitrate: int
     rpm: int
     crc32: int
+    short_tracks: list[str] = msgspec.field(default_factory=list)
+    """
+    Tracks as "TT.S" with fewer sectors than sector_per_track.  Only filled
+    when the per-track statistics were parsed.
+    """
 
 
 class FloppyInfoFromIMD(HHFloppyTaggedStruct, kw_only=True, frozen=True):
@@ -41,10 +46,30 @@ class FloppyInfoFromIMD(HHFloppyTaggedStruct, kw_only=True, frozen=True):
     error_count: int | None
     parsing_errors: str | None
 
+class FloppyInfoFromFlux(HHFloppyTaggedStruct, kw_only=True, frozen=True):
+    """
+    Detected from flux interval histograms of the raw capture.
+    """
+    encoding: str | None
+    bitrate_kbps: int | None
+    formatted_tracks: int
+    blank_tracks: int
+    sides: int
+    quality: float | None
+    """
+    Mean over the formatted tracks, from 0 to 1.
+    """
+    weak_tracks: list[str]
+    damaged_tracks: list[str]
+    """
+    Tracks as "TT.S" which could not be read or don't match the encoding.
+    """
+
 HHFLOPPY_EVENT_DATA_CLASS_UNION = Union[
     FloppyInfoFromName,
     FloppyInfoFromXML,
     FloppyInfoFromIMD,
+    FloppyInfoFromFlux,
 ]
 
 # For sanity, try to make a decoder
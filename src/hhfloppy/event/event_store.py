@@ -4,6 +4,7 @@ from string import ascii_letters, digits
 import time
 
 import json
+from pathlib import Path
 from typing import Sequence
 import requests
 import msgspec
@@ -15,17 +16,25 @@ DEFAULT_EVENT_STORE_ADDRESS = "https://inventory.herniarchiv.cz/"
 EVENT_STORE_PATH = "event_store"
 
 class EventStore:
-    def __init__(self, namespace: str, app: str, event_store_address: str | None=None) -> None:
-        """Initialize the event store."""
+    def __init__(self, namespace: str, app: str, event_store_address: str | None=None, spool_path: Path | None=None) -> None:
+        """
+        Initialize the event store.  If spool_path is given, every emitted
+        event is also appended to it as a line of JSON right away, so events
+        are not lost if the process ends before pushing.
+        """
         self.namespace = namespace
         self.app = app
         self.events: list[Event] = []
+        self.spool_path = spool_path
         self.event_store_url = (event_store_address or os.environ.get("EVENT_STORE_ADDRESS") or DEFAULT_EVENT_STORE_ADDRESS) + EVENT_STORE_PATH
 
     def emit_event(self, event: Event) -> None:
         """Emit an event."""
         print(f"Event emitted: {event}")
         self.events.append(event)
+        if self.spool_path is not None:
+            with open(self.spool_path, 'ab') as f:
+                f.write(msgspec.json.encode(event) + b'\n')
     
     def emit_events(self, events: Sequence[Event]) -> None:
         """Emit multiple events."""
@@ -7,9 +7,9 @@ import uuid
 import msgspec
 from msgspec import field
 
-from .datatypes import HHFLOPPY_EVENT_DATA_CLASS_UNION, FloppyInfoFromIMD, FloppyInfoFromName, FloppyInfoFromXML, HHFloppyTaggedStruct
+from .datatypes import HHFLOPPY_EVENT_DATA_CLASS_UNION, FloppyInfoFromFlux, FloppyInfoFromIMD, FloppyInfoFromName, FloppyInfoFromXML, HHFloppyTaggedStruct
 
-EVENT_VERSION = 6
+EVENT_VERSION = 7
 EVENT_NAMESPACE = 'hhfloppy'
 
 class Event(HHFloppyTaggedStruct, kw_only=True, frozen=True):
@@ -63,6 +63,7 @@ class FloppyDiskCaptureSummarized(Event, frozen=True):
     name_info: FloppyInfoFromName
     xml_info: FloppyInfoFromXML
     imd_info: FloppyInfoFromIMD
+    flux_info: FloppyInfoFromFlux | None = None
 
 
 class PyHXCFEERunFinished(Event, frozen=True):
@@ -0,0 +1,267 @@
+# Format detection and quality checks based on histograms of the flux
+# intervals of raw captures, so bad dumps can be spotted without hxcfe.
+
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+import click
+import numpy as np
+
+from event.datatypes import FloppyInfoFromFlux
+from capture_pack import open_capture
+from hxcstream import BLANK_TRACK_FLUX_PER_REVOLUTION, HxCStream, get_capture_track_names, parse_hxc_filename
+
+# Flux intervals read from every track, roughly a revolution of a double
+# density track.  Enough for a histogram and much faster than reading it all.
+ANALYSIS_MAX_FLUX = 40_000
+
+# Drives spin at 300 rpm or faster
+BLANK_TRACK_FLUX_PER_SECOND = BLANK_TRACK_FLUX_PER_REVOLUTION * 300 / 60
+
+# Histogram bins are a whole number of sample clock ticks close to this wide.
+# Longer intervals than the range all go to the last bin.
+HISTOGRAM_BIN_NS = 50
+HISTOGRAM_RANGE_NS = 20_000
+
+# Shorter intervals are noise, even for high density
+MIN_PEAK_NS = 1000
+
+# Peaks lower than this fraction of the highest peak are ignored
+PEAK_MIN_FRACTION = 0.05
+
+# Maxima closer than this fraction of their position belong to the same peak
+PEAK_MERGE_FRACTION = 0.15
+
+# Intervals between flux transitions relative to the shortest one
+ENCODING_PEAK_RATIOS = {
+    'FM': (1.0, 2.0),
+    'MFM': (1.0, 1.5, 2.0),
+    'GCR': (1.0, 2.0, 3.0),
+}
+
+# How far peaks may be from the ratios, in shortest intervals
+PEAK_RATIO_TOLERANCE = 0.1
+
+# Intervals further than this from an expected peak, in shortest intervals, count as noise
+PEAK_WINDOW = 0.2
+
+# The shortest interval is one bitcell at the data rate of the drive
+NOMINAL_BITRATES_KBPS = (250, 300, 500)
+BITRATE_TOLERANCE = 0.08
+
+WEAK_TRACK_QUALITY = 0.5
+
+
+@dataclass
+class TrackFluxAnalysis():
+    track: int
+    side: int
+    counts: np.ndarray
+    """Histogram of the flux intervals."""
+    bin_ns: float
+    blank: bool
+    peaks_ns: np.ndarray
+    encoding: str | None
+    """Encoding matching the peaks of this track alone."""
+
+    @property
+    def name(self) -> str:
+        return f"{self.track:02}.{self.side}"
+
+
+@dataclass
+class TrackQuality():
+    noise_floor: float
+    """Fraction of the intervals away from all expected peaks."""
+    peak_spread: float
+    """RMS distance of the other intervals from their peak, in shortest intervals."""
+
+    @property
+    def quality(self) -> float:
+        return (1 - self.noise_floor) * max(0.0, 1 - self.peak_spread / PEAK_WINDOW)
+
+
+def get_flux_histogram(stream: HxCStream) -> tuple[np.ndarray, float]:
+    """Histogram the flux intervals of a stream, returning the counts and the bin width in ns."""
+    tick_ns = 1e9 / stream.sample_rate
+    bin_ticks = max(1, round(HISTOGRAM_BIN_NS / tick_ns))
+    bins = int(HISTOGRAM_RANGE_NS / (bin_ticks * tick_ns))
+    counts = np.bincount(np.minimum(stream.flux // bin_ticks, bins), minlength=bins + 1)
+    return counts, bin_ticks * tick_ns
+
+
+def find_peaks(counts: np.ndarray, bin_ns: float) -> np.ndarray:
+    """Find the peaks of a histogram, returning their centres in ns in ascending order."""
+    smoothed = np.convolve(counts[:-1], [1, 2, 3, 2, 1], mode='same')
+    smoothed[:int(MIN_PEAK_NS / bin_ns)] = 0
+    if not smoothed.any():
+        return np.zeros(0)
+
+    inner = smoothed[1:-1]
+    is_maximum = (inner > smoothed[:-2]) & (inner >= smoothed[2:]) & (inner >= PEAK_MIN_FRACTION * smoothed.max())
+    maxima = np.flatnonzero(is_maximum) + 1
+
+    peaks: list[int] = []
+    for i in maxima[np.argsort(-smoothed[maxima], kind='stable')].tolist():
+        if all(abs(i - peak) > PEAK_MERGE_FRACTION * peak for peak in peaks):
+            peaks.append(i)
+
+    centres = []
+    for peak in sorted(peaks):
+        width = max(1, int(peak * PEAK_MERGE_FRACTION / 2))
+        window = counts[peak - width:peak + width + 1]
+        positions = np.arange(peak - width, peak - width + len(window))
+        centres.append((float(np.dot(window, positions)) / window.sum() + 0.5) * bin_ns)
+    return np.array(centres)
+
+
+def classify_peaks(peaks_ns: np.ndarray) -> str | None:
+    """Find the encoding whose intervals match the peaks, or None if none does."""
+    if len(peaks_ns) == 0:
+        return None
+    ratios = peaks_ns / peaks_ns[0]
+    for encoding, expected in ENCODING_PEAK_RATIOS.items():
+        if len(ratios) == len(expected) and np.all(np.abs(ratios - expected) <= PEAK_RATIO_TOLERANCE):
+            return encoding
+    return None
+
+
+def get_bitrate_kbps(shortest_peak_ns: float) -> int:
+    """Get the bitrate from the shortest interval, rounded to a nominal bitrate when close to one."""
+    measured = 1e6 / shortest_peak_ns
+    nominal = min(NOMINAL_BITRATES_KBPS, key=lambda bitrate: abs(bitrate - measured))
+    return nominal if abs(nominal - measured) <= BITRATE_TOLERANCE * nominal else round(measured)
+
+
+def get_track_quality(analysis: TrackFluxAnalysis, encoding: str) -> TrackQuality:
+    """Measure how well the flux intervals of a track fit the expected peaks of an encoding."""
+    if len(analysis.peaks_ns) == 0:
+        return TrackQuality(noise_floor=1.0, peak_spread=PEAK_WINDOW)
+
+    shortest = analysis.peaks_ns[0]
+    expected_ns = shortest * np.array(ENCODING_PEAK_RATIOS[encoding])
+    centres_ns = (np.arange(len(analysis.counts)) + 0.5) * analysis.bin_ns
+    distance = np.abs(centres_ns[:, None] - expected_ns[None, :]).min(axis=1) / shortest
+
+    in_peak = distance <= PEAK_WINDOW
+    in_peak_count = analysis.counts[in_peak].sum()
+    if not in_peak_count:
+        return TrackQuality(noise_floor=1.0, peak_spread=PEAK_WINDOW)
+    return TrackQuality(
+        noise_floor=1 - float(in_peak_count) / float(analysis.counts.sum()),
+        peak_spread=float(np.sqrt(np.dot(analysis.counts[in_peak], distance[in_peak] ** 2) / in_peak_count)),
+    )
+
+
+def analyze_track(track: int, side: int, data: bytes) -> TrackFluxAnalysis:
+    """Histogram the start of a single trackNN.S.hxcstream file and classify it."""
+    stream = HxCStream.from_bytes(data, max_flux=ANALYSIS_MAX_FLUX)
+    counts, bin_ns = get_flux_histogram(stream)
+    blank = stream.duration == 0 or len(stream.flux) / stream.duration < BLANK_TRACK_FLUX_PER_SECOND
+    peaks_ns = find_peaks(counts, bin_ns) if not blank else np.zeros(0)
+    return TrackFluxAnalysis(
+        track=track,
+        side=side,
+        counts=counts,
+        bin_ns=bin_ns,
+        blank=blank,
+        peaks_ns=peaks_ns,
+        encoding=classify_peaks(peaks_ns),
+    )
+
+
+def summarize_track_analyses(analyses: list[TrackFluxAnalysis], damaged_tracks: list[str]) -> FloppyInfoFromFlux:
+    """
+    Combine the analyses of the tracks of a capture.  Tracks are measured
+    against the most common encoding, tracks which don't match it count as
+    damaged and tracks which fit it poorly as weak.
+    """
+    damaged_tracks = list(damaged_tracks)
+    formatted = [analysis for analysis in analyses if not analysis.blank]
+    encodings = Counter(analysis.encoding for analysis in formatted if analysis.encoding is not None)
+    if not encodings:
+        return FloppyInfoFromFlux(
+            encoding=None,
+            bitrate_kbps=None,
+            formatted_tracks=len(formatted),
+            blank_tracks=len(analyses) - len(formatted),
+            sides=len({analysis.side for analysis in formatted}),
+            quality=None,
+            weak_tracks=[],
+            damaged_tracks=sorted(damaged_tracks + [analysis.name for analysis in formatted]),
+        )
+
+    encoding, _ = encodings.most_common(1)[0]
+    bitrates = Counter(get_bitrate_kbps(analysis.peaks_ns[0]) for analysis in formatted if analysis.encoding == encoding)
+    bitrate_kbps, _ = bitrates.most_common(1)[0]
+
+    qualities: list[float] = []
+    weak_tracks: list[str] = []
+    for analysis in formatted:
+        if analysis.encoding != encoding:
+            damaged_tracks.append(analysis.name)
+        quality = get_track_quality(analysis, encoding).quality
+        qualities.append(quality)
+        if quality < WEAK_TRACK_QUALITY:
+            weak_tracks.append(analysis.name)
+
+    return FloppyInfoFromFlux(
+        encoding=encoding,
+        bitrate_kbps=bitrate_kbps,
+        formatted_tracks=len(formatted),
+        blank_tracks=len(analyses) - len(formatted),
+        sides=len({analysis.side for analysis in formatted}),
+        quality=round(float(np.mean(qualities)), 3),
+        weak_tracks=weak_tracks,
+        damaged_tracks=sorted(damaged_tracks),
+    )
+
+
+def analyze_capture_tracks(capture_dir: Path) -> tuple[list[TrackFluxAnalysis], list[str]]:
+    """Analyze every track of a capture, returning the analyses and the tracks which could not be read."""
+    analyses: list[TrackFluxAnalysis] = []
+    damaged_tracks: list[str] = []
+    with open_capture(capture_dir) as capture:
+        for name in get_capture_track_names(capture):
+            track, side = parse_hxc_filename(name)
+            try:
+                analyses.append(analyze_track(track, side, capture.read(name)))
+            except (OSError, ValueError):
+                damaged_tracks.append(f"{track:02}.{side}")
+    return analyses, damaged_tracks
+
+
+def analyze_capture(capture_dir: Path) -> FloppyInfoFromFlux | None:
+    """Analyze the flux of a capture directory or packed capture, or return None if it holds no tracks."""
+    analyses, damaged_tracks = analyze_capture_tracks(capture_dir)
+    if not analyses and not damaged_tracks:
+        return None
+    return summarize_track_analyses(analyses, damaged_tracks)
+
+
+@click.command()
+@click.argument(
+    'capture_dir',
+    type=click.Path(exists=True, file_okay=True, dir_okay=True, path_type=Path)
+)
+def main(capture_dir: Path):
+    """Print the detected format and track quality of a capture.
+
+    CAPTURE_DIR: Directory containing the .hxcstream files of one capture, or its .hxcpack
+    """
+    analyses, damaged_tracks = analyze_capture_tracks(capture_dir)
+    flux_info = summarize_track_analyses(analyses, damaged_tracks)
+    for analysis in analyses:
+        if analysis.blank:
+            print(f"track {analysis.name}  blank")
+            continue
+        peaks = ', '.join(f"{peak / 1000:.2f}" for peak in analysis.peaks_ns)
+        quality = get_track_quality(analysis, flux_info.encoding).quality if flux_info.encoding else 0.0
+        print(f"track {analysis.name}  {analysis.encoding or '?':3}  peaks {peaks} us  quality {quality:.2f}")
+    for name in damaged_tracks:
+        print(f"track {name}  unreadable")
+    print(flux_info)
+
+if __name__ == '__main__':
+    main()
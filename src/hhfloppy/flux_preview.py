@@ -0,0 +1,216 @@
+# Previews of raw captures drawn straight from the hxcstream files, much
+# faster than the PNG_STREAM_IMAGE and PNG_DISK_IMAGE formats of hxcfe.
+
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import struct
+import zlib
+
+import click
+import numpy as np
+
+from capture_pack import open_capture
+from hxcstream import HxCStream, get_capture_track_names, parse_hxc_filename
+
+# Enough flux for a whole revolution of a high density track after the first index pulse
+PREVIEW_MAX_FLUX = 150_000
+
+# Used for tracks with fewer than two index pulses
+NOMINAL_REVOLUTION_SECONDS = 60 / 300
+
+
+@dataclass
+class PreviewSize():
+    columns: int
+    """Slices of a revolution, which is also the diameter of the disk view."""
+    strip_height: int
+    """Height of every track in the stream view."""
+
+# The full size columns have to be a multiple of the thumbnail columns
+THUMBNAIL_SIZE = PreviewSize(columns=256, strip_height=2)
+FULL_SIZE = PreviewSize(columns=1024, strip_height=6)
+
+# Radius of the last track relative to track 0 in the disk view
+DISK_INNER_RADIUS = 0.4
+
+# Space between the sides
+SIDE_GAP = 8
+
+BACKGROUND = 255
+
+STREAM_THUMBNAIL_FILENAME = 'FLUX_STREAM_THUMB.png'
+DISK_THUMBNAIL_FILENAME = 'FLUX_DISK_THUMB.png'
+STREAM_PREVIEW_FILENAME = 'FLUX_STREAM.png'
+DISK_PREVIEW_FILENAME = 'FLUX_DISK.png'
+
+THUMBNAIL_FILENAMES = [STREAM_THUMBNAIL_FILENAME, DISK_THUMBNAIL_FILENAME]
+PREVIEW_FILENAMES = THUMBNAIL_FILENAMES + [STREAM_PREVIEW_FILENAME, DISK_PREVIEW_FILENAME]
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """Encode a 2D array of 8 bit grey levels as a PNG."""
+    height, width = pixels.shape
+    rows = np.zeros((height, width + 1), dtype=np.uint8)  # Each row starts with filter type 0
+    rows[:, 1:] = pixels
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+        + _png_chunk(b'IDAT', zlib.compress(rows.tobytes()))
+        + _png_chunk(b'IEND', b'')
+    )
+
+
+def write_png(path: Path, pixels: np.ndarray) -> None:
+    """Atomically write a PNG, so other processes never see a partial image."""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_png(pixels))
+    os.replace(tmp_path, path)
+
+
+def get_revolution_density(stream: HxCStream, columns: int) -> np.ndarray:
+    """Count the flux transitions in each of columns slices of the first whole revolution."""
+    index_ticks = stream.get_index_ticks()
+    if len(index_ticks) >= 2:
+        start, end = int(index_ticks[0]), int(index_ticks[1])
+    else:
+        start, end = 0, round(NOMINAL_REVOLUTION_SECONDS * stream.sample_rate)
+
+    flux_ticks = np.cumsum(stream.flux, dtype=np.int64)
+    first, last = np.searchsorted(flux_ticks, [start, end])
+    return np.bincount((flux_ticks[first:last] - start) * columns // (end - start), minlength=columns)[:columns]
+
+
+def read_capture_densities(capture_dir: Path, columns: int) -> np.ndarray:
+    """
+    Get the flux density of every track of a capture as an array of
+    sides, tracks and columns.  Tracks which can't be read stay empty.
+    """
+    track_densities: dict[tuple[int, int], np.ndarray] = {}
+    with open_capture(capture_dir) as capture:
+        for name in get_capture_track_names(capture):
+            track, side = parse_hxc_filename(name)
+            try:
+                stream = HxCStream.from_bytes(capture.read(name), max_flux=PREVIEW_MAX_FLUX)
+                track_densities[side, track] = get_revolution_density(stream, columns)
+            except (OSError, ValueError):
+                track_densities[side, track] = np.zeros(columns, dtype=np.int64)
+
+    sides = max((side for side, _ in track_densities), default=-1) + 1
+    tracks = max((track for _, track in track_densities), default=-1) + 1
+    densities = np.zeros((sides, tracks, columns), dtype=np.int64)
+    for (side, track), density in track_densities.items():
+        densities[side, track] = density
+    return densities
+
+
+def get_density_levels(densities: np.ndarray) -> np.ndarray:
+    """Scale flux densities to grey levels, with the densest percent of the capture white."""
+    if not densities.any():
+        return np.zeros(densities.shape, dtype=np.uint8)
+    scale = float(np.percentile(densities[densities > 0], 99))
+    return np.minimum(densities * (255 / scale), 255).astype(np.uint8)
+
+
+def join_sides(images: list[np.ndarray]) -> np.ndarray:
+    gap = np.full((images[0].shape[0], SIDE_GAP), BACKGROUND, dtype=np.uint8)
+    parts = [part for image in images for part in (gap, image)][1:]
+    return np.concatenate(parts, axis=1)
+
+
+def render_stream_view(levels: np.ndarray, size: PreviewSize) -> np.ndarray:
+    """Draw every track as a strip of its flux density over a revolution, one column per side."""
+    return join_sides([np.repeat(side_levels, size.strip_height, axis=0) for side_levels in levels])
+
+
+def render_disk_view(levels: np.ndarray, size: PreviewSize) -> np.ndarray:
+    """
+    Draw the flux density of every side as a disk, with track 0 outside
+    and the index at the top, going clockwise.
+    """
+    _, tracks, columns = levels.shape
+    diameter = size.columns
+    centre = (diameter - 1) / 2
+    y, x = np.ogrid[0:diameter, 0:diameter]
+    radius = np.hypot(x - centre, y - centre) / (diameter / 2)
+    angle = np.arctan2(x - centre, centre - y) / (2 * np.pi) % 1
+
+    track = np.floor((1 - radius) / (1 - DISK_INNER_RADIUS) * tracks).astype(np.int64)
+    column = (angle * columns).astype(np.int64) % columns
+    inside = (track >= 0) & (track < tracks)
+
+    images = []
+    for side_levels in levels:
+        image = np.full((diameter, diameter), BACKGROUND, dtype=np.uint8)
+        image[inside] = side_levels[track[inside], column[inside]]
+        images.append(image)
+    return join_sides(images)
+
+
+def render_previews(capture_dir: Path, output_dir: Path, full_size: bool = False) -> None:
+    """Write the thumbnails of a capture, and the full size previews if asked to."""
+    densities = read_capture_densities(capture_dir, FULL_SIZE.columns)
+    if densities.size == 0:
+        raise ValueError(f"no tracks in {capture_dir}")
+    sides, tracks, _ = densities.shape
+
+    thumbnail_levels = get_density_levels(densities.reshape(sides, tracks, THUMBNAIL_SIZE.columns, -1).sum(axis=3))
+    images = {
+        STREAM_THUMBNAIL_FILENAME: render_stream_view(thumbnail_levels, THUMBNAIL_SIZE),
+        DISK_THUMBNAIL_FILENAME: render_disk_view(thumbnail_levels, THUMBNAIL_SIZE),
+    }
+    if full_size:
+        levels = get_density_levels(densities)
+        images[STREAM_PREVIEW_FILENAME] = render_stream_view(levels, FULL_SIZE)
+        images[DISK_PREVIEW_FILENAME] = render_disk_view(levels, FULL_SIZE)
+
+    for filename, pixels in images.items():
+        write_png(output_dir / filename, pixels)
+
+
+def ensure_previews(capture_dir: Path, output_dir: Path, full_size: bool = False) -> list[str]:
+    """
+    Render the previews of a capture unless they already exist, and return
+    the file names of the previews which are available.
+    """
+    wanted = PREVIEW_FILENAMES if full_size else THUMBNAIL_FILENAMES
+    if not all(os.path.exists(output_dir / filename) for filename in wanted):
+        try:
+            render_previews(capture_dir, output_dir, full_size)
+        except (OSError, ValueError) as e:
+            print(f"Failed to render previews of {capture_dir.name}: {type(e).__name__}: {e}")
+    return [filename for filename in PREVIEW_FILENAMES if os.path.exists(output_dir / filename)]
+
+
+@click.command()
+@click.argument(
+    'capture_dir',
+    type=click.Path(exists=True, file_okay=True, dir_okay=True, path_type=Path)
+)
+@click.option(
+    '--output-dir',
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path),
+    default=Path('.'),
+    help='Directory to write the previews to'
+)
+@click.option(
+    '--full-size',
+    is_flag=True,
+    help='Also write full size previews next to the thumbnails'
+)
+def main(capture_dir: Path, output_dir: Path, full_size: bool):
+    """Render flux previews of a capture.
+
+    CAPTURE_DIR: Directory containing the .hxcstream files of one capture, or its .hxcpack
+    """
+    render_previews(capture_dir, output_dir, full_size)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+# Reader for the .hxcstream flux captures written by Pauline, so captures
+# can be looked at without running them through hxcfe.
+
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+import re
+import struct
+import zlib
+
+import click
+import lz4.block
+import numpy as np
+
+from capture_pack import CaptureDirectory, CapturePack, open_capture
+
+RE_HXC_TRACK = re.compile(r'track(\d+)\.(\d+)\.hxcstream')
+
+# A file is a sequence of chunks: a header, packets and a CRC32 of the header and packets
+CHUNK_SIGNATURE = b'CHKH'
+CHUNK_HEADER = struct.Struct('<4sII')  # signature, size including header and CRC, packet number
+CHUNK_CRC = struct.Struct('<I')
+
+PACKET_TYPE = struct.Struct('<I')
+PACKET_METADATA = 0x0
+PACKET_PACKED_IO_STREAM = 0x1
+PACKET_PACKED_FLUX_STREAM = 0x2
+METADATA_HEADER = struct.Struct('<II')  # type, payload size
+PACKED_IO_STREAM_HEADER = struct.Struct('<III')  # type, packed size, unpacked size
+PACKED_FLUX_STREAM_HEADER = struct.Struct('<IIII')  # type, packed size, unpacked size, number of pulses
+
+# Sampling clock of the flux intervals, unless the metadata says otherwise
+DEFAULT_SAMPLE_RATE = 25_000_000
+
+# Drive index signal in the IO stream samples
+IO_INDEX_MASK = 0x0001
+
+# Tracks with fewer flux transitions per revolution than this hold no data
+BLANK_TRACK_FLUX_PER_REVOLUTION = 1000
+
+
+def parse_hxc_filename(filename: str) -> tuple[int, int]:
+    """Get the track and side of a trackNN.S.hxcstream file name."""
+    match = RE_HXC_TRACK.fullmatch(filename)
+    if not match:
+        raise ValueError(f"Could not parse filename {filename}")
+    return int(match.group(1)), int(match.group(2))
+
+
+# Flux codes are found block by block, see _find_code_starts
+FLUX_DECODE_BLOCK = 64
+
+# Continuation bytes still expected after a byte, indexed by the continuation
+# bytes of a code starting at the byte times 4 plus the count before the byte
+_FLUX_STEP = np.array([state - 1 if state else remaining for remaining in range(4) for state in range(4)], dtype=np.uint8)
+# The same for four counts packed into a byte, indexed by continuation bytes times 256 plus the packed counts
+_FLUX_PACKED_STEP = np.array([
+    sum(int(_FLUX_STEP[remaining * 4 + (packed >> 2 * i & 3)]) << 2 * i for i in range(4))
+    for remaining in range(4) for packed in range(256)
+], dtype=np.uint16)
+_FLUX_PACKED_IDENTITY = sum(i << 2 * i for i in range(4))
+
+_FLUX_CODE_LENGTHS = np.array([1] * 0x80 + [2] * 0x40 + [3] * 0x20 + [4] * 0x10 + [0] * 0x10, dtype=np.uint8)
+_FLUX_LEAD_MASKS = np.array([0, 0x7F, 0x3F, 0x1F, 0x0F], dtype=np.uint32)
+
+def _find_code_starts(remaining: np.ndarray) -> np.ndarray:
+    """
+    Find where codes start, given the number of continuation bytes of a
+    code starting at every position.
+
+    Every code start depends on all codes before it.  Instead of walking
+    the stream byte by byte, the stream is cut into blocks, and all blocks
+    are walked at once for each of the four possible counts of continuation
+    bytes still expected when entering them.  Chaining the blocks then only
+    takes one step per block.
+    """
+    n = len(remaining)
+    block = FLUX_DECODE_BLOCK
+    blocks = -(-n // block)
+    padded = np.zeros(blocks * block, dtype=np.uint16)
+    padded[:n] = remaining
+    columns = padded.reshape(blocks, block).T.copy()
+
+    packed = np.full(blocks, _FLUX_PACKED_IDENTITY, dtype=np.uint16)
+    for column in columns * 256:
+        packed = _FLUX_PACKED_STEP.take(column + packed)
+
+    entry_states = [0] * blocks
+    state = 0
+    for i, exit_states in enumerate(packed.tolist()):
+        entry_states[i] = state
+        state = exit_states >> 2 * state & 3
+
+    states = np.empty((block, blocks), dtype=np.uint8)
+    block_states = np.array(entry_states, dtype=np.uint8)
+    for i, column in enumerate((columns * 4).astype(np.uint8)):
+        states[i] = block_states
+        block_states = _FLUX_STEP.take(column + block_states)
+    return np.flatnonzero(states.T.ravel()[:n] == 0)
+
+def decode_flux(data: np.ndarray) -> np.ndarray:
+    """
+    Decode the variable length flux intervals of an unpacked flux stream:
+    0xxxxxxx is a 7 bit value, 10xxxxxx, 110xxxxx and 1110xxxx start 14,
+    21 and 28 bit values continued by one, two and three more bytes.
+    """
+    n = len(data)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    lengths = _FLUX_CODE_LENGTHS.take(data)
+    starts = _find_code_starts(np.maximum(lengths, 1) - 1)
+    code_lengths = lengths.take(starts)
+    if not code_lengths.all():
+        raise ValueError("invalid flux code")
+    if starts[-1] + code_lengths[-1] > n:
+        raise ValueError("truncated flux code")
+
+    padded = np.concatenate([data, np.zeros(3, dtype=np.uint8)])
+    values = padded.take(starts).astype(np.uint32) & _FLUX_LEAD_MASKS.take(code_lengths)
+    for i in range(1, 4):
+        continued = np.flatnonzero(code_lengths > i)
+        if len(continued) == 0:
+            break
+        values[continued] = values[continued] << 8 | padded.take(starts.take(continued) + i)
+    return values
+
+
+@dataclass
+class HxCStream():
+    flux: np.ndarray
+    """Intervals between flux transitions in ticks of the sampling clock."""
+    io: np.ndarray
+    """Samples of the drive IO lines, spread evenly over the capture."""
+    sample_rate: int
+    metadata: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_file(cls, path: Path, check_crc: bool = False, max_flux: int | None = None) -> 'HxCStream':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read(), check_crc, max_flux)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, check_crc: bool = False, max_flux: int | None = None) -> 'HxCStream':
+        """
+        Parse a whole hxcstream file.  With max_flux, parsing stops at the
+        end of the chunk in which at least that many flux intervals were
+        read, which is enough for statistics which don't need the whole
+        capture.
+        """
+        view = memoryview(data)
+        flux_count = 0
+        metadata: dict[str, str] = {}
+        flux_parts: list[np.ndarray] = []
+        io_parts: list[np.ndarray] = []
+
+        offset = 0
+        while offset + CHUNK_HEADER.size <= len(view):
+            signature, chunk_size, _ = CHUNK_HEADER.unpack_from(view, offset)
+            if signature != CHUNK_SIGNATURE:
+                raise ValueError(f"invalid chunk signature at offset {offset}")
+            if chunk_size < CHUNK_HEADER.size + CHUNK_CRC.size or offset + chunk_size > len(view):
+                raise ValueError(f"invalid chunk size at offset {offset}")
+            chunk_end = offset + chunk_size - CHUNK_CRC.size
+            if check_crc:
+                (crc,) = CHUNK_CRC.unpack_from(view, chunk_end)
+                if zlib.crc32(view[offset:chunk_end]) != crc:
+                    raise ValueError(f"CRC mismatch in chunk at offset {offset}")
+
+            packet_offset = offset + CHUNK_HEADER.size
+            while packet_offset + PACKET_TYPE.size <= chunk_end:
+                (packet_type,) = PACKET_TYPE.unpack_from(view, packet_offset)
+                if packet_type == PACKET_METADATA:
+                    _, payload_size = METADATA_HEADER.unpack_from(view, packet_offset)
+                    payload_offset = packet_offset + METADATA_HEADER.size
+                    text = bytes(view[payload_offset:payload_offset + payload_size]).rstrip(b'\0').decode('ascii', 'replace')
+                    for line in text.splitlines():
+                        key, _, value = line.strip().partition(' ')
+                        if key:
+                            metadata[key] = value.strip()
+                    packet_offset = payload_offset + payload_size
+                elif packet_type == PACKET_PACKED_IO_STREAM:
+                    _, packed_size, unpacked_size = PACKED_IO_STREAM_HEADER.unpack_from(view, packet_offset)
+                    payload_offset = packet_offset + PACKED_IO_STREAM_HEADER.size
+                    unpacked = lz4.block.decompress(view[payload_offset:payload_offset + packed_size],
+                                                    uncompressed_size=unpacked_size)
+                    io_parts.append(np.frombuffer(unpacked, dtype='<u2', count=unpacked_size // 2))
+                    packet_offset = payload_offset + packed_size
+                elif packet_type == PACKET_PACKED_FLUX_STREAM:
+                    _, packed_size, unpacked_size, number_of_pulses = PACKED_FLUX_STREAM_HEADER.unpack_from(view, packet_offset)
+                    payload_offset = packet_offset + PACKED_FLUX_STREAM_HEADER.size
+                    unpacked = lz4.block.decompress(view[payload_offset:payload_offset + packed_size],
+                                                    uncompressed_size=unpacked_size)
+                    flux = decode_flux(np.frombuffer(unpacked, dtype=np.uint8))
+                    if len(flux) != number_of_pulses:
+                        raise ValueError(f"expected {number_of_pulses} pulses, decoded {len(flux)}")
+                    flux_parts.append(flux)
+                    flux_count += len(flux)
+                    packet_offset = payload_offset + packed_size
+                else:
+                    raise ValueError(f"unknown packet type {packet_type:#x} at offset {packet_offset}")
+
+            offset += chunk_size
+            if max_flux is not None and flux_count >= max_flux:
+                break
+
+        return cls(
+            flux=np.concatenate(flux_parts) if flux_parts else np.zeros(0, dtype=np.uint32),
+            io=np.concatenate(io_parts) if io_parts else np.zeros(0, dtype=np.uint16),
+            sample_rate=int(metadata.get('sample_rate_hz', DEFAULT_SAMPLE_RATE)),
+            metadata=metadata,
+        )
+
+    @property
+    def duration_ticks(self) -> int:
+        return int(self.flux.sum(dtype=np.int64))
+
+    @property
+    def duration(self) -> float:
+        """Length of the capture in seconds."""
+        return self.duration_ticks / self.sample_rate
+
+    def get_index_ticks(self) -> np.ndarray:
+        """Get the times of the index pulses in ticks from the start of the capture."""
+        if len(self.io) == 0:
+            return np.zeros(0, dtype=np.int64)
+        index = (self.io & IO_INDEX_MASK) != 0
+        rising_edges = np.flatnonzero(index[1:] & ~index[:-1]) + 1
+        return (rising_edges * self.duration_ticks // len(self.io)).astype(np.int64)
+
+
+@dataclass
+class TrackFluxStats():
+    track: int
+    side: int
+    flux_count: int
+    data_length: float
+    """Length of the capture in seconds."""
+    revolutions: int
+    rpm: float | None
+    flux_per_revolution: float
+
+    @property
+    def blank(self) -> bool:
+        return self.flux_per_revolution < BLANK_TRACK_FLUX_PER_REVOLUTION
+
+
+def get_stream_stats(stream: HxCStream, track: int, side: int) -> TrackFluxStats:
+    data_length = stream.duration
+    index_ticks = stream.get_index_ticks()
+    revolutions = max(len(index_ticks) - 1, 0)
+    rpm = None
+    if revolutions:
+        revolution_seconds = float(np.diff(index_ticks).mean()) / stream.sample_rate
+        rpm = 60 / revolution_seconds
+        flux_ticks = np.cumsum(stream.flux, dtype=np.int64)
+        flux_per_revolution = float(np.count_nonzero(
+            (flux_ticks >= index_ticks[0]) & (flux_ticks < index_ticks[-1])
+        )) / revolutions
+    else:
+        flux_per_revolution = float(len(stream.flux))
+    return TrackFluxStats(
+        track=track,
+        side=side,
+        flux_count=len(stream.flux),
+        data_length=data_length,
+        revolutions=revolutions,
+        rpm=rpm,
+        flux_per_revolution=flux_per_revolution,
+    )
+
+
+def get_track_stats(path: Path) -> TrackFluxStats:
+    """Read a single trackNN.S.hxcstream file and compute its statistics."""
+    track, side = parse_hxc_filename(path.name)
+    return get_stream_stats(HxCStream.from_file(path), track, side)
+
+
+def get_capture_track_names(capture: CapturePack | CaptureDirectory) -> list[str]:
+    """Find the trackNN.S.hxcstream files of a capture, sorted by track and side."""
+    return sorted((name for name in capture.names() if RE_HXC_TRACK.fullmatch(name)), key=parse_hxc_filename)
+
+
+def read_capture_tracks(capture_dir: Path) -> Iterator[tuple[int, int, bytes]]:
+    """Read the track, side and contents of every track file of a capture directory or packed capture."""
+    with open_capture(capture_dir) as capture:
+        for name in get_capture_track_names(capture):
+            track, side = parse_hxc_filename(name)
+            yield track, side, capture.read(name)
+
+
+def get_capture_stats(capture_dir: Path) -> list[TrackFluxStats]:
+    """Compute statistics of every track of a capture, sorted by track and side."""
+    return [get_stream_stats(HxCStream.from_bytes(data), track, side) for track, side, data in read_capture_tracks(capture_dir)]
+
+
+@click.command()
+@click.argument(
+    'capture_dir',
+    type=click.Path(exists=True, file_okay=True, dir_okay=True, path_type=Path)
+)
+def main(capture_dir: Path):
+    """Print flux statistics of every track of a capture.
+
+    CAPTURE_DIR: Directory containing the .hxcstream files of one capture, or its .hxcpack
+    """
+    for stats in get_capture_stats(capture_dir):
+        rpm = f"{stats.rpm:6.1f}" if stats.rpm is not None else '     -'
+        print(f"track {stats.track:02}.{stats.side}  {stats.flux_count:8} flux  {stats.data_length * 1000:7.1f} ms  "
+              f"{stats.revolutions} revs  {rpm} rpm  {stats.flux_per_revolution:8.0f} flux/rev"
+              + ("  blank" if stats.blank else ""))
+
+if __name__ == '__main__':
+    main()
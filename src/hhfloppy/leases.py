@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import msgspec
+
+LEASE_SUFFIX = '.lease'
+
+# A lease which was not renewed for this long belongs to a dead node and can
+# be taken over.  Lease files are compared against the local clock, so this
+# has to be much longer than the clock difference between the nodes.
+LEASE_TIMEOUT_SECONDS = 10 * 60
+
+HEARTBEAT_SECONDS = 30
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class LeaseOwner(msgspec.Struct, kw_only=True, frozen=True):
+    host: str
+    pid: int
+    token: str
+
+
+def get_lease_path(target: Path) -> Path:
+    """Leases are kept next to the directory they claim."""
+    return target.with_name(target.name + LEASE_SUFFIX)
+
+
+def _is_expired(path: Path, timeout: float) -> bool:
+    try:
+        return time.time() - os.stat(path).st_mtime > timeout
+    except FileNotFoundError:
+        return False
+
+
+def _read_owner(path: Path) -> LeaseOwner | None:
+    try:
+        with open(path, 'rb') as f:
+            return msgspec.json.decode(f.read(), type=LeaseOwner)
+    except (FileNotFoundError, msgspec.DecodeError):
+        return None
+
+
+def get_lease_owner(target: Path) -> LeaseOwner | None:
+    """Get who holds the lease on a directory, or None if nobody does."""
+    return _read_owner(get_lease_path(target))
+
+
+def _is_owner_dead(path: Path) -> bool:
+    """Check whether a lease belongs to a process of this machine which no longer runs."""
+    owner = _read_owner(path)
+    if owner is None or owner.host != os.uname().nodename:
+        return False
+    try:
+        os.kill(owner.pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _is_abandoned(path: Path, timeout: float) -> bool:
+    """
+    Leases of crashed runs on this machine are abandoned right away, those
+    of other nodes once they expire.
+    """
+    return _is_expired(path, timeout) or _is_owner_dead(path)
+
+
+def _break_abandoned_lease(path: Path, timeout: float) -> bool:
+    """
+    Remove a lease if it was abandoned.  Nodes take turns through a .break
+    file, so a lease taken over by one node is never removed by another.
+    """
+    if not _is_abandoned(path, timeout):
+        # A lease released in the meantime can be claimed right away
+        return not path.exists()
+
+    break_path = path.with_name(path.name + '.break')
+    try:
+        os.close(os.open(break_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+    except FileExistsError:
+        if _is_expired(break_path, timeout):
+            # Left behind by a node which died while breaking the lease
+            break_path.unlink(missing_ok=True)
+        return False
+
+    try:
+        if not _is_abandoned(path, timeout):
+            # Renewed, or released and maybe claimed again, since it was first checked
+            return not path.exists()
+        print(f"Taking over abandoned lease {path.name}")
+        path.unlink(missing_ok=True)
+        return True
+    finally:
+        break_path.unlink(missing_ok=True)
+
+
+class Lease:
+    """
+    Claim on a directory shared between nodes, held by a lease file which
+    was created atomically with O_EXCL and is kept alive by touching it.
+    """
+
+    def __init__(self, path: Path, token: str) -> None:
+        self.path = path
+        self.token = token
+
+    def is_held(self) -> bool:
+        owner = _read_owner(self.path)
+        return owner is not None and owner.token == self.token
+
+    def renew(self) -> bool:
+        """Refresh the lease, or return False if it was lost."""
+        if not self.is_held():
+            return False
+        os.utime(self.path)
+        return True
+
+    def release(self) -> None:
+        if self.is_held():
+            self.path.unlink(missing_ok=True)
+
+
+def try_acquire_lease(target: Path, timeout: float = LEASE_TIMEOUT_SECONDS) -> Lease | None:
+    """Claim a directory, or return None if a live node already holds its lease."""
+    path = get_lease_path(target)
+    owner = LeaseOwner(host=os.uname().nodename, pid=os.getpid(), token=uuid.uuid4().hex)
+
+    for attempt in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            if attempt or not _break_abandoned_lease(path, timeout):
+                return None
+            continue
+        with os.fdopen(fd, 'wb') as f:
+            f.write(msgspec.json.encode(owner))
+        return Lease(path, owner.token)
+
+    return None
+
+
+class LeaseKeeper:
+    """Acquires leases and renews them from a background thread until they are released."""
+
+    def __init__(self, timeout: float = LEASE_TIMEOUT_SECONDS, heartbeat_seconds: float = HEARTBEAT_SECONDS) -> None:
+        self.timeout = timeout
+        self.heartbeat_seconds = heartbeat_seconds
+        self.leases: set[Lease] = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> 'LeaseKeeper':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _heartbeat(self) -> None:
+        while not self.stopped.wait(self.heartbeat_seconds):
+            with self.lock:
+                leases = list(self.leases)
+            for lease in leases:
+                if not lease.renew():
+                    print(f"Lost lease {lease.path.name}")
+
+    def acquire(self, target: Path) -> Lease | None:
+        lease = try_acquire_lease(target, self.timeout)
+        if lease is not None:
+            with self.lock:
+                self.leases.add(lease)
+        return lease
+
+    def release(self, lease: Lease) -> None:
+        with self.lock:
+            self.leases.discard(lease)
+        lease.release()
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            leases = list(self.leases)
+            self.leases.clear()
+        for lease in leases:
+            lease.release()
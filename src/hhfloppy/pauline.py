@@ -20,6 +20,11 @@ DUMP_TIME = 840
 
 INVENTORY_CODE="hh"
 
+# Captures are uploaded while the next floppy is dumped, with the lowest CPU
+# and I/O priority so they don't slow the dump down
+UPLOAD_CONCURRENCY = 1
+UPLOAD_NICENESS = 19
+
 
 @dataclass
 class Pauline():
@@ -29,6 +34,9 @@ class Pauline():
     
     def __post_init__(self):
         self.pending_tasks = set()
+        self.upload_tasks = set()
+        self.upload_semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        self.has_ionice = False
 
     async def connect(self):
         print("Connecting to websockets...")
@@ -47,6 +55,9 @@ class Pauline():
         assert result.stdout
         assert result.stdout.strip() == "Linux"
 
+        ionice_result = await self.ssh.run("command -v ionice")
+        self.has_ionice = ionice_result.exit_status == 0
+
         config_result = await self.ssh.run("cat /home/pauline/Settings/drives.script", check=True)
         assert isinstance(config_result.stdout, str)
         self.config = config_result.stdout
@@ -90,6 +101,50 @@ class Pauline():
         await asyncio.sleep(0.1)
         await self.send_ws(f"sound 2300 200")
     
+    async def upload_capture_directory(self, subdir: str, low_priority: bool = False) -> None:
+        """Upload a capture directory on Pauline to the NAS and move it to Disks_Captures_Done."""
+        priority = ""
+        if low_priority:
+            priority = f"nice -n {UPLOAD_NICENESS} " + ("ionice -c 3 " if self.has_ionice else "")
+        result = await self.ssh.run(
+            f"{priority}scp -P 7722 -r {subdir} dumper@nas.herniarchiv.cz:dumps/pauline2/Disks_Captures/",
+            check=True
+        )
+
+        if result.stderr and "update_known_hosts: hostfile_replace_entries failed" in str(result.stderr):
+            # This happens on Pauline because the filesystem doesn't support links.
+            pass
+
+        await self.ssh.run(f"mkdir -p /home/pauline/Disks_Captures_Done && mv {subdir} /home/pauline/Disks_Captures_Done/")
+
+    def start_upload(self, capture_name: str) -> None:
+        """
+        Upload a finished capture in the background, while the next floppy is
+        dumped.  capture_name is the directory Pauline wrote the capture to,
+        which has an index appended to the name the dump was started with.
+        """
+        task = asyncio.create_task(self._upload_capture_wrapped(capture_name))
+        self.upload_tasks.add(task)
+
+    async def _upload_capture_wrapped(self, capture_name: str):
+        try:
+            async with self.upload_semaphore:
+                await self.upload_capture_directory(f"/home/pauline/Disks_Captures/{capture_name}", low_priority=True)
+            tqdm.tqdm.write(f"Uploaded {capture_name}")
+        except asyncssh.process.ProcessError as e:
+            tqdm.tqdm.write(f"Warning: Failed to upload {capture_name}, retrying after the batch: {e}")
+        except Exception as e:
+            tqdm.tqdm.write(f"Background task error: {e}")
+        finally:
+            self.upload_tasks.remove(asyncio.current_task())
+
+    async def finish_uploads(self):
+        """Wait for the background uploads, then upload whatever they left behind."""
+        if self.upload_tasks:
+            print("Waiting for remaining uploads to complete...")
+            await asyncio.gather(*self.upload_tasks)
+        await self.upload_to_nas()
+
     async def upload_to_nas(self):
         print("Uploading onto NAS")
 
@@ -119,20 +174,8 @@ class Pauline():
                 bar.set_description(f'Uploading {subdir_name}')
                 
                 try:
-                    result = await self.ssh.run(
-                        f"scp -P 7722 -r {subdir} dumper@nas.herniarchiv.cz:dumps/pauline2/Disks_Captures/",
-                        check=True
-                    )
-                    
-                    if result.stderr and "update_known_hosts: hostfile_replace_entries failed" in str(result.stderr):
-                        # This happens on Pauline because the filesystem doesn't support links.
-                        # bar.write(f"Note: update_known_hosts failed for {subdir_name}, but this is not a problem.")
-                        pass
-                    
+                    await self.upload_capture_directory(subdir)
                     bar.write(f"Uploaded {subdir_name}")
-                    
-                    await self.ssh.run(f"mv {subdir} /home/pauline/Disks_Captures_Done/")
-                    # bar.write(f"Moved {subdir_name} to Disks_Captures_Done")
                     bar.update(1)
                     
                 except asyncssh.process.ProcessError as e:
@@ -215,14 +258,16 @@ class Pauline():
                 await self.send_ws(f'dump {floppy_index} 0 {NUM_TRACKS} 0 1 0 0 0 0 "{filename}" "" 1 AUTO_INDEX_NAME "" "" ""')
                 bar = tqdm.tqdm(total=NUM_TRACKS, desc='track', leave=False)
                 bar.update(0)
+                capture_name = None
                 while True:
                     message = await self.ws.recv()
                     bar.write(f"[{num_str}] <<< {message.strip()}")
-                    # use regex to extract 37 and 0 from ...t_rh6791-0001/track37.0.hxcstream
-                    match = re.search(r'/track(\d+)\.(\d+)\.hxcstream', message)
+                    # use regex to extract the directory, 37 and 0 from ...t_rh6791-0001/track37.0.hxcstream
+                    match = re.search(r'([^/\s]+)/track(\d+)\.(\d+)\.hxcstream', message)
                     if match:
-                        track = int(match.group(1))
-                        side = int(match.group(2))
+                        capture_name = match.group(1)
+                        track = int(match.group(2))
+                        side = int(match.group(3))
                         bar.update(0.5)
                         # Save the track image after each track is completed
                         # Create background task for image saving
@@ -243,6 +288,11 @@ class Pauline():
                     await asyncio.gather(*self.pending_tasks)
                 bar.close()
                 bar_outer.update(1)
+                if capture_name is not None:
+                    self.start_upload(capture_name)
+                else:
+                    # Left for the upload after the batch, which finds every capture directory
+                    bar_outer.write(f"Warning: No tracks were reported for {filename}, uploading it after the batch")
             except KeyboardInterrupt:
                 await self.send_ws('stop')
                 raise
@@ -254,7 +304,7 @@ class Pauline():
         
         await asyncio.gather(
             self.return_heads(drives=list(range(len(floppy_names)))),
-            self.upload_to_nas()
+            self.finish_uploads()
         )
 
         await self.send_ws("sound 2550 200")
@@ -1,16 +1,21 @@
 # Goal of the script: Run the HxCFloppyEmulator software on disk captures made with Pauline
 # and output information about the floppy, sectors, formatting, contents in JSON.
 
+from collections.abc import Callable
+from contextlib import nullcontext
 from dataclasses import dataclass
+import hashlib
 from os import mkdir
 import os
+import itertools
 import re
 import shutil
 import subprocess
 import shlex
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import sys
+import time
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import uuid
@@ -18,48 +23,79 @@ import uuid
 import click
 from jinja2 import Environment, FileSystemLoader
 from tqdm import tqdm
-from python_imd.imd import Disk
+from python_imd.imd import Disk, DiskStats
 from event.events import Event, FloppyDiskCaptureDirectoryConverted, FloppyDiskCaptureSummarized, PyHXCFEERunFinished, PyHXCFEERunStarted, PyHXCFERunId
 from event.event_store import EventStore
-from event.datatypes import FloppyInfoFromIMD, FloppyInfoFromName, FloppyInfoFromXML
+from event.datatypes import FloppyInfoFromFlux, FloppyInfoFromIMD, FloppyInfoFromName, FloppyInfoFromXML
+from conversion_manifest import CONVERSION_MANIFEST_FILENAME, ConversionManifest, get_capture_inputs, get_hxcfe_fingerprint, read_manifest, write_manifest
+from capture_index import scan_capture_directories
+from capture_pack import get_capture_pack_path, is_packed_capture, open_capture_directory
+from content_store import COMPRESSED_SUFFIX, get_content_store_dir, get_output_path, open_output, output_exists, store_parsed_dir
+from flux_analysis import analyze_capture
+from flux_preview import PREVIEW_FILENAMES, THUMBNAIL_FILENAMES, ensure_previews
+from leases import HEARTBEAT_SECONDS, Lease, LeaseKeeper, LeaseLost, get_lease_owner
+from capture_watcher import POLL_SECONDS, RETRY_SECONDS, SETTLE_SECONDS, CaptureWatcher, get_capture_signature, is_capture_settled
+from summary_cache import SUMMARY_CACHE_FILENAME, CachedSummaryInfo, SummaryCache, get_file_signature
 from util import floppy_disk_capture_filename_to_id, get_git_version
 
 HXCFE_BINARY_PATH = Path('/home/sanqui/ha/HxCFloppyEmulator/build/hxcfe')
 WORKERS=16
 
+# Rough peak memory use of a single hxcfe conversion, used to size --workers auto
+HXCFE_WORKER_MEMORY = 1024 * 1024 * 1024
+
+# Bump when parse_generic_xml, parse_imd_file or analyze_capture change what
+# they extract, so that cached summaries are parsed again.
+SUMMARY_PARSER_VERSION = 3
+
+SUMMARY_FILES = ["GENERIC_XML.xml", "IMD_IMG.imd"]
+
 FORMATS = [
     ('GENERIC_XML', 'xml'),
     ('RAW_IMG', 'img'),
     ('RAW_LOADER', 'img'),
-    # ('HXC_HFE', 'hfe'),
-    # ('HXC_HFEV3', 'hfe'),
-    # ('HXC_EXTHFE', 'hfe'),
-    # ('ZXSPECTRUM_FDI', 'fdi'),
-    # ('ZXSPECTRUM_TRD', 'trd'),
-    # ('ZXSPECTRUM_SCL', 'scl'),
     ('IMD_IMG', 'imd'),
     ('PNG_IMAGE', 'png'),
+]
+
+# Replaced by the flux previews rendered while summarizing, unless --hxcfe-previews is given
+HXCFE_PREVIEW_FORMATS = [
     ('PNG_STREAM_IMAGE', 'png'),
     ('PNG_DISK_IMAGE', 'png'),
 ]
 
-def convert_disk_capture_directory(pyhxcfe_run_id: PyHXCFERunId, hxcfe_binary_path: Path, floppy_subdir: Path) -> list[Event]:
-    floppy_disk_capture_id = floppy_disk_capture_filename_to_id(floppy_subdir.name)
-    parsed_dir = floppy_subdir.parent / (floppy_subdir.name + "_parsed_wip")
-    if not os.path.exists(parsed_dir):
-        mkdir(parsed_dir)
+# Formats which are not generated by default but can be selected with --formats
+EXTRA_FORMATS = HXCFE_PREVIEW_FORMATS + [
+    ('HXC_HFE', 'hfe'),
+    ('HXC_HFEV3', 'hfe'),
+    ('HXC_EXTHFE', 'hfe'),
+    ('ZXSPECTRUM_FDI', 'fdi'),
+    ('ZXSPECTRUM_TRD', 'trd'),
+    ('ZXSPECTRUM_SCL', 'scl'),
+]
 
-    first_file = next(floppy_subdir.iterdir())
+# Raw sector image formats which can be written from IMD_IMG instead of decoding the flux again
+RAW_FORMATS_FROM_IMD = ['RAW_IMG', 'RAW_LOADER']
+
+# Image renders are much slower than the other formats, so they run in a
+# separate, deferred lane after the summary has been generated
+IMAGE_FORMATS = ['PNG_IMAGE', 'PNG_STREAM_IMAGE', 'PNG_DISK_IMAGE']
+IMAGE_WORKERS = 4
+IMAGE_NICENESS = 10
+
+def run_hxcfe(hxcfe_binary_path: Path, first_file: Path, parsed_dir: Path, formats: list[tuple[str, str]], niceness: int = 0):
     cmd: list[str] = [
         hxcfe_binary_path.as_posix(),
         '-finput:' + shlex.quote(str(first_file)),
     ]
+    if niceness:
+        cmd = ['nice', '-n', str(niceness)] + cmd
 
-    for fmt, extension in FORMATS:
+    for fmt, extension in formats:
         cmd.append('-conv:' + fmt)
         cmd.append('-foutput:' + shlex.quote(str(parsed_dir / (f'{fmt}.{extension}'))))
 
-    with open(parsed_dir / 'stdout.txt', 'w') as f_stdout, open(parsed_dir / 'stderr.txt', 'w') as f_stderr:
+    with open(parsed_dir / 'stdout.txt', 'a') as f_stdout, open(parsed_dir / 'stderr.txt', 'a') as f_stderr:
         subprocess.run(
             args=cmd,
             stdout=f_stdout,
@@ -68,7 +104,178 @@ def convert_disk_capture_directory(pyhxcfe_run_id: PyHXCFERunId, hxcfe_binary_pa
             env=dict(os.environ, LD_LIBRARY_PATH=hxcfe_binary_path.parent.as_posix())
         )
 
-    os.rename(parsed_dir, floppy_subdir.parent / (floppy_subdir.name + "_parsed"))
+def export_raw_formats_from_imd(imd_path: Path, parsed_dir: Path, formats: list[tuple[str, str]]) -> bool:
+    """
+    Write raw sector image formats into parsed_dir from the IMD at imd_path.
+    Returns False without writing anything if the IMD did not decode cleanly.
+    """
+    try:
+        stats = DiskStats.from_file(str(imd_path))
+    except Exception:
+        return False
+
+    if stats.track_count == 0 or stats.error_count or stats.unavailable_count:
+        return False
+
+    first_output_path: Path | None = None
+    with Disk.open(str(imd_path), lazy=True) as disk:
+        for fmt, extension in formats:
+            output_path = parsed_dir / f'{fmt}.{extension}'
+            if first_output_path is None:
+                disk.to_raw_file(str(output_path))
+                first_output_path = output_path
+            else:
+                shutil.copyfile(first_output_path, output_path)
+
+    return True
+
+@dataclass
+class ConversionPlan():
+    formats: list[tuple[str, str]]
+    replace: bool
+    """
+    Whether the existing _parsed directory is outdated and gets replaced,
+    otherwise the converted formats are added to it.
+    """
+    force: bool = False
+    """
+    Convert even if the capture turns out to be up to date once it is
+    claimed, for --redo.
+    """
+
+def plan_conversion(floppy_subdir: Path, hxcfe_fingerprint: str, formats: list[tuple[str, str]]) -> ConversionPlan | None:
+    """
+    Decide which formats of an already converted capture have to be
+    generated, or None if it is up to date.
+    """
+    finished_parsed_dir = floppy_subdir.parent / (floppy_subdir.name + "_parsed")
+    manifest = read_manifest(finished_parsed_dir)
+    if manifest is None:
+        # Converted before manifests were recorded, nothing to compare against,
+        # so only add the formats whose outputs are missing
+        missing_formats = [(fmt, extension) for fmt, extension in formats
+                           if not output_exists(finished_parsed_dir / f'{fmt}.{extension}')]
+        return ConversionPlan(formats=missing_formats, replace=False) if missing_formats else None
+
+    if manifest.hxcfe_fingerprint != hxcfe_fingerprint or not manifest.is_current(
+        get_capture_inputs(floppy_subdir, manifest), hxcfe_fingerprint
+    ):
+        # Every existing output is outdated, regenerate them along with the requested formats
+        return ConversionPlan(formats=formats + [
+            (fmt, extension) for fmt, extension in FORMATS + EXTRA_FORMATS
+            if fmt in manifest.formats and (fmt, extension) not in formats
+        ], replace=True)
+
+    missing_formats = [(fmt, extension) for fmt, extension in formats if fmt not in manifest.formats]
+    return ConversionPlan(formats=missing_formats, replace=False) if missing_formats else None
+
+def split_conversion_plan(plan: ConversionPlan) -> tuple[ConversionPlan | None, ConversionPlan | None]:
+    """
+    Split a plan into the fast lane and the image lane.  The image lane is
+    merged into the directory the fast lane produced.
+    """
+    fast_formats = [(fmt, extension) for fmt, extension in plan.formats if fmt not in IMAGE_FORMATS]
+    image_formats = [(fmt, extension) for fmt, extension in plan.formats if fmt in IMAGE_FORMATS]
+    if not fast_formats:
+        return None, plan
+    return (
+        ConversionPlan(formats=fast_formats, replace=plan.replace, force=plan.force),
+        ConversionPlan(formats=image_formats, replace=False) if image_formats else None
+    )
+
+def merge_parsed_dir(parsed_dir: Path, finished_parsed_dir: Path):
+    """
+    Move the outputs of a conversion in parsed_dir into the existing
+    finished_parsed_dir, replacing each file atomically.  Logs are appended
+    and the manifest is moved last.
+
+    Outputs are replaced by renaming, never written in place, as stored
+    outputs are read-only hardlinks shared with other _parsed directories.
+    A compressed copy of a replaced output is removed.
+    """
+    for path in sorted(parsed_dir.iterdir(), key=lambda path: path.name == CONVERSION_MANIFEST_FILENAME):
+        if path.name in ('stdout.txt', 'stderr.txt'):
+            with open(path, 'rb') as f_new, open(finished_parsed_dir / path.name, 'ab') as f_existing:
+                shutil.copyfileobj(f_new, f_existing)
+            continue
+        os.replace(path, finished_parsed_dir / path.name)
+        (finished_parsed_dir / (path.name + COMPRESSED_SUFFIX)).unlink(missing_ok=True)
+
+    shutil.rmtree(parsed_dir)
+
+def convert_disk_capture_directory(pyhxcfe_run_id: PyHXCFERunId, hxcfe_binary_path: Path, floppy_subdir: Path,
+                                   hxcfe_fingerprint: str, formats: list[tuple[str, str]] = FORMATS,
+                                   replace: bool = True, raw_from_imd: bool = False, niceness: int = 0,
+                                   lease: Lease | None = None) -> list[Event]:
+    """
+    Convert a capture into the given formats.  Unless replace is set, an
+    existing _parsed directory is kept and the new outputs are merged into it.
+
+    The caller must hold the lease of the capture.  If it is passed in, the
+    outputs are only put in place if the lease is still held.
+    """
+    floppy_disk_capture_id = floppy_disk_capture_filename_to_id(floppy_subdir.name)
+    parsed_dir = floppy_subdir.parent / (floppy_subdir.name + "_parsed_wip")
+    finished_parsed_dir = floppy_subdir.parent / (floppy_subdir.name + "_parsed")
+    old_parsed_dir = floppy_subdir.parent / (floppy_subdir.name + "_parsed_old")
+
+    # Left behind by a conversion interrupted on this or another node
+    for leftover_dir in (parsed_dir, old_parsed_dir):
+        if os.path.isdir(leftover_dir):
+            shutil.rmtree(leftover_dir)
+    mkdir(parsed_dir)
+
+    manifest = read_manifest(finished_parsed_dir)
+    merge = not replace and os.path.isdir(finished_parsed_dir)
+
+    inputs = get_capture_inputs(floppy_subdir, manifest)
+
+    raw_formats = [(fmt, extension) for fmt, extension in formats if fmt in RAW_FORMATS_FROM_IMD] if raw_from_imd else []
+    hxcfe_formats = [(fmt, extension) for fmt, extension in formats if (fmt, extension) not in raw_formats]
+    # hxcfe needs the track files on disk, packed captures are unpacked for it
+    with open_capture_directory(floppy_subdir) as capture_dir:
+        first_file = next(capture_dir.iterdir())
+
+        if hxcfe_formats:
+            run_hxcfe(hxcfe_binary_path, first_file, parsed_dir, hxcfe_formats, niceness)
+        if raw_formats:
+            imd_dir = finished_parsed_dir if merge and 'IMD_IMG' not in (fmt for fmt, _ in formats) else parsed_dir
+            if not export_raw_formats_from_imd(imd_dir / 'IMD_IMG.imd', parsed_dir, raw_formats):
+                # The IMD has errors or missing sectors, let hxcfe decode the flux for these
+                run_hxcfe(hxcfe_binary_path, first_file, parsed_dir, raw_formats, niceness)
+
+    if lease is not None and not lease.is_held():
+        raise LeaseLost(f"lease of {floppy_subdir.name} was taken over by another node")
+
+    if merge:
+        if manifest is not None:
+            write_manifest(parsed_dir, ConversionManifest(
+                inputs=inputs,
+                hxcfe_fingerprint=hxcfe_fingerprint,
+                formats=manifest.formats + [fmt for fmt, _ in formats if fmt not in manifest.formats]
+            ))
+        # The manifest is moved last, so it never lists a format before its output is in place
+        merge_parsed_dir(parsed_dir, finished_parsed_dir)
+    else:
+        write_manifest(parsed_dir, ConversionManifest(
+            inputs=inputs,
+            hxcfe_fingerprint=hxcfe_fingerprint,
+            formats=[fmt for fmt, _ in formats]
+        ))
+
+        if os.path.isdir(finished_parsed_dir):
+            # Replacing an outdated conversion
+            os.rename(finished_parsed_dir, old_parsed_dir)
+            os.rename(parsed_dir, finished_parsed_dir)
+            shutil.rmtree(old_parsed_dir)
+        else:
+            os.rename(parsed_dir, finished_parsed_dir)
+
+    try:
+        store_parsed_dir(finished_parsed_dir, get_content_store_dir(finished_parsed_dir))
+    except OSError as e:
+        # The outputs are complete either way, they just take more space
+        print(f"Failed to move the outputs of {floppy_subdir.name} into the content store: {e}")
 
     return [
         FloppyDiskCaptureDirectoryConverted(
@@ -77,7 +284,7 @@ def convert_disk_capture_directory(pyhxcfe_run_id: PyHXCFERunId, hxcfe_binary_pa
             floppy_disk_capture_id_source='hashed_directory_name',
             floppy_disk_capture_directory=floppy_subdir.name,
             success=True,
-            formats=[fmt for fmt, _ in FORMATS]
+            formats=[fmt for fmt, _ in formats]
         )
     ]
 
@@ -114,71 +321,108 @@ def parse_name(floppy_subdir_name: str) -> FloppyInfoFromName:
     )
 
 
-def parse_generic_xml(xml_path: Path) -> FloppyInfoFromXML:
-    """Parse GENERIC_XML.xml file and extract key information."""
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    
-    layout = root.find('layout')
-    assert layout is not None
-    
-    file_size = root.findtext('file_size')
-    number_of_track = layout.findtext('number_of_track')
-    number_of_side = layout.findtext('number_of_side')
-    format_text = layout.findtext('format')
-    sector_per_track = layout.findtext('sector_per_track')
-    sector_size = layout.findtext('sector_size')
-    bitrate = layout.findtext('bitrate')
-    rpm = layout.findtext('rpm')
-    crc32 = layout.findtext('crc32')
-    
-    assert file_size is not None
-    assert number_of_track is not None
-    assert number_of_side is not None
-    assert format_text is not None
-    assert sector_per_track is not None
-    assert sector_size is not None
-    assert bitrate is not None
-    assert rpm is not None
-    assert crc32 is not None
-    
-    return FloppyInfoFromXML(
-        file_size=int(file_size),
-        number_of_tracks=int(number_of_track),
-        number_of_sides=int(number_of_side),
-        format=format_text,
-        sector_per_track=int(sector_per_track),
-        sector_size=int(sector_size),
-        bitrate=int(bitrate),
-        rpm=int(rpm),
-        crc32=int(crc32, 16),
+# Fields read from <layout> in GENERIC_XML.xml, besides <file_size> at the top level
+GENERIC_XML_LAYOUT_FIELDS = ['number_of_track', 'number_of_side', 'format', 'sector_per_track', 'sector_size',
+                             'bitrate', 'rpm', 'crc32']
+
+@dataclass
+class XMLTrackStats():
+    track_number: int
+    side_number: int
+    format: str | None = None
+    sector_count: int = 0
+    data_size: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.track_number:02}.{self.side_number}"
+
+def _parse_generic_xml(xml_path: Path, with_track_stats: bool) -> tuple[FloppyInfoFromXML, list[XMLTrackStats]]:
+    """
+    Read GENERIC_XML.xml in a single streaming pass.  Elements are freed as
+    soon as they are read, track statistics are counted as their sectors go
+    by.  Without track statistics parsing stops once every field is found.
+    """
+    values: dict[str, str | None] = {}
+    track_stats: list[XMLTrackStats] = []
+    track: XMLTrackStats | None = None
+    path: list[ET.Element] = []
+
+    with open_output(xml_path) as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if with_track_stats and elem.tag == 'track' and path and path[-1].tag == 'track_list':
+                    track = XMLTrackStats(track_number=int(elem.get('track_number', '0')),
+                                          side_number=int(elem.get('side_number', '0')))
+                path.append(elem)
+                continue
+
+            path.pop()
+            if len(path) == 1 and elem.tag == 'file_size':
+                values['file_size'] = elem.text
+            elif len(path) == 2 and path[-1].tag == 'layout' and elem.tag in GENERIC_XML_LAYOUT_FIELDS:
+                values[elem.tag] = elem.text
+            elif track is not None:
+                if elem.tag == 'sector':
+                    track.sector_count += 1
+                    track.data_size += int(elem.get('sector_size', '0'))
+                elif elem.tag == 'format' and path[-1].tag == 'track':
+                    track.format = elem.text
+                elif elem.tag == 'track':
+                    track_stats.append(track)
+                    track = None
+
+            if path:
+                elem.clear()
+                path[-1].remove(elem)
+
+            if not with_track_stats and len(values) == len(GENERIC_XML_LAYOUT_FIELDS) + 1:
+                break
+
+    fields = {field: value for field, value in values.items() if value is not None}
+    missing = [field for field in ['file_size'] + GENERIC_XML_LAYOUT_FIELDS if field not in fields]
+    if missing:
+        raise ValueError(f"{xml_path} is missing {', '.join(missing)}")
+
+    sector_per_track = int(fields['sector_per_track'])
+    xml_info = FloppyInfoFromXML(
+        file_size=int(fields['file_size']),
+        number_of_tracks=int(fields['number_of_track']),
+        number_of_sides=int(fields['number_of_side']),
+        format=fields['format'],
+        sector_per_track=sector_per_track,
+        sector_size=int(fields['sector_size']),
+        bitrate=int(fields['bitrate']),
+        rpm=int(fields['rpm']),
+        crc32=int(fields['crc32'], 16),
+        short_tracks=[stats.name for stats in track_stats if stats.sector_count < sector_per_track],
     )
-    
+    return xml_info, track_stats
+
+def parse_generic_xml(xml_path: Path) -> FloppyInfoFromXML:
+    """Parse GENERIC_XML.xml file and extract key information, without track statistics."""
+    xml_info, _ = _parse_generic_xml(xml_path, with_track_stats=False)
+    return xml_info
+
+def parse_generic_xml_with_track_stats(xml_path: Path) -> tuple[FloppyInfoFromXML, list[XMLTrackStats]]:
+    """
+    Parse GENERIC_XML.xml file, also collecting sector statistics of every
+    track.  The tracks with fewer sectors than the layout are listed in the
+    short_tracks of the returned information.
+    """
+    return _parse_generic_xml(xml_path, with_track_stats=True)
 
 
 def parse_imd_file(imd_path: Path) -> FloppyInfoFromIMD:
     """Parse IMD file and extract key information."""
     try:
-        disk = Disk.from_file(str(imd_path))
-        
-        # Collect statistics
-        mode_names: list[str] = []
-        errors = 0
-        
-        for track in disk.tracks:
-            if track.mode.name not in mode_names:
-                mode_names.append(track.mode.name)
-
-            for record in track.sector_data_records:
-                if hasattr(record, 'record_type') and hasattr(record.record_type, 'has_error'):
-                    if record.record_type.has_error:
-                        errors += 1
+        stats = DiskStats.from_file(str(imd_path))
         
         return FloppyInfoFromIMD(
             parsing_success=True,
-            tracks=len(disk.tracks),
-            modes=mode_names,
-            error_count=errors,
+            tracks=stats.track_count,
+            modes=[mode.name for mode in stats.modes],
+            error_count=stats.error_count,
             parsing_errors=None
         )
     except Exception as e:
@@ -190,71 +434,459 @@ def parse_imd_file(imd_path: Path) -> FloppyInfoFromIMD:
             parsing_errors=f'Error: {str(e)}',
         )
 
+def get_flux_info(floppy_subdir: Path) -> FloppyInfoFromFlux | None:
+    """Analyze the raw capture of a _parsed directory, or return None if it is gone or unreadable."""
+    capture_dir = floppy_subdir.parent / floppy_subdir.name.removesuffix("_parsed")
+    try:
+        return analyze_capture(capture_dir)
+    except (OSError, ValueError):
+        return None
+
+def get_image_files(floppy_subdir: Path, full_size_previews: bool = False) -> list[str]:
+    """
+    Render the flux previews of a _parsed directory unless they exist, and
+    return the names of the images the summary can link to.
+    """
+    hxcfe_images = [f'{fmt}.png' for fmt in IMAGE_FORMATS if os.path.exists(floppy_subdir / f'{fmt}.png')]
+    capture_dir = floppy_subdir.parent / floppy_subdir.name.removesuffix("_parsed")
+    return hxcfe_images + ensure_previews(capture_dir, floppy_subdir, full_size_previews)
+
+def get_summary_signature(floppy_subdir: Path) -> str | None:
+    """
+    Get the signature a summary is cached with, or None if the outputs it is
+    parsed from are missing.  Besides the XML and IMD outputs it covers the
+    files of the raw capture, which the flux information is read from.
+    """
+    file_signature = get_file_signature([get_output_path(floppy_subdir / file_name) for file_name in SUMMARY_FILES])
+    if file_signature is None:
+        return None
+    capture_signature = get_capture_signature(floppy_subdir.with_name(floppy_subdir.name.removesuffix('_parsed')))
+    return f"{file_signature},{hashlib.sha256(repr(capture_signature).encode()).hexdigest()}"
+
+def has_previews(floppy_subdir: Path, full_size_previews: bool = False) -> bool:
+    return all(os.path.exists(floppy_subdir / file_name)
+               for file_name in (PREVIEW_FILENAMES if full_size_previews else THUMBNAIL_FILENAMES))
+
 @dataclass
 class FloppySummaryRow():
     summary_event: FloppyDiskCaptureSummarized
     floppy_subdir: Path
+    image_files: list[str]
 
-def process_converted_disks(pyhxcfe_run_id: PyHXCFERunId, disk_captures_dir: Path, output_file: Path):
-    """Gather data from converted disks and generate HTML summary."""
+def summarize_converted_disk(pyhxcfe_run_id: PyHXCFERunId, floppy_subdir: Path,
+                             cached_info: CachedSummaryInfo | None = None,
+                             full_size_previews: bool = False) -> FloppySummaryRow:
+    """
+    Parse the outputs of a single converted disk capture into a summary row.
+    If cached_info is given, it is used instead of parsing the XML and IMD
+    files and analyzing the flux of the raw capture.  Missing flux previews
+    are rendered either way.
+    """
+    floppy_disk_capture_id = floppy_disk_capture_filename_to_id(floppy_subdir.name)
 
-    floppy_summaries: list[FloppySummaryRow] = []
+    name_info: FloppyInfoFromName = parse_name(floppy_subdir.name)
+    
+    if cached_info is not None:
+        xml_info, imd_info, flux_info = cached_info
+    else:
+        xml_info, _ = parse_generic_xml_with_track_stats(floppy_subdir / "GENERIC_XML.xml")
+        imd_info = parse_imd_file(floppy_subdir / "IMD_IMG.imd")
+        flux_info = get_flux_info(floppy_subdir)
+    
+    summary_event = FloppyDiskCaptureSummarized(
+        pyhxcfe_run_id=pyhxcfe_run_id,
+        floppy_disk_capture_id=floppy_disk_capture_id,
+        floppy_disk_capture_id_source='hashed_directory_name',
+        floppy_disk_capture_directory=floppy_subdir.name,
+        name_info=name_info,
+        xml_info=xml_info,
+        imd_info=imd_info,
+        flux_info=flux_info
+    )
 
-    # Collect all processed directories
-    for floppy_dir in sorted(disk_captures_dir.iterdir()):
-        if not floppy_dir.is_dir():
-            continue
-            
-        for floppy_subdir in sorted(floppy_dir.iterdir()):
-            if not floppy_subdir.name.endswith("_parsed"):
-                continue
-            floppy_disk_capture_id = floppy_disk_capture_filename_to_id(floppy_subdir.name)
-
-            name_info: FloppyInfoFromName = parse_name(floppy_subdir.name)
-            
-            xml_info: FloppyInfoFromXML = parse_generic_xml(floppy_subdir / "GENERIC_XML.xml")
-            
-            imd_info: FloppyInfoFromIMD = parse_imd_file(floppy_subdir / "IMD_IMG.imd")
-            
-            summary_event = FloppyDiskCaptureSummarized(
-                pyhxcfe_run_id=pyhxcfe_run_id,
-                floppy_disk_capture_id=floppy_disk_capture_id,
-                floppy_disk_capture_id_source='hashed_directory_name',
-                floppy_disk_capture_directory=floppy_subdir.name,
-                name_info=name_info,
-                xml_info=xml_info,
-                imd_info=imd_info
-            )
-
-            floppy_summary_row = FloppySummaryRow(
-                summary_event=summary_event,
-                floppy_subdir=floppy_subdir
-            )
-
-            floppy_summaries.append(floppy_summary_row)
+    return FloppySummaryRow(
+        summary_event=summary_event,
+        floppy_subdir=floppy_subdir,
+        image_files=get_image_files(floppy_subdir, full_size_previews)
+    )
+
+def find_converted_disks(disk_captures_dir: Path, use_capture_index: bool = True) -> list[Path]:
+    """Find all _parsed directories in sorted order."""
+    return [floppy_subdir for floppy_subdir in scan_capture_directories(disk_captures_dir, use_index=use_capture_index)
+            if floppy_subdir.name.endswith("_parsed")]
+
+
+class SummaryPipeline:
+    """
+    Summarizes converted disks in worker processes as soon as they are
+    submitted, so that summarizing overlaps with the conversions still
+    running.  Unchanged disks are taken from the summary cache instead,
+    unless their flux previews still have to be rendered.
+    """
+
+    def __init__(self, pyhxcfe_run_id: PyHXCFERunId, disk_captures_dir: Path, workers: int = WORKERS,
+                 use_summary_cache: bool = True, full_size_previews: bool = False) -> None:
+        self.pyhxcfe_run_id = pyhxcfe_run_id
+        self.full_size_previews = full_size_previews
+        self.summary_cache = SummaryCache(disk_captures_dir / SUMMARY_CACHE_FILENAME, SUMMARY_PARSER_VERSION) if use_summary_cache else None
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending: dict[Path, tuple[str, str | None, CachedSummaryInfo | Future[FloppySummaryRow]]] = {}
+
+    def __enter__(self) -> 'SummaryPipeline':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def submit(self, floppy_subdir: Path) -> None:
+        """Start summarizing a _parsed directory."""
+        capture_directory = f"{floppy_subdir.parent.name}/{floppy_subdir.name}"
+        file_signature = get_summary_signature(floppy_subdir)
+        cached_info = None
+        if self.summary_cache is not None and file_signature is not None:
+            cached_info = self.summary_cache.get(capture_directory, file_signature)
+        if cached_info is not None and has_previews(floppy_subdir, self.full_size_previews):
+            self.pending[floppy_subdir] = (capture_directory, file_signature, cached_info)
+        else:
+            self.pending[floppy_subdir] = (capture_directory, file_signature,
+                                           self.executor.submit(summarize_converted_disk, self.pyhxcfe_run_id, floppy_subdir,
+                                                                cached_info, self.full_size_previews))
+
+    def collect(self) -> list[FloppySummaryRow]:
+        """Wait for all submitted directories and return their summaries in sorted order."""
+        floppy_summaries: list[FloppySummaryRow] = []
+        cache_hits = 0
+
+        with tqdm(total=len(self.pending), desc='summary') as pbar:
+            for floppy_subdir in sorted(self.pending):
+                capture_directory, file_signature, result = self.pending[floppy_subdir]
+                try:
+                    if isinstance(result, Future):
+                        floppy_summary_row = result.result()
+                        self._cache_summary(capture_directory, file_signature, floppy_summary_row)
+                    else:
+                        floppy_summary_row = summarize_converted_disk(self.pyhxcfe_run_id, floppy_subdir, result,
+                                                                      self.full_size_previews)
+                        cache_hits += 1
+                    floppy_summaries.append(floppy_summary_row)
+                except Exception as e:
+                    pbar.write(f"Failed to summarize {floppy_subdir.name}: {type(e).__name__}: {e}")
+                pbar.update(1)
+
+        if self.summary_cache is not None:
+            print(f"Summary cache: {cache_hits} cached, {len(self.pending) - cache_hits} parsed.")
 
+        self.pending = {}
+        return floppy_summaries
+
+    def _cache_summary(self, capture_directory: str, file_signature: str | None,
+                       floppy_summary_row: FloppySummaryRow) -> None:
+        if self.summary_cache is not None and file_signature is not None:
+            self.summary_cache.put(capture_directory, file_signature,
+                                   floppy_summary_row.summary_event.xml_info,
+                                   floppy_summary_row.summary_event.imd_info,
+                                   floppy_summary_row.summary_event.flux_info)
+
+    def close(self) -> None:
+        """
+        Stop the workers and close the cache.  Summaries which finished but
+        were never collected, because a conversion failed, are still cached.
+        """
+        self.executor.shutdown(cancel_futures=True)
+        for capture_directory, file_signature, result in self.pending.values():
+            if isinstance(result, Future) and result.done() and not result.cancelled() and result.exception() is None:
+                self._cache_summary(capture_directory, file_signature, result.result())
+        self.pending = {}
+        if self.summary_cache is not None:
+            self.summary_cache.close()
+            self.summary_cache = None
+
+
+@dataclass
+class SummaryPage():
+    title: str
+    file_name: str
+    floppy_count: int
+    first_name: str
+    last_name: str
+
+def paginate_summaries(floppy_summaries: list[FloppySummaryRow], output_file: Path, page_size: int = 0,
+                       split_by_collection: bool = False) -> list[SummaryPage]:
+    """
+    Split summary rows into pages of at most page_size rows (0 for no limit),
+    optionally starting a new set of pages for every collection directory.
+    Pages only record how many rows they take, in order, so the rows are
+    not copied.
+    """
+    groups: list[tuple[str | None, int, int]] = []
+    if split_by_collection:
+        group_start = 0
+        for collection, rows in itertools.groupby(floppy_summaries, key=lambda row: row.floppy_subdir.parent.name):
+            group_stop = group_start + sum(1 for _ in rows)
+            groups.append((collection, group_start, group_stop))
+            group_start = group_stop
+    else:
+        groups.append((None, 0, len(floppy_summaries)))
+
+    pages: list[SummaryPage] = []
+    for collection, group_start, group_stop in groups:
+        chunk_size = page_size or (group_stop - group_start) or 1
+        chunk_starts = range(group_start, group_stop, chunk_size) or range(group_start, group_start + 1)
+        for page_number, chunk_start in enumerate(chunk_starts, start=1):
+            chunk_stop = min(chunk_start + chunk_size, group_stop)
+            title_parts = []
+            name_parts = [output_file.stem]
+            if collection is not None:
+                title_parts.append(collection)
+                name_parts.append(collection)
+            if len(chunk_starts) > 1:
+                title_parts.append(f"page {page_number} of {len(chunk_starts)}")
+                name_parts.append(f"{page_number:04}")
+            pages.append(SummaryPage(
+                title=', '.join(title_parts),
+                file_name='_'.join(name_parts) + output_file.suffix,
+                floppy_count=chunk_stop - chunk_start,
+                first_name=floppy_summaries[chunk_start].floppy_subdir.name if chunk_stop > chunk_start else '',
+                last_name=floppy_summaries[chunk_stop - 1].floppy_subdir.name if chunk_stop > chunk_start else ''
+            ))
+
+    return pages
+
+def write_summary_html(floppy_summaries: list[FloppySummaryRow], disk_captures_dir: Path, output_file: Path,
+                       page_size: int = 0, split_by_collection: bool = False):
+    """
+    Generate the HTML summary of converted disks.  The pages are streamed to
+    disk as they are rendered, each from an iterator over its rows.  When
+    the summary is split into pages, output_file becomes an index page
+    linking to them.
+
+    Only the rendering is streamed, the rows themselves are passed in as a
+    list, as the caller still emits their events afterwards.
+    """
     # Generate HTML using Jinja2
     template_dir = Path(__file__) .parent / 'templates'
     env = Environment(loader=FileSystemLoader(template_dir))
     template = env.get_template('summary.html')
-    
-    html = template.render(
-        total_floppies=len(floppy_summaries),
-        generated_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        source_directory=str(disk_captures_dir),
-        floppy_summaries=floppy_summaries
-    )
-    
+    generated_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    if not page_size and not split_by_collection:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for chunk in template.generate(
+                total_floppies=len(floppy_summaries),
+                generated_time=generated_time,
+                source_directory=str(disk_captures_dir),
+                floppy_summaries=floppy_summaries
+            ):
+                f.write(chunk)
+
+        print(f"\nHTML summary generated: {output_file}")
+        print(f"Total floppies: {len(floppy_summaries)}")
+        return
+
+    pages = paginate_summaries(floppy_summaries, output_file, page_size, split_by_collection)
+    rows = iter(floppy_summaries)
+    for i, page in enumerate(pages):
+        with open(output_file.parent / page.file_name, 'w', encoding='utf-8') as f:
+            for chunk in template.generate(
+                total_floppies=page.floppy_count,
+                generated_time=generated_time,
+                source_directory=str(disk_captures_dir),
+                floppy_summaries=itertools.islice(rows, page.floppy_count),
+                page_title=page.title,
+                index_file=output_file.name,
+                previous_file=pages[i - 1].file_name if i > 0 else None,
+                next_file=pages[i + 1].file_name if i + 1 < len(pages) else None
+            ):
+                f.write(chunk)
+
+    index_template = env.get_template('summary_index.html')
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html)
+        for chunk in index_template.generate(
+            total_floppies=len(floppy_summaries),
+            generated_time=generated_time,
+            source_directory=str(disk_captures_dir),
+            pages=pages
+        ):
+            f.write(chunk)
 
-    
-    print(f"\nHTML summary generated: {output_file}")
+    print(f"\nHTML summary generated: {output_file} ({len(pages)} pages)")
     print(f"Total floppies: {len(floppy_summaries)}")
 
+
+def process_converted_disks(pyhxcfe_run_id: PyHXCFERunId, disk_captures_dir: Path, output_file: Path, workers: int = WORKERS,
+                            use_summary_cache: bool = True, page_size: int = 0, split_by_collection: bool = False,
+                            use_capture_index: bool = True, full_size_previews: bool = False):
+    """Gather data from converted disks and generate HTML summary."""
+    with SummaryPipeline(pyhxcfe_run_id, disk_captures_dir, workers, use_summary_cache,
+                         full_size_previews) as summary_pipeline:
+        for floppy_subdir in find_converted_disks(disk_captures_dir, use_capture_index):
+            summary_pipeline.submit(floppy_subdir)
+        floppy_summaries = summary_pipeline.collect()
+
+    write_summary_html(floppy_summaries, disk_captures_dir, output_file, page_size, split_by_collection)
+
     return [summary.summary_event for summary in floppy_summaries]
 
 
+def estimate_conversion_cost(floppy_subdir: Path) -> int:
+    """
+    Estimate the cost of converting a capture by the total size of its .hxcstream files.
+    Captures which vanish or can't be read are estimated at 0, their conversion reports the error.
+    """
+    try:
+        if is_packed_capture(floppy_subdir):
+            return os.stat(get_capture_pack_path(floppy_subdir)).st_size
+        with os.scandir(floppy_subdir) as it:
+            return sum(entry.stat().st_size for entry in it if entry.name.endswith('.hxcstream'))
+    except OSError:
+        return 0
+
+def get_auto_workers() -> int:
+    """Size the worker pool by the CPU count and the memory currently available."""
+    cpus = os.process_cpu_count() or 1
+    try:
+        with open('/proc/meminfo') as f:
+            meminfo = dict(line.split(':', 1) for line in f)
+        available_memory = int(meminfo['MemAvailable'].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        available_memory = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    return max(1, min(cpus, available_memory // HXCFE_WORKER_MEMORY))
+
+def parse_workers(ctx: click.Context, param: click.Parameter, value: str) -> int:
+    if value == 'auto':
+        return get_auto_workers()
+    try:
+        workers = int(value)
+    except ValueError:
+        raise click.BadParameter("must be a number or 'auto'")
+    if workers < 1:
+        raise click.BadParameter("must be at least 1")
+    return workers
+
+def convert_leased_capture(lease_keeper: LeaseKeeper, pyhxcfe_run_id: PyHXCFERunId, hxcfe_binary_path: Path,
+                           floppy_subdir: Path, hxcfe_fingerprint: str, plan: ConversionPlan, raw_from_imd: bool,
+                           niceness: int = 0) -> list[Event] | None:
+    """
+    Claim a capture through its lease and convert it, or return None if
+    another node holds the lease.  Unless the plan is forced, the capture is
+    planned again once claimed, as another node may have converted it since.
+    """
+    lease = lease_keeper.acquire(floppy_subdir)
+    if lease is None:
+        return None
+
+    try:
+        if not plan.force:
+            if os.path.isdir(floppy_subdir.parent / (floppy_subdir.name + "_parsed")):
+                current_plan = plan_conversion(floppy_subdir, hxcfe_fingerprint, plan.formats)
+            else:
+                current_plan = ConversionPlan(formats=plan.formats, replace=True)
+            if current_plan is None:
+                return []
+            if current_plan.replace and not any(fmt in IMAGE_FORMATS for fmt, _ in plan.formats):
+                # An outdated capture is planned again with every format it had, its images are
+                # left to the image lane, which merges them into the replaced directory
+                fast_plan, _ = split_conversion_plan(current_plan)
+                if fast_plan is None:
+                    return []
+                current_plan = fast_plan
+            plan = current_plan
+
+        return convert_disk_capture_directory(pyhxcfe_run_id, hxcfe_binary_path, floppy_subdir, hxcfe_fingerprint,
+                                              plan.formats, plan.replace, raw_from_imd, niceness, lease)
+    finally:
+        lease_keeper.release(lease)
+
+def run_conversions(pyhxcfe_run_id: PyHXCFERunId, hxcfe_binary_path: Path, hxcfe_fingerprint: str,
+                    plans: dict[Path, ConversionPlan], workers: int, raw_from_imd: bool, desc: str,
+                    niceness: int = 0, on_converted: Callable[[Path], None] | None = None,
+                    wait_for_leases: bool = False, failed: list[Path] | None = None) -> list[Event]:
+    """
+    Convert captures according to their plans in a thread pool.
+    The largest captures are started first, so they do not hold up the end of the batch.
+    on_converted is called with the capture directory as soon as each conversion finishes.
+
+    Captures are claimed through lease files, so several nodes can share the
+    work.  Captures leased by other nodes are skipped, or with wait_for_leases
+    retried until they are finished or their lease expires.  Skipped captures
+    which were converted before are passed to on_converted as they are.
+
+    The first failed conversion is raised, unless failed is given, in which
+    case failed captures are added to it and the others are still converted.
+    """
+    results: list[Event] = []
+
+    with tqdm(total=len(plans), desc=desc) as pbar, LeaseKeeper() as lease_keeper:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            costs = dict(zip(plans, ex.map(estimate_conversion_cost, plans)))
+            dirs = sorted(plans, key=lambda dir: (-costs[dir], dir))
+
+            while True:
+                futures = {
+                    ex.submit(convert_leased_capture, lease_keeper, pyhxcfe_run_id, hxcfe_binary_path, dir,
+                              hxcfe_fingerprint, plans[dir], raw_from_imd, niceness): dir for dir in dirs
+                }
+                skipped: list[Path] = []
+                for future in as_completed(futures):
+                    try:
+                        result: list[Event] | None = future.result()
+                        if result is None:
+                            skipped.append(futures[future])
+                            continue
+                        pbar.write(f"Completed {result}")
+                        results.extend(result)
+                        if on_converted is not None:
+                            on_converted(futures[future])
+                    except Exception as ex:
+                        pbar.write(f"Failed to complete: {type(ex).__name__}: {ex}")
+                        if failed is None:
+                            raise ex
+                        failed.append(futures[future])
+                    pbar.update(1)
+
+                if not skipped:
+                    break
+                if not wait_for_leases:
+                    pbar.write(f"Skipped {len(skipped)} directories which are being converted by other nodes:")
+                    for dir in sorted(skipped):
+                        owner = get_lease_owner(dir)
+                        pbar.write(f"  {dir.name}" + (f" (leased by {owner.host} pid {owner.pid})" if owner is not None else ""))
+                    for dir in skipped:
+                        if on_converted is not None and os.path.isdir(dir.parent / (dir.name + "_parsed")):
+                            on_converted(dir)
+                    break
+                pbar.write(f"Waiting for {len(skipped)} directories which are being converted by other nodes...")
+                time.sleep(HEARTBEAT_SECONDS)
+                dirs = [dir for dir in dirs if dir in skipped]
+
+    return results
+
+def split_conversion_plans(plans: dict[Path, ConversionPlan]) -> tuple[dict[Path, ConversionPlan], dict[Path, ConversionPlan]]:
+    """Split conversion plans into the fast lane and the deferred image lane."""
+    fast_plans: dict[Path, ConversionPlan] = {}
+    image_plans: dict[Path, ConversionPlan] = {}
+    for floppy_subdir, plan in plans.items():
+        fast_plan, image_plan = split_conversion_plan(plan)
+        if fast_plan is not None:
+            fast_plans[floppy_subdir] = fast_plan
+        if image_plan is not None:
+            image_plans[floppy_subdir] = image_plan
+    return fast_plans, image_plans
+
+def run_image_conversions(pyhxcfe_run_id: PyHXCFERunId, event_store: EventStore, hxcfe_binary_path: Path,
+                          hxcfe_fingerprint: str, image_plans: dict[Path, ConversionPlan], image_workers: int,
+                          raw_from_imd: bool, wait_for_leases: bool = False, failed: list[Path] | None = None):
+    """Run the deferred image lane, unless it is disabled.  failed is passed on to run_conversions."""
+    if not image_plans:
+        return
+    if image_workers > 0:
+        event_store.emit_events(run_conversions(
+            pyhxcfe_run_id, hxcfe_binary_path, hxcfe_fingerprint, image_plans, image_workers, raw_from_imd,
+            desc='images', niceness=IMAGE_NICENESS, wait_for_leases=wait_for_leases, failed=failed
+        ))
+    else:
+        print(f"Skipping images for {len(image_plans)} directories, they will be generated by a later run.")
+
 @click.command()
 @click.argument(
     'disk_captures_dir',
@@ -268,34 +900,142 @@ def process_converted_disks(pyhxcfe_run_id: PyHXCFERunId, disk_captures_dir: Pat
 )
 @click.option(
     '--workers',
-    default=WORKERS,
+    default=str(WORKERS),
+    callback=parse_workers,
+    help="Maximum number of parallel workers, or 'auto' to size by CPU count and available memory"
+)
+@click.option(
+    '--image-workers',
+    default=IMAGE_WORKERS,
     type=int,
-    help='Maximum number of parallel workers'
+    help='Maximum number of parallel workers for the deferred PNG image formats, 0 to leave them for a later run'
 )
 @click.option(
     '--redo',
     flag_value='redo',
     help='Redo processing of already finished directories'
 )
+@click.option(
+    '--formats',
+    'formats_option',
+    default=None,
+    help='Comma-separated hxcfe formats to generate, missing ones are added to existing conversions (default: '
+         + ','.join(fmt for fmt, _ in FORMATS) + ')'
+)
+@click.option(
+    '--hxcfe-previews',
+    is_flag=True,
+    help='Also generate ' + ' and '.join(fmt for fmt, _ in HXCFE_PREVIEW_FORMATS)
+         + ' with hxcfe, which are much slower than the flux previews rendered while summarizing'
+)
+@click.option(
+    '--full-size-previews',
+    is_flag=True,
+    help='Render full size flux previews in addition to the thumbnails'
+)
+@click.option(
+    '--raw-from-imd',
+    is_flag=True,
+    help='Write raw sector images from the IMD when it decodes cleanly instead of decoding the flux again'
+)
 @click.option(
     '--summary-only',
     is_flag=True,
     help='Only generate HTML summary without processing'
 )
+@click.option(
+    '--no-summary-cache',
+    is_flag=True,
+    help='Parse every converted disk again instead of using the summary cache'
+)
+@click.option(
+    '--no-capture-index',
+    is_flag=True,
+    help='List every collection directory again instead of trusting the capture index'
+)
+@click.option(
+    '--worker',
+    is_flag=True,
+    help='Only convert, sharing the work with pyhxcfe workers on other machines mounting the same share, '
+         'and wait for captures claimed by them.  Generate the summary with --summary-only afterwards'
+)
+@click.option(
+    '--watch',
+    is_flag=True,
+    help='After processing, keep watching for new captures and convert them as soon as their upload has settled'
+)
+@click.option(
+    '--settle-seconds',
+    default=SETTLE_SECONDS,
+    type=click.FloatRange(min=0),
+    help='In --watch mode, how long a capture must stay unchanged before it is converted'
+)
+@click.option(
+    '--poll-seconds',
+    default=POLL_SECONDS,
+    type=click.FloatRange(min=1),
+    help='In --watch mode, how often to rescan for new captures, inotify is used in addition where available'
+)
+@click.option(
+    '--event-spool',
+    type=click.Path(path_type=Path),
+    default=None,
+    help='Append every event to this JSON lines file as it is emitted (default in --watch mode: next to the HTML summary)'
+)
 @click.option(
     '--output',
     type=click.Path(path_type=Path),
     default=None,
     help='Output path for HTML summary (default: summary_TIMESTAMP.html in disk captures dir)'
 )
-def main(disk_captures_dir: Path, hxcfe_binary_path: Path, workers: int, redo: bool, 
-         summary_only: bool, output: Path | None):
+@click.option(
+    '--page-size',
+    default=0,
+    type=click.IntRange(min=0),
+    help='Split the HTML summary into pages of at most this many floppies behind an index page, 0 for a single page'
+)
+@click.option(
+    '--split-by-collection',
+    is_flag=True,
+    help='Write a separate HTML summary page for every collection directory behind an index page'
+)
+def main(disk_captures_dir: Path, hxcfe_binary_path: Path, workers: int, image_workers: int, redo: bool,
+         formats_option: str | None, hxcfe_previews: bool, full_size_previews: bool, raw_from_imd: bool,
+         summary_only: bool, no_summary_cache: bool,
+         no_capture_index: bool, worker: bool, watch: bool, settle_seconds: float, poll_seconds: float, event_spool: Path | None,
+         output: Path | None, page_size: int, split_by_collection: bool):
     """Process disk captures with HxCFloppyEmulator.
     
     DISK_CAPTURES_DIR: Directory containing floppy disk captures to process
     """
 
-    event_store = EventStore(namespace='hhfloppy', app="pyhxcfe")
+    selected_formats = FORMATS
+    if formats_option is not None:
+        known_formats = dict(FORMATS + EXTRA_FORMATS)
+        selected_formats = []
+        for fmt in formats_option.split(','):
+            fmt = fmt.strip()
+            if fmt not in known_formats:
+                raise click.BadParameter(f"Unknown format {fmt}, known formats: {', '.join(known_formats)}",
+                                         param_hint='--formats')
+            selected_formats.append((fmt, known_formats[fmt]))
+    if hxcfe_previews:
+        selected_formats = selected_formats + [preview_format for preview_format in HXCFE_PREVIEW_FORMATS
+                                               if preview_format not in selected_formats]
+
+    if watch and summary_only:
+        raise click.BadParameter("can't be combined with --summary-only", param_hint='--watch')
+    if worker and (summary_only or watch):
+        raise click.BadParameter("can't be combined with --summary-only or --watch", param_hint='--worker')
+
+    if output is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = disk_captures_dir / f"summary_{timestamp}.html"
+
+    if watch and event_spool is None:
+        event_spool = output.with_name(output.stem + '.events.jsonl')
+
+    event_store = EventStore(namespace='hhfloppy', app="pyhxcfe", spool_path=event_spool)
 
     run_id = PyHXCFERunId(uuid.uuid7())
 
@@ -313,60 +1053,169 @@ def main(disk_captures_dir: Path, hxcfe_binary_path: Path, workers: int, redo: b
         print("This is not supported by HxCFloppyEmulator.  Exiting.")
         sys.exit(1)
 
-    if not summary_only:
-        print(f"Using {workers} workers.")
+    image_plans: dict[Path, ConversionPlan] = {}
+
+    floppy_summaries: list[FloppySummaryRow] = []
 
-        dirs: list[Path] = []
-        finished_dirs: list[Path] = []
+    # The pipeline is closed even if a conversion fails, so the summaries cached so far are kept.
+    # Workers leave the summary to the main node and do not start one.
+    with nullcontext() if worker else SummaryPipeline(
+        run_id, disk_captures_dir, workers, use_summary_cache=not no_summary_cache,
+        full_size_previews=full_size_previews
+    ) as summary_pipeline:
+        if not summary_only:
+            print(f"Using {workers} workers.")
 
-        for floppy_dir in disk_captures_dir.iterdir():
-            if not floppy_dir.is_dir():
-                continue
-            for floppy_subdir in floppy_dir.iterdir():
+            hxcfe_fingerprint = get_hxcfe_fingerprint(hxcfe_binary_path)
+
+            plans: dict[Path, ConversionPlan] = {}
+            # When watching, captures which fail are retried by the watcher instead of stopping the run
+            initial_failed: list[Path] | None = [] if watch else None
+            converted_dirs: list[Path] = []
+            finished_dirs: list[Path] = []
+            known_captures: set[Path] = set()
+
+            capture_subdirs = scan_capture_directories(disk_captures_dir, use_index=not no_capture_index)
+            known_subdirs = set(capture_subdirs)
+
+            for floppy_subdir in capture_subdirs:
                 if floppy_subdir.name.endswith("_parsed"):
                     continue
 
-                if floppy_subdir.name.endswith("_parsed_wip"):
-                    shutil.rmtree(floppy_subdir)
+                if floppy_subdir.name.endswith(("_parsed_wip", "_parsed_old")):
+                    # Cleaned up by whichever node claims the capture next
                     continue
 
-                if os.path.isdir(floppy_subdir.parent / (floppy_subdir.name + "_parsed")):
-                    if redo:
-                        shutil.rmtree(floppy_subdir.parent / (floppy_subdir.name + "_parsed"))
-                    else:
+                # Captures which are still being uploaded are left to the watcher
+                if watch and not is_capture_settled(floppy_subdir, settle_seconds):
+                    continue
+                known_captures.add(floppy_subdir)
+
+                if redo:
+                    plans[floppy_subdir] = ConversionPlan(formats=selected_formats, replace=True, force=True)
+                    continue
+
+                if floppy_subdir.parent / (floppy_subdir.name + "_parsed") in known_subdirs:
+                    converted_dirs.append(floppy_subdir)
+                    continue
+
+                plans[floppy_subdir] = ConversionPlan(formats=selected_formats, replace=True)
+
+            # Compare already converted directories against their manifests,
+            # this hashes any inputs that changed since
+            outdated = 0
+            incomplete = 0
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                for floppy_subdir, plan in zip(converted_dirs, ex.map(
+                    lambda floppy_subdir: plan_conversion(floppy_subdir, hxcfe_fingerprint, selected_formats), converted_dirs
+                )):
+                    if plan is None:
                         finished_dirs.append(floppy_subdir)
                         continue
+                    plans[floppy_subdir] = plan
+                    if plan.replace:
+                        outdated += 1
+                    else:
+                        incomplete += 1
 
-                dirs.append(floppy_subdir)
+            dirs = sorted(plans)
+            print(f"Found {len(dirs)} directories to process ({outdated} outdated, {incomplete} missing formats), {len(finished_dirs)} already finished.")
 
-        dirs.sort()
-        print(f"Found {len(dirs)} directories to process, {len(finished_dirs)} already finished.")
+            fast_plans, image_plans = split_conversion_plans(plans)
 
-        results: list[Event] = []
+            if not worker:
+                # Summarize captures which the fast lane leaves alone right away,
+                # the others as soon as their conversion finishes
+                for floppy_subdir in find_converted_disks(disk_captures_dir, use_capture_index=not no_capture_index):
+                    if floppy_subdir.parent / floppy_subdir.name.removesuffix("_parsed") not in fast_plans:
+                        summary_pipeline.submit(floppy_subdir)
 
-        with tqdm(total=len(dirs)) as pbar:
-            with ThreadPoolExecutor(max_workers=workers) as ex:
-                futures = [
-                    ex.submit(convert_disk_capture_directory, run_id, hxcfe_binary_path, dir) for dir in dirs
-                ]
-                for future in as_completed(futures):
+            event_store.emit_events(run_conversions(
+                run_id, hxcfe_binary_path, hxcfe_fingerprint, fast_plans, workers, raw_from_imd, desc='convert',
+                on_converted=None if worker else lambda floppy_subdir: summary_pipeline.submit(
+                    floppy_subdir.parent / (floppy_subdir.name + "_parsed")),
+                wait_for_leases=worker, failed=initial_failed
+            ))
+            for floppy_subdir in initial_failed or []:
+                image_plans.pop(floppy_subdir, None)
+        else:
+            for floppy_subdir in find_converted_disks(disk_captures_dir, use_capture_index=not no_capture_index):
+                summary_pipeline.submit(floppy_subdir)
+
+        if not worker:
+            floppy_summaries = summary_pipeline.collect()
+
+    if not worker:
+        write_summary_html(floppy_summaries, disk_captures_dir, output, page_size, split_by_collection)
+        event_store.emit_events([summary.summary_event for summary in floppy_summaries])
+
+    if not summary_only:
+        initial_image_failed: list[Path] | None = [] if watch else None
+        run_image_conversions(run_id, event_store, hxcfe_binary_path, hxcfe_fingerprint, image_plans, image_workers,
+                              raw_from_imd, wait_for_leases=worker, failed=initial_image_failed)
+
+    if watch:
+        summary_rows = {summary.floppy_subdir: summary for summary in floppy_summaries}
+        watcher = CaptureWatcher(disk_captures_dir, known_captures, settle_seconds, poll_seconds,
+                                 use_capture_index=not no_capture_index)
+        for floppy_subdir in sorted(set(initial_failed) | set(initial_image_failed)):
+            print(f"Will try {floppy_subdir.name} again in {RETRY_SECONDS // 60} minutes.")
+            watcher.retry_later(floppy_subdir)
+        print(f"Watching {disk_captures_dir} for new captures, press Ctrl+C to stop.")
+        try:
+            while True:
+                new_captures = watcher.wait()
+                print(f"New captures: {', '.join(floppy_subdir.name for floppy_subdir in new_captures)}")
+
+                # A broken upload must not stop the watch, failed captures are tried again later
+                failed: list[Path] = []
+                plans = {}
+                for floppy_subdir in new_captures:
                     try:
-                        result: list[Event] = future.result()
-                        pbar.write(f"Completed {result}")
-                        results.extend(result)
-                    except Exception as ex:
-                        pbar.write(f"Failed to complete: {type(ex).__name__}: {ex}")
-                        raise ex
-                    pbar.update(1)
-        
-        event_store.emit_events(results)
+                        if os.path.isdir(floppy_subdir.parent / (floppy_subdir.name + "_parsed")):
+                            plan = plan_conversion(floppy_subdir, hxcfe_fingerprint, selected_formats)
+                        else:
+                            plan = ConversionPlan(formats=selected_formats, replace=True)
+                    except (OSError, ValueError) as e:
+                        print(f"Failed to plan {floppy_subdir.name}: {type(e).__name__}: {e}")
+                        failed.append(floppy_subdir)
+                        continue
+                    if plan is not None:
+                        plans[floppy_subdir] = plan
+                fast_plans, image_plans = split_conversion_plans(plans)
 
-    if output is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output = disk_captures_dir / f"summary_{timestamp}.html"
-    
-    events = process_converted_disks(run_id, disk_captures_dir, output)
-    event_store.emit_events(events)
+                with SummaryPipeline(run_id, disk_captures_dir, workers, use_summary_cache=not no_summary_cache,
+                                     full_size_previews=full_size_previews) as summary_pipeline:
+                    for floppy_subdir in new_captures:
+                        if floppy_subdir not in fast_plans and os.path.isdir(floppy_subdir.parent / (floppy_subdir.name + "_parsed")):
+                            summary_pipeline.submit(floppy_subdir.parent / (floppy_subdir.name + "_parsed"))
+                    event_store.emit_events(run_conversions(
+                        run_id, hxcfe_binary_path, hxcfe_fingerprint, fast_plans, workers, raw_from_imd, desc='convert',
+                        on_converted=lambda floppy_subdir: summary_pipeline.submit(
+                            floppy_subdir.parent / (floppy_subdir.name + "_parsed")),
+                        failed=failed
+                    ))
+                    floppy_summaries = summary_pipeline.collect()
+
+                for floppy_subdir in failed:
+                    print(f"Will try {floppy_subdir.name} again in {RETRY_SECONDS // 60} minutes.")
+                    watcher.retry_later(floppy_subdir)
+                    image_plans.pop(floppy_subdir, None)
+
+                summary_rows.update((summary.floppy_subdir, summary) for summary in floppy_summaries)
+                write_summary_html([summary_rows[floppy_subdir] for floppy_subdir in sorted(summary_rows)],
+                                   disk_captures_dir, output, page_size, split_by_collection)
+                event_store.emit_events([summary.summary_event for summary in floppy_summaries])
+
+                image_failed: list[Path] = []
+                run_image_conversions(run_id, event_store, hxcfe_binary_path, hxcfe_fingerprint, image_plans,
+                                      image_workers, raw_from_imd, failed=image_failed)
+                for floppy_subdir in image_failed:
+                    watcher.retry_later(floppy_subdir)
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+        finally:
+            watcher.close()
 
     event_store.emit_event(PyHXCFEERunFinished(
         pyhxcfe_run_id=run_id
@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import Counter
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
 from enum import IntEnum
+from io import BytesIO
 from math import log2
+import mmap
 import re
 import struct
-from typing import Literal
+from typing import BinaryIO, Literal, overload
 
 
 @dataclass
@@ -18,7 +22,11 @@ class Disk:
     date: tuple[int, int, int]
     time: tuple[int, int, int]
     comment: str
-    tracks: list[Track]
+    tracks: list[Track] | LazyTrackList
+
+    _sector_index: dict[SectorAddress, tuple[SectorDataRecord, SectorSize]] | None = field(
+        default=None, init=False, repr=False, compare=False)
+    _mmap: mmap.mmap | None = field(default=None, init=False, repr=False, compare=False)
 
     _META_DATA = re.compile(rb"^IMD (?P<major>[0-9]).(?P<minor>[0-9]{1,2}): +?"
                             rb"(?P<day>[0-9]{1,2})/(?P<month>[0-9]{1,2})/(?P<year>[0-9]{2,4}) +?"
@@ -35,12 +43,69 @@ class Disk:
         return Disk.from_bytes(imd_data)
 
     @staticmethod
-    def from_bytes(imd_data: bytes) -> Disk:
-        """Create a Disk from it's binary representation."""
-        header_end = imd_data.index(b"\x1A")
+    def open(file_path: str, lazy: bool = False) -> Disk:
+        """Open an IMD disk image from file.
+
+        With lazy set the file is memory mapped and only a table of track offsets is built, each
+        Track is decoded on first access. The mapping stays open until close is called, or the
+        Disk is used as a context manager.
+        """
+        if not lazy:
+            return Disk.from_file(file_path)
+
+        with open(file_path, "rb") as file:
+            imd_data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            disk = Disk.from_bytes(imd_data, lazy=True)
+        except BaseException:
+            imd_data.close()
+            raise
+        disk._mmap = imd_data
+        return disk
+
+    def close(self) -> None:
+        """Unmap the file of a Disk opened with lazy set.
+
+        Its tracks can't be used afterwards. Sector data read from it which is still referenced
+        keeps the mapping alive until it is gone, so closing always succeeds. Does nothing for
+        Disks which are not memory mapped.
+        """
+        if self._mmap is None:
+            return
+
+        try:
+            if isinstance(self.tracks, LazyTrackList):
+                self.tracks.release()
+            self._mmap.close()
+        except BufferError:
+            # Views into the mapping are still held, it is unmapped once the last of them is freed
+            pass
+        finally:
+            self._sector_index = None
+            self._mmap = None
+
+    def __enter__(self) -> Disk:
+        """Use this Disk as a context manager which closes it on exit."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close this Disk."""
+        self.close()
+
+    @staticmethod
+    def from_bytes(imd_data: bytes | mmap.mmap, lazy: bool = False) -> Disk:
+        """Create a Disk from it's binary representation.
 
-        header_data = imd_data[:header_end]
-        track_data = imd_data[header_end + 1:]
+        Parsing walks a single memoryview with an offset cursor, so sector payloads are views into
+        imd_data rather than copies. With lazy set tracks are only decoded on first access.
+        """
+        header_end = imd_data.find(b"\x1A")
+        if header_end == -1:
+            raise ValueError("IMD header terminator not found")
+
+        header_data = bytes(imd_data[:header_end])
+        track_data = memoryview(imd_data)
 
         meta_match = Disk._META_DATA.match(header_data)
         assert meta_match is not None
@@ -51,27 +116,197 @@ class Disk:
         date = meta_dict["day"], meta_dict["month"], meta_dict["year"]
         time = meta_dict["hour"], meta_dict["minute"], meta_dict["second"]
         comment = header_data[meta_match.end():].decode("ascii")
-        tracks = []
+        offset = header_end + 1
 
-        while track_data:
-            track = Track.from_bytes(track_data)
+        if lazy:
+            track_offsets = []
+            while offset < len(track_data):
+                track_offsets.append(offset)
+                offset = Track.skip(track_data, offset)
+
+            return Disk(version, date, time, comment, LazyTrackList(track_data, track_offsets))
+
+        tracks = []
+        while offset < len(track_data):
+            track = Track.from_bytes(track_data, offset)
             tracks.append(track)
-            track_data = track_data[track.get_size():]
+            offset += track.get_size()
 
         return Disk(version, date, time, comment, tracks)
 
+    def get_sector_index(self) -> dict[SectorAddress, tuple[SectorDataRecord, SectorSize]]:
+        """Get an index of logical (cylinder, head, sector id) to sector record and sector size.
+
+        The index honours the sector numbering, cylinder and head maps of each track. It is built
+        on first use and reused afterwards, so the tracks should not be changed after that. When a
+        sector address occurs more than once the first record is used.
+        """
+        if self._sector_index is None:
+            sector_index: dict[SectorAddress, tuple[SectorDataRecord, SectorSize]] = {}
+            for track in self.tracks:
+                cylinder_map = track.sector_cylinder_map or [track.cylinder] * track.sector_count
+                head_map = track.sector_head_map or [track.head] * track.sector_count
+                for address, record in zip(zip(cylinder_map, head_map, track.sector_numbering_map),
+                                           track.sector_data_records):
+                    sector_index.setdefault(address, (record, track.sector_size))
+            self._sector_index = sector_index
+
+        return self._sector_index
+
+    def read_sector(self, cylinder: int, head: int, sector_id: int) -> bytes | memoryview | None:
+        """Get the data of a sector by it's logical address.
+
+        Compressed sectors are expanded to the full sector size, sectors without data give None.
+        Raises KeyError if the disk has no such sector.
+        """
+        try:
+            record, sector_size = self.get_sector_index()[cylinder, head, sector_id]
+        except KeyError:
+            raise KeyError(f"no sector C{cylinder} H{head} S{sector_id} on disk") from None
+
+        return record.get_data(sector_size)
+
+    def iter_sectors(self) -> Iterator[tuple[SectorAddress, bytes | memoryview | None]]:
+        """Iterate over the address and data of every sector in logical CHS order."""
+        sector_index = self.get_sector_index()
+        for address in sorted(sector_index):
+            record, sector_size = sector_index[address]
+            yield address, record.get_data(sector_size)
+
+    def to_raw_file(self, file_path: str, fill_byte: int = 0) -> None:
+        """Save this Disk as a flat sector-ordered raw image file."""
+        with open(file_path, "wb") as file:
+            self.write_raw_to(file, fill_byte)
+
+    def write_raw_to(self, file: BinaryIO, fill_byte: int = 0) -> None:
+        """Write this Disk as a flat sector-ordered raw image to a binary file object.
+
+        Tracks are written in cylinder then head order and the sectors of each track in sector id
+        order. The image covers every cylinder and head from 0 to the highest on the disk and every
+        sector id from the lowest to the highest, so each sector lands at the offset its address
+        gives. Sectors without data, missing sectors and missing tracks are written as sector size
+        copies of fill_byte, missing tracks with the most common sector size of the disk.
+        """
+        tracks: dict[tuple[int, int], Track] = {}
+        for track in self.tracks:
+            tracks.setdefault((track.cylinder, track.head), track)
+        sector_ids = {sector_id for track in tracks.values() for sector_id in track.sector_numbering_map}
+        if not sector_ids:
+            return
+
+        sector_id_range = range(min(sector_ids), max(sector_ids) + 1)
+        cylinders = max(cylinder for cylinder, _ in tracks) + 1
+        heads = max(head for _, head in tracks) + 1
+        default_sector_size = Counter(track.sector_size for track in tracks.values()).most_common(1)[0][0]
+
+        fill_sectors: dict[int, bytes] = {}
+        for cylinder in range(cylinders):
+            for head in range(heads):
+                track = tracks.get((cylinder, head))
+                sector_size = track.sector_size if track is not None else default_sector_size
+                records: dict[int, SectorDataRecord] = {}
+                if track is not None:
+                    for sector_id, record in zip(track.sector_numbering_map, track.sector_data_records):
+                        records.setdefault(sector_id, record)
+
+                for sector_id in sector_id_range:
+                    record = records.get(sector_id)
+                    data = record.get_data(sector_size) if record is not None else None
+                    if data is None:
+                        data = fill_sectors.get(sector_size)
+                        if data is None:
+                            data = fill_sectors[sector_size] = bytes((fill_byte,)) * sector_size
+                    file.write(data)
+
+    def to_file(self, file_path: str) -> None:
+        """Save this Disk as an IMD disk image file."""
+        with open(file_path, "wb") as file:
+            self.write_to(file)
+
     def to_bytes(self) -> bytes:
         """Get this Disk's binary representation."""
-        disk_data = Disk._META_DATA_FORMAT.format(*self.version, *self.date,
-                                                  *self.time).encode("ascii")
-        disk_data += self.comment.encode("ascii")
+        disk_data = BytesIO()
+        self.write_to(disk_data)
+        return disk_data.getvalue()
+
+    def write_to(self, file: BinaryIO) -> None:
+        """Write this Disk's binary representation to a binary file object."""
+        file.write(Disk._META_DATA_FORMAT.format(*self.version, *self.date,
+                                                 *self.time).encode("ascii"))
+        file.write(self.comment.encode("ascii"))
 
-        disk_data += b"\x1A"
+        file.write(b"\x1A")
 
         for track in self.tracks:
-            disk_data += track.to_bytes()
+            track.write_to(file)
+
+
+@dataclass
+class DiskStats:
+    """Summary statistics of an IMD disk image, gathered without decoding any sectors."""
+
+    track_count: int
+    modes: list[TrackMode]
+    sector_count: int
+    error_count: int
+    unavailable_count: int
+
+    @staticmethod
+    def from_file(file_path: str) -> DiskStats:
+        """Scan an IMD disk image file."""
+        with open(file_path, "rb") as file:
+            imd_data: bytes = file.read()
+
+        return DiskStats.from_bytes(imd_data)
 
-        return disk_data
+    @staticmethod
+    def from_bytes(imd_data: bytes) -> DiskStats:
+        """Scan an IMD disk image's binary representation.
+
+        Only track headers and the record type byte of each sector are read, payloads are skipped
+        by their computed size and no Track or SectorDataRecord objects are created.
+        """
+        header_end = imd_data.find(b"\x1A")
+        if header_end == -1:
+            raise ValueError("IMD header terminator not found")
+
+        header_size = struct.calcsize(Track._TRACK_HEADER_FORMAT)
+        error_values = _ERROR_RECORD_TYPE_VALUES
+        unavailable_value = SectorDataRecordType.UNAVAILABLE.value
+        get_record_size = SectorDataRecordType.get_record_size_from_value
+
+        track_count = 0
+        modes: list[TrackMode] = []
+        sector_count = 0
+        error_count = 0
+        unavailable_count = 0
+
+        offset = header_end + 1
+        while offset < len(imd_data):
+            (mode_value, _, head, track_sector_count,
+             sector_size) = struct.unpack_from(Track._TRACK_HEADER_FORMAT, imd_data, offset)
+            mode = TrackMode(mode_value)
+            if mode not in modes:
+                modes.append(mode)
+            sector_size = 2**(7 + sector_size)
+            offset += header_size + track_sector_count
+            if head & 0x80:
+                offset += track_sector_count
+            if head & 0x40:
+                offset += track_sector_count
+
+            for _ in range(track_sector_count):
+                record_type_value = imd_data[offset]
+                if record_type_value in error_values:
+                    error_count += 1
+                elif record_type_value == unavailable_value:
+                    unavailable_count += 1
+                offset += 1 + get_record_size(record_type_value, sector_size)
+
+            track_count += 1
+            sector_count += track_sector_count
+
+        return DiskStats(track_count, modes, sector_count, error_count, unavailable_count)
 
 
 class TrackMode(IntEnum):
@@ -89,9 +324,10 @@ class TrackMode(IntEnum):
 
 
 SectorSize = Literal[128, 256, 512, 1024, 2048, 4096, 8192]
+SectorAddress = tuple[int, int, int]
 
 
-@dataclass
+@dataclass(slots=True)
 class Track:
     """Represents a track on a disk."""
 
@@ -118,42 +354,70 @@ class Track:
         return data_records + sector_numbering_map + sector_head_map + cylinder_map + header_size
 
     @staticmethod
-    def from_bytes(track_data: bytes) -> Track:
-        """Create a Track object from it's binary representation."""
+    def from_bytes(track_data: bytes | memoryview, offset: int = 0) -> Track:
+        """Create a Track object from it's binary representation starting at offset."""
+        track_data = memoryview(track_data)
         (mode_value, cylinder, head, sector_count,
-         sector_size) = struct.unpack_from(Track._TRACK_HEADER_FORMAT, track_data)
+         sector_size) = struct.unpack_from(Track._TRACK_HEADER_FORMAT, track_data, offset)
         sector_cylinder_map_present = (head & 0x80) != 0
         sector_head_map_present = (head & 0x40) != 0
         head = head & 0x01
         sector_size = 2**(7 + sector_size)
         mode = TrackMode(mode_value)
-        track_data = track_data[struct.calcsize(Track._TRACK_HEADER_FORMAT):]
+        offset += struct.calcsize(Track._TRACK_HEADER_FORMAT)
 
         sector_map_format = Track._SECTOR_MAP_ENTRY_FORMAT.format(sector_count=sector_count)
-        numbering_map = list(struct.unpack_from(sector_map_format, track_data))
-        track_data = track_data[struct.calcsize(sector_map_format):]
+        numbering_map = list(struct.unpack_from(sector_map_format, track_data, offset))
+        offset += sector_count
 
         sector_cylinder_map = None
         if sector_cylinder_map_present:
-            sector_cylinder_map = list(struct.unpack_from(sector_map_format, track_data))
-            track_data = track_data[struct.calcsize(sector_map_format):]
+            sector_cylinder_map = list(struct.unpack_from(sector_map_format, track_data, offset))
+            offset += sector_count
 
         sector_head_map = None
         if sector_head_map_present:
-            sector_head_map = list(struct.unpack_from(sector_map_format, track_data))
-            track_data = track_data[struct.calcsize(sector_map_format):]
+            sector_head_map = list(struct.unpack_from(sector_map_format, track_data, offset))
+            offset += sector_count
 
         sector_data_records = []
         for _ in range(sector_count):
-            sector_record = SectorDataRecord.from_bytes(track_data, sector_size)
+            sector_record = SectorDataRecord.from_bytes(track_data, sector_size, offset)
             sector_data_records.append(sector_record)
-            track_data = track_data[sector_record.get_size():]
+            offset += sector_record.get_size()
 
         return Track(mode, cylinder, head, sector_count, sector_size, numbering_map,
                      sector_cylinder_map, sector_head_map, sector_data_records)
 
+    @staticmethod
+    def skip(track_data: bytes | memoryview, offset: int = 0) -> int:
+        """Get the offset just past the Track starting at offset, without decoding it.
+
+        Only the track header and the record type byte of each sector are read.
+        """
+        (_, _, head, sector_count,
+         sector_size) = struct.unpack_from(Track._TRACK_HEADER_FORMAT, track_data, offset)
+        sector_size = 2**(7 + sector_size)
+        offset += struct.calcsize(Track._TRACK_HEADER_FORMAT) + sector_count
+        if head & 0x80:
+            offset += sector_count
+        if head & 0x40:
+            offset += sector_count
+
+        for _ in range(sector_count):
+            offset += 1 + SectorDataRecordType.get_record_size_from_value(track_data[offset],
+                                                                          sector_size)
+
+        return offset
+
     def to_bytes(self) -> bytes:
         """Get this Track's binary representation."""
+        track_data = BytesIO()
+        self.write_to(track_data)
+        return track_data.getvalue()
+
+    def write_to(self, file: BinaryIO) -> None:
+        """Write this Track's binary representation to a binary file object."""
         head: int = self.head
         if self.sector_head_map is not None:
             head |= 0x40
@@ -161,146 +425,150 @@ class Track:
             head |= 0x80
         sector_size = int(log2(self.sector_size)) - 7
 
-        track_bytes = struct.pack(Track._TRACK_HEADER_FORMAT, self.mode.value, self.cylinder, head,
-                                  self.sector_count, sector_size)
+        file.write(struct.pack(Track._TRACK_HEADER_FORMAT, self.mode.value, self.cylinder, head,
+                               self.sector_count, sector_size))
 
-        track_bytes += struct.pack(
-            Track._SECTOR_MAP_ENTRY_FORMAT.format(sector_count=self.sector_count),
-            *self.sector_numbering_map)
+        sector_map_format = Track._SECTOR_MAP_ENTRY_FORMAT.format(sector_count=self.sector_count)
+        file.write(struct.pack(sector_map_format, *self.sector_numbering_map))
 
         if self.sector_cylinder_map is not None:
-            track_bytes += struct.pack(
-                Track._SECTOR_MAP_ENTRY_FORMAT.format(sector_count=self.sector_count),
-                *self.sector_cylinder_map)
+            file.write(struct.pack(sector_map_format, *self.sector_cylinder_map))
 
         if self.sector_head_map is not None:
-            track_bytes += struct.pack(
-                Track._SECTOR_MAP_ENTRY_FORMAT.format(sector_count=self.sector_count),
-                *self.sector_head_map)
+            file.write(struct.pack(sector_map_format, *self.sector_head_map))
 
         for record in self.sector_data_records:
-            track_bytes += record.to_bytes()
+            record.write_to(file)
 
-        return track_bytes
 
+class LazyTrackList(Sequence[Track]):
+    """A sequence of Tracks which are decoded from an IMD buffer on first access."""
 
-class SectorDataRecordType:
-    """Represents the type of a SectorDataRecord."""
+    def __init__(self, track_data: memoryview, track_offsets: list[int]) -> None:
+        """Initialise the list from the buffer and the offset of each track within it."""
+        self._track_data = track_data
+        self._track_offsets = track_offsets
+        self._tracks: list[Track | None] = [None] * len(track_offsets)
 
-    _UNAVAILABLE = 0
-    _NORMAL = 1
-    _COMPRESSED = 2
-    _DELETED_NORMAL = 3
-    _DELETED_COMPRESSED = 4
-    _ERROR_NORMAL = 5
-    _ERROR_COMPRESSED = 6
-    _DELETED_ERROR_NORMAL = 7
-    _DELETED_ERROR_COMPRESSED = 8
+    def __len__(self) -> int:
+        """Get the number of tracks."""
+        return len(self._track_offsets)
 
-    def __init__(self, record_type_value: Literal[0, 1, 2, 3, 4, 5, 6, 7, 8]) -> None:
-        """Initialise the record type."""
-        if record_type_value not in (0, 1, 2, 3, 4, 5, 6, 7, 8):
-            raise ValueError(f"invalid SectorDataRecordType value of {record_type_value}")
+    @overload
+    def __getitem__(self, index: int) -> Track: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Track]: ...
+
+    def __getitem__(self, index: int | slice) -> Track | list[Track]:
+        """Get a track, decoding it if it has not been accessed before."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
 
-        self._has_data = True
-        self._has_error = False
-        self._is_compressed = False
-        self._is_deleted = False
+        track = self._tracks[index]
+        if track is None:
+            track = Track.from_bytes(self._track_data, self._track_offsets[index])
+            self._tracks[index] = track
+        return track
 
-        if record_type_value == SectorDataRecordType._UNAVAILABLE:
-            self._has_data = False
+    def release(self) -> None:
+        """Drop the decoded tracks and release the buffer, so the memory map under it can close.
 
-        if record_type_value in (SectorDataRecordType._COMPRESSED,
-                                 SectorDataRecordType._DELETED_COMPRESSED,
-                                 SectorDataRecordType._ERROR_COMPRESSED,
-                                 SectorDataRecordType._DELETED_ERROR_COMPRESSED):
-            self._is_compressed = True
+        Raises BufferError if views into the buffer are still held, the tracks are dropped anyway.
+        """
+        self._tracks = [None] * len(self._track_offsets)
+        self._track_data.release()
+
+    def __repr__(self) -> str:
+        """Get a debug representation of this LazyTrackList."""
+        decoded = sum(track is not None for track in self._tracks)
+        return f"LazyTrackList(tracks={len(self)}, decoded={decoded})"
+
+
+_COMPRESSED_RECORD_TYPE_VALUES = frozenset((2, 4, 6, 8))
+_DELETED_RECORD_TYPE_VALUES = frozenset((3, 4, 7, 8))
+_ERROR_RECORD_TYPE_VALUES = frozenset((5, 6, 7, 8))
 
-        if record_type_value in (SectorDataRecordType._DELETED_NORMAL,
-                                 SectorDataRecordType._DELETED_COMPRESSED,
-                                 SectorDataRecordType._DELETED_ERROR_NORMAL,
-                                 SectorDataRecordType._DELETED_ERROR_COMPRESSED):
-            self._is_deleted = True
 
-        if record_type_value in (SectorDataRecordType._ERROR_NORMAL,
-                                 SectorDataRecordType._ERROR_COMPRESSED,
-                                 SectorDataRecordType._DELETED_ERROR_NORMAL,
-                                 SectorDataRecordType._DELETED_ERROR_COMPRESSED):
-            self._has_error = True
+class SectorDataRecordType(IntEnum):
+    """Enum of the type of a SectorDataRecord.
+
+    Only nine record types exist, so every record shares one of these members and their attributes
+    are computed once when the enum is created.
+    """
+
+    UNAVAILABLE = 0
+    NORMAL = 1
+    COMPRESSED = 2
+    DELETED_NORMAL = 3
+    DELETED_COMPRESSED = 4
+    ERROR_NORMAL = 5
+    ERROR_COMPRESSED = 6
+    DELETED_ERROR_NORMAL = 7
+    DELETED_ERROR_COMPRESSED = 8
+
+    def __init__(self, record_type_value: int) -> None:
+        """Precompute the attributes of the record type."""
+        self._has_data = record_type_value != 0
+        self._is_compressed = record_type_value in _COMPRESSED_RECORD_TYPE_VALUES
+        self._is_deleted = record_type_value in _DELETED_RECORD_TYPE_VALUES
+        self._has_error = record_type_value in _ERROR_RECORD_TYPE_VALUES
 
     @property
-    def has_data(self):
+    def has_data(self) -> bool:
         """Get if this record contains data."""
         return self._has_data
 
     @property
-    def is_normal(self):
+    def is_normal(self) -> bool:
         """Get if this record has no special attributes."""
         return self._has_data and not self._is_compressed and not self._is_deleted
 
     @property
-    def is_compressed(self):
+    def is_compressed(self) -> bool:
         """Get if this record is compressed."""
         return self._is_compressed
 
     @property
-    def is_deleted(self):
+    def is_deleted(self) -> bool:
         """Get if this record is deleted."""
         return self._is_deleted
 
     @property
-    def has_error(self):
+    def has_error(self) -> bool:
         """Get if this record has an error."""
         return self._has_error
 
     def get_sector_record_size(self, sector_size: int) -> int:
         """Get the of a record with this type in bytes."""
-        if self.has_data:
-            if self.is_compressed:
+        if self._has_data:
+            if self._is_compressed:
                 return 1
             return sector_size
         return 0
 
+    @staticmethod
+    def get_record_size_from_value(record_type_value: int, sector_size: int) -> int:
+        """Get the size of a record's data from it's raw type value without an enum lookup."""
+        if record_type_value == 0:
+            return 0
+        if record_type_value in _COMPRESSED_RECORD_TYPE_VALUES:
+            return 1
+        if record_type_value > 8:
+            raise ValueError(f"invalid SectorDataRecordType value of {record_type_value}")
+        return sector_size
+
     def to_value(self) -> int:
         """Get the record type value for this record type."""
-        if self.has_data and not self.has_error and not self.is_compressed and not self.is_deleted:
-            return SectorDataRecordType._NORMAL
-
-        if self.has_data and self.has_error and not self.is_compressed and not self.is_deleted:
-            return SectorDataRecordType._ERROR_NORMAL
-
-        if self.has_data and self.has_error and self.is_compressed and not self.is_deleted:
-            return SectorDataRecordType._ERROR_COMPRESSED
-
-        if self.has_data and self.has_error and not self.is_compressed and self.is_deleted:
-            return SectorDataRecordType._DELETED_ERROR_NORMAL
-
-        if self.has_data and self.has_error and self.is_compressed and self.is_deleted:
-            return SectorDataRecordType._DELETED_ERROR_COMPRESSED
-
-        if self.has_data and not self.has_error and self.is_compressed and not self.is_deleted:
-            return SectorDataRecordType._COMPRESSED
-
-        if self.has_data and not self.has_error and self.is_compressed and self.is_deleted:
-            return SectorDataRecordType._DELETED_COMPRESSED
+        return self.value
 
-        if self.has_data and not self.has_error and not self.is_compressed and self.is_deleted:
-            return SectorDataRecordType._DELETED_NORMAL
 
-        return SectorDataRecordType._UNAVAILABLE
-
-    def __repr__(self) -> str:
-        """Get a debug representation of this SectorDataRecordType."""
-        return (f"SectorDataRecordType(has_data={self.has_data}, is_compressed={self.is_compressed}"
-                f", is_deleted={self.is_deleted}, has_error={self.has_error})")
-
-
-@dataclass
+@dataclass(slots=True)
 class SectorDataRecord:
     """A record of a sectors data, with some metadata."""
 
     record_type: SectorDataRecordType
-    data: bytes
+    data: bytes | memoryview
 
     _RECORD_TYPE_FORMAT = "B"
 
@@ -309,16 +577,38 @@ class SectorDataRecord:
         return 1 + len(self.data)
 
     @staticmethod
-    def from_bytes(sector_data: bytes, sector_size: SectorSize) -> SectorDataRecord:
-        """Create a SectorDataRecord object from it's binary representation."""
-        record_type_value, = struct.unpack_from(SectorDataRecord._RECORD_TYPE_FORMAT, sector_data)
+    def from_bytes(sector_data: bytes | memoryview, sector_size: SectorSize,
+                   offset: int = 0) -> SectorDataRecord:
+        """Create a SectorDataRecord object from it's binary representation starting at offset.
+
+        The record data is a view into sector_data, no payload bytes are copied.
+        """
+        sector_data = memoryview(sector_data)
+        record_type_value, = struct.unpack_from(SectorDataRecord._RECORD_TYPE_FORMAT, sector_data,
+                                                offset)
         record_type = SectorDataRecordType(record_type_value)
 
         real_sector_size = record_type.get_sector_record_size(sector_size)
-        record_data = sector_data[1:1 + real_sector_size]
+        record_data = sector_data[offset + 1:offset + 1 + real_sector_size]
 
         return SectorDataRecord(record_type, record_data)
 
+    def get_data(self, sector_size: int) -> bytes | memoryview | None:
+        """Get this record's sector data, expanding compressed records to sector_size bytes.
+
+        Returns None if the record has no data.
+        """
+        if not self.record_type.has_data:
+            return None
+        if self.record_type.is_compressed:
+            return bytes(self.data) * sector_size
+        return self.data
+
     def to_bytes(self) -> bytes:
         """Get this SectorDataRecord's binary representation."""
         return bytes([self.record_type.to_value()]) + self.data
+
+    def write_to(self, file: BinaryIO) -> None:
+        """Write this SectorDataRecord's binary representation to a binary file object."""
+        file.write(bytes([self.record_type.to_value()]))
+        file.write(self.data)
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+from pathlib import Path
+
+import msgspec
+
+from event.datatypes import FloppyInfoFromFlux, FloppyInfoFromIMD, FloppyInfoFromXML
+
+SUMMARY_CACHE_FILENAME = 'summary_cache.sqlite3'
+
+# Bump when the columns of the summary_cache table change, older tables are dropped
+SUMMARY_CACHE_SCHEMA_VERSION = 2
+
+CachedSummaryInfo = tuple[FloppyInfoFromXML, FloppyInfoFromIMD, FloppyInfoFromFlux | None]
+
+_xml_info_decoder = msgspec.msgpack.Decoder(FloppyInfoFromXML)
+_imd_info_decoder = msgspec.msgpack.Decoder(FloppyInfoFromIMD)
+_flux_info_decoder = msgspec.msgpack.Decoder(FloppyInfoFromFlux | None)
+
+
+def get_file_signature(paths: list[Path]) -> str | None:
+    """
+    Get a signature of the size and modification time of the given files,
+    or None if any of them is missing.
+    """
+    parts: list[str] = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return ','.join(parts)
+
+
+class SummaryCache:
+    """
+    On-disk cache of the information parsed from converted disk captures.
+
+    Entries are keyed by the capture directory and are only valid for the
+    same file signature and parser version they were stored with.
+    """
+
+    def __init__(self, path: Path, parser_version: int) -> None:
+        self.parser_version = parser_version
+        self.connection = sqlite3.connect(path)
+        (schema_version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if schema_version != SUMMARY_CACHE_SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS summary_cache")
+            self.connection.execute(f"PRAGMA user_version = {SUMMARY_CACHE_SCHEMA_VERSION}")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                capture_directory TEXT PRIMARY KEY,
+                file_signature TEXT NOT NULL,
+                parser_version INTEGER NOT NULL,
+                xml_info BLOB NOT NULL,
+                imd_info BLOB NOT NULL,
+                flux_info BLOB NOT NULL
+            )
+            """
+        )
+
+    def get(self, capture_directory: str, file_signature: str) -> CachedSummaryInfo | None:
+        """Get the cached information for a capture directory, if it is still valid."""
+        row = self.connection.execute(
+            "SELECT xml_info, imd_info, flux_info FROM summary_cache "
+            "WHERE capture_directory = ? AND file_signature = ? AND parser_version = ?",
+            (capture_directory, file_signature, self.parser_version)
+        ).fetchone()
+        if row is None:
+            return None
+
+        xml_info, imd_info, flux_info = row
+        return _xml_info_decoder.decode(xml_info), _imd_info_decoder.decode(imd_info), _flux_info_decoder.decode(flux_info)
+
+    def put(self, capture_directory: str, file_signature: str,
+            xml_info: FloppyInfoFromXML, imd_info: FloppyInfoFromIMD, flux_info: FloppyInfoFromFlux | None) -> None:
+        """Store the information parsed from a capture directory."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO summary_cache "
+            "(capture_directory, file_signature, parser_version, xml_info, imd_info, flux_info) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (capture_directory, file_signature, self.parser_version,
+             msgspec.msgpack.encode(xml_info), msgspec.msgpack.encode(imd_info), msgspec.msgpack.encode(flux_info))
+        )
+
+    def close(self) -> None:
+        """Commit stored entries and close the cache."""
+        self.connection.commit()
+        self.connection.close()
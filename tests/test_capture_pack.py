@@ -0,0 +1,131 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+import capture_pack
+from capture_index import scan_capture_directories
+from capture_pack import (
+    PACK_HEADER, PACK_MAGIC, CaptureDirectory, CapturePack, get_capture_pack_path, is_packed_capture, open_capture,
+    pack_capture, unpack_capture
+)
+from leases import try_acquire_lease
+
+FILES = {
+    'track00.0.hxcstream': b'CHKH' + bytes(range(256)) * 8,
+    'track00.1.hxcstream': b'',
+    'dump.log': b'dumped\n',
+}
+
+
+@pytest.fixture
+def capture_dir(tmp_path):
+    capture_dir = tmp_path / 'collection' / 'disk-0001'
+    capture_dir.mkdir(parents=True)
+    for i, (name, data) in enumerate(FILES.items()):
+        (capture_dir / name).write_bytes(data)
+        os.utime(capture_dir / name, ns=(i * 1_000_000_000, i * 1_000_000_000))
+    return capture_dir
+
+
+def test_round_trip(capture_dir):
+    pack_path = pack_capture(capture_dir)
+    assert pack_path == get_capture_pack_path(capture_dir)
+    with CapturePack(pack_path) as pack:
+        pack.verify()
+        assert sorted(pack.names()) == sorted(FILES)
+        assert {name: pack.read(name) for name in pack.names()} == FILES
+
+    mtimes_ns = {name: os.stat(capture_dir / name).st_mtime_ns for name in FILES}
+    for name in FILES:
+        (capture_dir / name).unlink()
+    capture_dir.rmdir()
+    assert is_packed_capture(capture_dir)
+
+    assert unpack_capture(pack_path) == capture_dir
+    assert not is_packed_capture(capture_dir)
+    assert {name: (capture_dir / name).read_bytes() for name in FILES} == FILES
+    assert {name: os.stat(capture_dir / name).st_mtime_ns for name in FILES} == mtimes_ns
+
+
+def test_open_capture(capture_dir):
+    with open_capture(capture_dir) as capture:
+        assert isinstance(capture, CaptureDirectory)
+        assert capture.read('dump.log') == FILES['dump.log']
+
+    pack_path = pack_capture(capture_dir)
+    # The directory is preferred while both exist
+    with open_capture(capture_dir) as capture:
+        assert isinstance(capture, CaptureDirectory)
+    with open_capture(pack_path) as capture:
+        assert isinstance(capture, CapturePack)
+
+    for name in FILES:
+        (capture_dir / name).unlink()
+    capture_dir.rmdir()
+    with open_capture(capture_dir) as capture:
+        assert isinstance(capture, CapturePack)
+        assert capture.read('dump.log') == FILES['dump.log']
+
+
+def test_corrupted_pack(capture_dir):
+    pack_path = pack_capture(capture_dir)
+    data = bytearray(pack_path.read_bytes())
+    data[PACK_HEADER.size] ^= 0xFF
+    pack_path.write_bytes(data)
+    with CapturePack(pack_path) as pack, pytest.raises(ValueError, match='corrupted'):
+        pack.verify()
+
+    capture_dir_copy = capture_dir.with_name('disk-0002')
+    capture_dir_copy.mkdir()
+    bad_pack_path = get_capture_pack_path(capture_dir_copy)
+    bad_pack_path.write_bytes(PACK_HEADER.pack(b'NOTAPACK', 1, 0, 0))
+    with pytest.raises(ValueError, match='not a packed capture'):
+        CapturePack(bad_pack_path)
+    # Failed unpacks leave nothing behind
+    capture_dir_copy.rmdir()
+    pack_path.rename(bad_pack_path)
+    with pytest.raises(ValueError):
+        unpack_capture(bad_pack_path)
+    assert sorted(os.listdir(capture_dir.parent)) == ['disk-0001', 'disk-0002' + capture_pack.PACK_SUFFIX]
+
+
+def test_unpacking_capture_is_hidden(capture_dir, monkeypatch):
+    pack_path = pack_capture(capture_dir)
+    for name in FILES:
+        (capture_dir / name).unlink()
+    capture_dir.rmdir()
+
+    scanned = []
+    extract = CapturePack.extract
+
+    def extract_and_scan(pack, output_dir, names=None):
+        extract(pack, output_dir, names)
+        scanned.extend(scan_capture_directories(capture_dir.parent.parent, use_index=False))
+
+    monkeypatch.setattr(CapturePack, 'extract', extract_and_scan)
+    unpack_capture(pack_path)
+    assert scanned == [capture_dir]
+
+
+def test_pack_remove_skips_leased_capture(capture_dir):
+    runner = CliRunner()
+    lease = try_acquire_lease(capture_dir)
+    assert lease is not None
+    result = runner.invoke(capture_pack.main, ['pack', '--remove', str(capture_dir)])
+    assert result.exit_code == 0
+    assert 'being converted' in result.output
+    assert capture_dir.is_dir() and not get_capture_pack_path(capture_dir).exists()
+
+    lease.release()
+    result = runner.invoke(capture_pack.main, ['pack', '--remove', str(capture_dir)])
+    assert result.exit_code == 0
+    assert is_packed_capture(capture_dir)
+    assert sorted(os.listdir(capture_dir.parent)) == ['disk-0001' + capture_pack.PACK_SUFFIX]
+
+
+def test_pack_header(capture_dir):
+    magic, version, index_offset, index_size = PACK_HEADER.unpack(pack_capture(capture_dir).read_bytes()[:PACK_HEADER.size])
+    assert magic == PACK_MAGIC
+    assert index_offset == PACK_HEADER.size + sum(len(data) for data in FILES.values())
+    assert index_size > 0
@@ -0,0 +1,83 @@
+import os
+import time
+
+import pytest
+
+import capture_watcher
+from capture_watcher import CaptureWatcher, is_capture_settled
+
+
+@pytest.fixture
+def disk_captures_dir(tmp_path):
+    (tmp_path / 'collection').mkdir()
+    return tmp_path
+
+
+def make_capture(disk_captures_dir, name, age_seconds=0.0):
+    capture_dir = disk_captures_dir / 'collection' / name
+    capture_dir.mkdir()
+    (capture_dir / 'track00.0.hxcstream').write_bytes(b'CHKH')
+    mtime = time.time() - age_seconds
+    os.utime(capture_dir / 'track00.0.hxcstream', (mtime, mtime))
+    os.utime(capture_dir, (mtime, mtime))
+    return capture_dir
+
+
+def make_watcher(disk_captures_dir, known_captures=(), settle_seconds=0.0):
+    return CaptureWatcher(disk_captures_dir, set(known_captures), settle_seconds, poll_seconds=60,
+                          use_inotify=False, use_capture_index=False)
+
+
+def test_is_capture_settled(disk_captures_dir):
+    capture_dir = make_capture(disk_captures_dir, 'disk-0001')
+    assert not is_capture_settled(capture_dir, settle_seconds=60)
+    assert is_capture_settled(make_capture(disk_captures_dir, 'disk-0002', age_seconds=120), settle_seconds=60)
+
+    # Nothing uploaded yet
+    (disk_captures_dir / 'collection' / 'disk-0003').mkdir()
+    assert not is_capture_settled(disk_captures_dir / 'collection' / 'disk-0003', settle_seconds=0)
+
+
+def test_capture_is_returned_once_it_stops_changing(disk_captures_dir):
+    known = make_capture(disk_captures_dir, 'disk-0001')
+    watcher = make_watcher(disk_captures_dir, [known])
+    capture_dir = make_capture(disk_captures_dir, 'disk-0002')
+    watcher._poll()
+    assert list(watcher.pending) == [capture_dir]
+
+    # The first check only records the files
+    assert watcher._take_settled() == []
+    (capture_dir / 'track00.1.hxcstream').write_bytes(b'CHKH')
+    assert watcher._take_settled() == []
+    assert watcher._take_settled() == [capture_dir]
+
+    watcher._poll()
+    assert not watcher.pending
+
+
+def test_capture_is_not_returned_while_settling(disk_captures_dir):
+    watcher = make_watcher(disk_captures_dir, settle_seconds=60)
+    make_capture(disk_captures_dir, 'disk-0001')
+    watcher._poll()
+    assert watcher._take_settled() == []
+    assert watcher._take_settled() == []
+
+
+def test_failed_capture_is_retried_later(disk_captures_dir):
+    capture_dir = make_capture(disk_captures_dir, 'disk-0001')
+    watcher = make_watcher(disk_captures_dir, [capture_dir])
+
+    watcher.retry_later(capture_dir, retry_seconds=60)
+    watcher._poll()
+    assert not watcher.pending
+
+    watcher.retry_later(capture_dir, retry_seconds=0)
+    watcher._poll()
+    assert list(watcher.pending) == [capture_dir]
+
+
+def test_wait(disk_captures_dir, monkeypatch):
+    monkeypatch.setattr(capture_watcher, 'SETTLE_CHECK_SECONDS', 0.01)
+    watcher = make_watcher(disk_captures_dir)
+    capture_dir = make_capture(disk_captures_dir, 'disk-0001')
+    assert watcher.wait() == [capture_dir]
@@ -0,0 +1,118 @@
+from compression import zstd
+import os
+import stat
+
+import pytest
+
+from content_store import (
+    COMPRESSED_SUFFIX, CONTENT_STORE_DIRNAME, collect_garbage, get_content_store_dir, open_output, output_exists,
+    store_parsed_dir
+)
+from conversion_manifest import CONVERSION_MANIFEST_FILENAME
+from pyhxcfe import merge_parsed_dir
+
+OUTPUTS = {
+    'GENERIC_XML.xml': b'<disk_layout></disk_layout>\n' * 64,
+    'HXC_HFE.hfe': b'HXCPICFE' + bytes(4096),
+    'RAW_IMG.img': b'\xe5' * 4096,
+    CONVERSION_MANIFEST_FILENAME: b'{}',
+    'stdout.txt': b'converted\n',
+}
+
+
+def make_parsed_dir(disk_captures_dir, collection, name, outputs=OUTPUTS):
+    parsed_dir = disk_captures_dir / collection / f'{name}_parsed'
+    parsed_dir.mkdir(parents=True)
+    for file_name, data in outputs.items():
+        (parsed_dir / file_name).write_bytes(data)
+    return parsed_dir
+
+
+@pytest.fixture
+def disk_captures_dir(tmp_path):
+    return tmp_path / 'disk-captures'
+
+
+def test_store_round_trip(disk_captures_dir):
+    first = make_parsed_dir(disk_captures_dir, 'hh1', 'disk-0001')
+    second = make_parsed_dir(disk_captures_dir, 'hh2', 'disk-0002')
+    store_dir = get_content_store_dir(first)
+    assert store_dir == disk_captures_dir / CONTENT_STORE_DIRNAME
+
+    store_parsed_dir(first, store_dir)
+    saved = store_parsed_dir(second, store_dir)
+    assert saved > len(OUTPUTS['RAW_IMG.img'])
+
+    for parsed_dir in (first, second):
+        # Only the HFE is compressed, the XML is read by every summary
+        assert (parsed_dir / 'GENERIC_XML.xml').exists()
+        assert not (parsed_dir / 'HXC_HFE.hfe').exists()
+        assert (parsed_dir / ('HXC_HFE.hfe' + COMPRESSED_SUFFIX)).exists()
+        for file_name, data in OUTPUTS.items():
+            assert output_exists(parsed_dir / file_name)
+            with open_output(parsed_dir / file_name) as f:
+                assert f.read() == data
+        # Manifests and logs are not shared
+        assert os.stat(parsed_dir / 'stdout.txt').st_nlink == 1
+        assert os.stat(parsed_dir / CONVERSION_MANIFEST_FILENAME).st_nlink == 1
+
+    assert os.path.samefile(first / 'RAW_IMG.img', second / 'RAW_IMG.img')
+    assert os.stat(first / 'RAW_IMG.img').st_nlink == 3
+    assert not os.stat(first / 'RAW_IMG.img').st_mode & stat.S_IWUSR
+
+    # Storing again changes nothing
+    assert store_parsed_dir(first, store_dir) == 0
+    assert collect_garbage(store_dir) == 0
+
+    for parsed_dir in (first, second):
+        for path in parsed_dir.iterdir():
+            path.unlink()
+        parsed_dir.rmdir()
+    assert collect_garbage(store_dir) > 0
+    assert not list(store_dir.glob('*/*'))
+
+
+def test_store_decompresses_xml_of_earlier_version(disk_captures_dir):
+    parsed_dir = make_parsed_dir(disk_captures_dir, 'hh1', 'disk-0001', {})
+    with zstd.open(parsed_dir / ('GENERIC_XML.xml' + COMPRESSED_SUFFIX), 'wb') as f:
+        f.write(OUTPUTS['GENERIC_XML.xml'])
+
+    store_parsed_dir(parsed_dir, get_content_store_dir(parsed_dir))
+
+    assert not (parsed_dir / ('GENERIC_XML.xml' + COMPRESSED_SUFFIX)).exists()
+    assert (parsed_dir / 'GENERIC_XML.xml').read_bytes() == OUTPUTS['GENERIC_XML.xml']
+
+
+def test_merge_into_stored_parsed_dir(disk_captures_dir):
+    first = make_parsed_dir(disk_captures_dir, 'hh1', 'disk-0001')
+    second = make_parsed_dir(disk_captures_dir, 'hh1', 'disk-0002')
+    store_dir = get_content_store_dir(first)
+    store_parsed_dir(first, store_dir)
+    store_parsed_dir(second, store_dir)
+
+    new_outputs = {
+        'RAW_IMG.img': b'\x00' * 4096,
+        'HXC_HFE.hfe': b'HXCPICFE' + b'\xff' * 4096,
+        'stdout.txt': b'reconverted\n',
+    }
+    wip_dir = make_parsed_dir(disk_captures_dir, 'hh1', 'disk-0001_wip', new_outputs)
+    merge_parsed_dir(wip_dir, first)
+
+    assert not wip_dir.exists()
+    assert (first / 'RAW_IMG.img').read_bytes() == new_outputs['RAW_IMG.img']
+    # The new uncompressed output is not shadowed by the stored compressed one
+    assert not (first / ('HXC_HFE.hfe' + COMPRESSED_SUFFIX)).exists()
+    with open_output(first / 'HXC_HFE.hfe') as f:
+        assert f.read() == new_outputs['HXC_HFE.hfe']
+    assert (first / 'stdout.txt').read_bytes() == OUTPUTS['stdout.txt'] + new_outputs['stdout.txt']
+
+    # The outputs shared through the store are left as they were
+    assert (second / 'RAW_IMG.img').read_bytes() == OUTPUTS['RAW_IMG.img']
+    with open_output(second / 'HXC_HFE.hfe') as f:
+        assert f.read() == OUTPUTS['HXC_HFE.hfe']
+
+    store_parsed_dir(first, store_dir)
+    assert os.path.samefile(first / 'GENERIC_XML.xml', second / 'GENERIC_XML.xml')
+    assert not os.path.samefile(first / 'RAW_IMG.img', second / 'RAW_IMG.img')
+    with open_output(first / 'HXC_HFE.hfe') as f:
+        assert f.read() == new_outputs['HXC_HFE.hfe']
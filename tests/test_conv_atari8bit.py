@@ -0,0 +1,25 @@
+import tempfile
+
+import conv_atari8bit
+from capture_pack import open_capture
+
+
+def test_unreadable_track_is_left_to_hxcfe(tmp_path, monkeypatch, capsys):
+    capture_dir = tmp_path / 'capture'
+    capture_dir.mkdir()
+    (capture_dir / 'track00.0.hxcstream').write_bytes(b'XXXX' + bytes(12))
+    (capture_dir / 'track01.0.hxcstream').write_bytes(b'')
+
+    conversions: list[str] = []
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    monkeypatch.setattr(conv_atari8bit, 'hxcfe_convert',
+                        lambda first_filepath, convert_format, output_filepath: conversions.append(convert_format))
+    monkeypatch.setattr(conv_atari8bit.subprocess, 'run', lambda cmd, check: conversions.append('a8rawconv'))
+
+    with open_capture(capture_dir) as capture:
+        conv_atari8bit.conv_atari8bit_capture(capture, 'disk')
+
+    assert conversions == ['HXC_HFE', 'SCP_FLUX_STREAM', 'a8rawconv']
+    output = capsys.readouterr().out
+    assert 'Could not read the flux of track00.0.hxcstream' in output
+    assert 'Blank tracks 1' in output
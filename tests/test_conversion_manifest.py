@@ -0,0 +1,51 @@
+import os
+
+import conversion_manifest
+from conversion_manifest import (
+    CONVERSION_MANIFEST_FILENAME, ConversionManifest, get_capture_inputs, get_hxcfe_fingerprint, read_manifest,
+    write_manifest
+)
+
+
+def test_hxcfe_fingerprint(tmp_path):
+    hxcfe_binary_path = tmp_path / 'hxcfe'
+    hxcfe_binary_path.write_bytes(b'hxcfe')
+    fingerprint = get_hxcfe_fingerprint(hxcfe_binary_path)
+    assert get_hxcfe_fingerprint(hxcfe_binary_path) == fingerprint
+
+    # The library is part of the build
+    (tmp_path / 'libhxcfe.so').write_bytes(b'library')
+    assert get_hxcfe_fingerprint(hxcfe_binary_path) != fingerprint
+
+
+def test_capture_inputs_are_hashed_only_when_changed(tmp_path, monkeypatch):
+    (tmp_path / 'track00.0.hxcstream').write_bytes(b'CHKH0')
+    (tmp_path / 'track00.1.hxcstream').write_bytes(b'CHKH1')
+    (tmp_path / 'dump.log').write_bytes(b'log')
+
+    inputs = get_capture_inputs(tmp_path)
+    assert [i.name for i in inputs] == ['track00.0.hxcstream', 'track00.1.hxcstream']
+    manifest = ConversionManifest(inputs=inputs, hxcfe_fingerprint='hxcfe', formats=['GENERIC_XML'])
+
+    hashed: list[str] = []
+    hash_file = conversion_manifest._hash_file
+    monkeypatch.setattr(conversion_manifest, '_hash_file', lambda path: hashed.append(path.name) or hash_file(path))
+    assert get_capture_inputs(tmp_path, manifest) == inputs
+    assert hashed == []
+
+    # Touched but identical files are hashed again and still match
+    os.utime(tmp_path / 'track00.1.hxcstream', ns=(0, 0))
+    assert manifest.is_current(get_capture_inputs(tmp_path, manifest), 'hxcfe')
+    assert hashed == ['track00.1.hxcstream']
+
+    (tmp_path / 'track00.1.hxcstream').write_bytes(b'CHKH2')
+    assert not manifest.is_current(get_capture_inputs(tmp_path, manifest), 'hxcfe')
+    assert not manifest.is_current(inputs, 'other-hxcfe')
+
+
+def test_manifest_round_trip(tmp_path):
+    assert read_manifest(tmp_path) is None
+    manifest = ConversionManifest(inputs=get_capture_inputs(tmp_path), hxcfe_fingerprint='hxcfe', formats=['IMD_IMG'])
+    write_manifest(tmp_path, manifest)
+    assert read_manifest(tmp_path) == manifest
+    assert os.listdir(tmp_path) == [CONVERSION_MANIFEST_FILENAME]
@@ -0,0 +1,19 @@
+from capture_pack import CaptureDirectory
+from flux_analysis import analyze_capture_tracks
+
+
+def test_unreadable_tracks_are_damaged(tmp_path, monkeypatch):
+    (tmp_path / 'track00.0.hxcstream').write_bytes(b'')
+    (tmp_path / 'track01.0.hxcstream').write_bytes(b'XXXX' + bytes(12))
+    (tmp_path / 'track02.0.hxcstream').write_bytes(b'')
+    read = CaptureDirectory.read
+
+    def read_failing(capture, name):
+        if name == 'track02.0.hxcstream':
+            raise OSError(5, 'Input/output error')
+        return read(capture, name)
+
+    monkeypatch.setattr(CaptureDirectory, 'read', read_failing)
+    analyses, damaged_tracks = analyze_capture_tracks(tmp_path)
+    assert [(analysis.name, analysis.blank) for analysis in analyses] == [('00.0', True)]
+    assert damaged_tracks == ['01.0', '02.0']
@@ -0,0 +1,87 @@
+import struct
+import zlib
+
+import numpy as np
+
+import flux_preview
+from flux_preview import (
+    DISK_THUMBNAIL_FILENAME, FULL_SIZE, PNG_SIGNATURE, PREVIEW_FILENAMES, SIDE_GAP, STREAM_THUMBNAIL_FILENAME,
+    THUMBNAIL_FILENAMES, THUMBNAIL_SIZE, encode_png, ensure_previews, get_revolution_density, render_previews
+)
+from hxcstream import HxCStream
+from test_hxcstream import REVOLUTION_TICKS, make_stream
+
+
+def decode_png(data: bytes) -> np.ndarray:
+    """Decode the PNGs written by encode_png."""
+    assert data.startswith(PNG_SIGNATURE)
+    offset = len(PNG_SIGNATURE)
+    chunks: dict[bytes, bytes] = {}
+    while offset < len(data):
+        (length,) = struct.unpack_from('>I', data, offset)
+        chunk_type = data[offset + 4:offset + 8]
+        chunks[chunk_type] = data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+    width, height, bit_depth, colour_type, _, _, _ = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+    assert (bit_depth, colour_type) == (8, 0)
+    rows = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, width + 1)
+    assert not rows[:, 0].any()
+    return rows[:, 1:]
+
+
+def test_encode_png():
+    pixels = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    assert np.array_equal(decode_png(encode_png(pixels)), pixels)
+
+
+def test_revolution_density():
+    # Two revolutions of evenly spaced flux
+    stream = HxCStream.from_bytes(make_stream([1000] * (2 * REVOLUTION_TICKS // 1000)))
+    density = get_revolution_density(stream, 10)
+    assert len(density) == 10
+    assert abs(int(density.sum()) - REVOLUTION_TICKS // 1000) <= 1
+    assert density.max() - density.min() <= 1
+
+
+def test_render_previews(tmp_path):
+    capture_dir = tmp_path / 'capture'
+    capture_dir.mkdir()
+    for track in range(3):
+        for side in range(2):
+            (capture_dir / f'track{track:02}.{side}.hxcstream').write_bytes(make_stream([1000] * 12_000))
+
+    render_previews(capture_dir, tmp_path, full_size=True)
+    assert sorted(path.name for path in tmp_path.glob('*.png')) == sorted(PREVIEW_FILENAMES)
+
+    stream_view = decode_png((tmp_path / STREAM_THUMBNAIL_FILENAME).read_bytes())
+    assert stream_view.shape == (3 * THUMBNAIL_SIZE.strip_height, 2 * THUMBNAIL_SIZE.columns + SIDE_GAP)
+    # Evenly spaced flux is drawn at about the same level everywhere
+    assert stream_view[:, :THUMBNAIL_SIZE.columns].min() > 224
+    disk_view = decode_png((tmp_path / DISK_THUMBNAIL_FILENAME).read_bytes())
+    assert disk_view.shape == (THUMBNAIL_SIZE.columns, 2 * THUMBNAIL_SIZE.columns + SIDE_GAP)
+    disk_preview = decode_png((tmp_path / flux_preview.DISK_PREVIEW_FILENAME).read_bytes())
+    assert disk_preview.shape == (FULL_SIZE.columns, 2 * FULL_SIZE.columns + SIDE_GAP)
+
+
+def test_ensure_previews(tmp_path, monkeypatch, capsys):
+    capture_dir = tmp_path / 'capture'
+    capture_dir.mkdir()
+    output_dir = tmp_path / 'capture_parsed'
+    output_dir.mkdir()
+
+    # No tracks to draw
+    assert ensure_previews(capture_dir, output_dir) == []
+    assert 'Failed to render previews of capture' in capsys.readouterr().out
+
+    rendered: list[bool] = []
+
+    def render_previews(capture_dir, output_dir, full_size=False):
+        rendered.append(full_size)
+        for filename in PREVIEW_FILENAMES if full_size else THUMBNAIL_FILENAMES:
+            (output_dir / filename).write_bytes(b'')
+
+    monkeypatch.setattr(flux_preview, 'render_previews', render_previews)
+    assert ensure_previews(capture_dir, output_dir) == THUMBNAIL_FILENAMES
+    assert ensure_previews(capture_dir, output_dir) == THUMBNAIL_FILENAMES
+    assert ensure_previews(capture_dir, output_dir, full_size=True) == PREVIEW_FILENAMES
+    assert rendered == [False, True]
@@ -0,0 +1,133 @@
+import zlib
+
+import lz4.block
+import numpy as np
+import pytest
+
+from capture_pack import open_capture
+from hxcstream import (
+    CHUNK_CRC, CHUNK_HEADER, CHUNK_SIGNATURE, METADATA_HEADER, PACKED_FLUX_STREAM_HEADER, PACKED_IO_STREAM_HEADER,
+    PACKET_METADATA, PACKET_PACKED_FLUX_STREAM, PACKET_PACKED_IO_STREAM, HxCStream, decode_flux, get_capture_stats,
+    get_capture_track_names, get_stream_stats, parse_hxc_filename
+)
+
+SAMPLE_RATE = 25_000_000
+# 300 rpm
+REVOLUTION_TICKS = SAMPLE_RATE // 5
+
+
+def encode_flux(values: list[int]) -> bytes:
+    """Encode flux intervals with the variable length codes decode_flux reads."""
+    data = bytearray()
+    for value in values:
+        if value < 1 << 7:
+            data.append(value)
+        elif value < 1 << 14:
+            data += (0x8000 | value).to_bytes(2, 'big')
+        elif value < 1 << 21:
+            data += (0xC00000 | value).to_bytes(3, 'big')
+        else:
+            data += (0xE0000000 | value).to_bytes(4, 'big')
+    return bytes(data)
+
+
+def make_chunk(packets: list[bytes], number: int) -> bytes:
+    body = b''.join(packets)
+    header = CHUNK_HEADER.pack(CHUNK_SIGNATURE, CHUNK_HEADER.size + len(body) + CHUNK_CRC.size, number) + body
+    return header + CHUNK_CRC.pack(zlib.crc32(header))
+
+
+def make_stream(flux: list[int], chunks: int = 3) -> bytes:
+    """Build a hxcstream file of flux intervals, with an index pulse every revolution in its IO stream."""
+    total_ticks = sum(flux)
+    io_ticks = np.arange(total_ticks // 1000) * total_ticks // (total_ticks // 1000)
+    io = ((io_ticks % REVOLUTION_TICKS) < REVOLUTION_TICKS // 100).astype('<u2')
+
+    metadata = f"sample_rate_hz {SAMPLE_RATE}\ndump_name test\n".encode()
+    data = make_chunk([METADATA_HEADER.pack(PACKET_METADATA, len(metadata)) + metadata], 0)
+    for i, (flux_part, io_part) in enumerate(zip(np.array_split(flux, chunks), np.array_split(io, chunks))):
+        unpacked_flux = encode_flux(flux_part.tolist())
+        packed_flux = lz4.block.compress(unpacked_flux, store_size=False)
+        unpacked_io = io_part.tobytes()
+        packed_io = lz4.block.compress(unpacked_io, store_size=False)
+        data += make_chunk([
+            PACKED_IO_STREAM_HEADER.pack(PACKET_PACKED_IO_STREAM, len(packed_io), len(unpacked_io)) + packed_io,
+            PACKED_FLUX_STREAM_HEADER.pack(PACKET_PACKED_FLUX_STREAM, len(packed_flux), len(unpacked_flux),
+                                           len(flux_part)) + packed_flux,
+        ], i + 1)
+    return data
+
+
+def test_decode_flux():
+    rng = np.random.default_rng(0)
+    values = [0, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, 0x0FFFFFFF]
+    # Mixed code lengths across many decode blocks
+    values += (1 << rng.integers(0, 28, 10_000)).tolist()
+    assert decode_flux(np.frombuffer(encode_flux(values), dtype=np.uint8)).tolist() == values
+    assert len(decode_flux(np.zeros(0, dtype=np.uint8))) == 0
+
+
+@pytest.mark.parametrize('data', [b'\x01\xF0', b'\x01\xC0\x01'], ids=['invalid', 'truncated'])
+def test_decode_flux_errors(data):
+    with pytest.raises(ValueError):
+        decode_flux(np.frombuffer(data, dtype=np.uint8))
+
+
+def test_round_trip():
+    flux = [100, 150, 200, 20_000, 3_000_000] * 1000
+    stream = HxCStream.from_bytes(make_stream(flux), check_crc=True)
+    assert stream.flux.tolist() == flux
+    assert stream.sample_rate == SAMPLE_RATE
+    assert stream.metadata == {'sample_rate_hz': str(SAMPLE_RATE), 'dump_name': 'test'}
+    assert stream.duration_ticks == sum(flux)
+    assert len(stream.io) == sum(flux) // 1000
+
+
+def test_max_flux_stops_after_chunk():
+    stream = HxCStream.from_bytes(make_stream([100] * 3000), max_flux=1)
+    assert len(stream.flux) == 1000
+
+
+def test_crc_mismatch():
+    data = bytearray(make_stream([100] * 3000))
+    data[-1] ^= 0xFF
+    assert len(HxCStream.from_bytes(bytes(data)).flux) == 3000
+    with pytest.raises(ValueError, match='CRC'):
+        HxCStream.from_bytes(bytes(data), check_crc=True)
+
+
+def test_invalid_chunk():
+    with pytest.raises(ValueError, match='signature'):
+        HxCStream.from_bytes(b'XXXX' + make_stream([100])[4:])
+    with pytest.raises(ValueError, match='size'):
+        HxCStream.from_bytes(make_stream([100])[:-1])
+
+
+def test_stream_stats():
+    # One second of 5000 flux transitions per revolution, the first and last revolutions are partial
+    stats = get_stream_stats(HxCStream.from_bytes(make_stream([1000] * 25_000)), 3, 1)
+    assert (stats.track, stats.side, stats.flux_count) == (3, 1, 25_000)
+    assert stats.data_length == pytest.approx(1.0)
+    assert stats.revolutions == 3
+    assert stats.rpm == pytest.approx(300, rel=0.01)
+    assert stats.flux_per_revolution == pytest.approx(5000, rel=0.01)
+    assert not stats.blank
+
+    blank = get_stream_stats(HxCStream.from_bytes(make_stream([50_000] * 500)), 0, 0)
+    assert blank.blank
+
+
+def test_parse_hxc_filename():
+    assert parse_hxc_filename('track07.1.hxcstream') == (7, 1)
+    with pytest.raises(ValueError):
+        parse_hxc_filename('track07.1.hxcstream.tmp')
+
+
+def test_capture_stats(tmp_path):
+    for track, side in [(10, 0), (2, 1), (2, 0)]:
+        (tmp_path / f'track{track:02}.{side}.hxcstream').write_bytes(make_stream([1000] * 12_000))
+    (tmp_path / 'notes.txt').write_text('not a track')
+
+    with open_capture(tmp_path) as capture:
+        assert get_capture_track_names(capture) == ['track02.0.hxcstream', 'track02.1.hxcstream', 'track10.0.hxcstream']
+    assert [(stats.track, stats.side) for stats in get_capture_stats(tmp_path)] == [(2, 0), (2, 1), (10, 0)]
@@ -0,0 +1,129 @@
+import io
+
+import pytest
+
+from python_imd.imd import Disk, DiskStats, SectorDataRecordType, TrackMode
+
+SECTOR_SIZE = 256
+# Hours are space padded like IMD itself writes them
+HEADER = b"IMD 1.18: 16/10/2026  9:34:56\r\ntest disk\x1a"
+
+
+def make_track(cylinder: int, head: int, sectors: list[tuple[int, bytes]], cylinder_map: list[int] | None = None,
+               head_map: list[int] | None = None) -> bytes:
+    """Encode a track of 256 byte sectors given as (sector id, record) pairs."""
+    flags = head | (0x80 if cylinder_map is not None else 0) | (0x40 if head_map is not None else 0)
+    data = bytes([TrackMode.MFM_250KBPS, cylinder, flags, len(sectors), 1])
+    data += bytes(sector_id for sector_id, _ in sectors)
+    data += bytes(cylinder_map or [])
+    data += bytes(head_map or [])
+    return data + b''.join(record for _, record in sectors)
+
+
+def normal(fill: int) -> bytes:
+    return bytes([SectorDataRecordType.NORMAL]) + bytes([fill]) * SECTOR_SIZE
+
+
+def compressed(fill: int) -> bytes:
+    return bytes([SectorDataRecordType.COMPRESSED, fill])
+
+
+IMD_DATA = HEADER + make_track(0, 0, [(2, normal(0x22)), (1, compressed(0x11)), (3, bytes([0]))]) \
+    + make_track(0, 1, [(1, bytes([SectorDataRecordType.ERROR_NORMAL]) + b'\x55' * SECTOR_SIZE)],
+                 cylinder_map=[5], head_map=[1])
+
+
+@pytest.fixture(params=[False, True], ids=['eager', 'lazy'])
+def disk(request, tmp_path) -> Disk:
+    path = tmp_path / 'disk.imd'
+    path.write_bytes(IMD_DATA)
+    disk = Disk.open(str(path), lazy=request.param)
+    yield disk
+    disk.close()
+
+
+def test_header(disk):
+    assert disk.version == (1, 18)
+    assert disk.date == (16, 10, 2026)
+    assert disk.time == (9, 34, 56)
+    assert disk.comment == 'test disk'
+
+
+def test_tracks(disk):
+    assert len(disk.tracks) == 2
+    first, second = disk.tracks[0], disk.tracks[1]
+    assert (first.cylinder, first.head, first.sector_count, first.sector_size) == (0, 0, 3, SECTOR_SIZE)
+    assert first.sector_numbering_map == [2, 1, 3]
+    assert first.sector_cylinder_map is None and first.sector_head_map is None
+    assert second.sector_cylinder_map == [5] and second.sector_head_map == [1]
+    assert second.sector_data_records[0].record_type.has_error
+
+
+def test_round_trip(disk):
+    assert disk.to_bytes() == IMD_DATA
+    assert Disk.from_bytes(disk.to_bytes()) == Disk.from_bytes(IMD_DATA)
+
+
+def test_read_sector(disk):
+    assert bytes(disk.read_sector(0, 0, 1)) == b'\x11' * SECTOR_SIZE
+    assert bytes(disk.read_sector(0, 0, 2)) == b'\x22' * SECTOR_SIZE
+    assert disk.read_sector(0, 0, 3) is None
+    # Addressed through the cylinder and head maps
+    assert bytes(disk.read_sector(5, 1, 1)) == b'\x55' * SECTOR_SIZE
+    with pytest.raises(KeyError):
+        disk.read_sector(0, 1, 1)
+
+
+def test_iter_sectors(disk):
+    sectors = [(address, None if data is None else bytes(data)[:1]) for address, data in disk.iter_sectors()]
+    assert sectors == [((0, 0, 1), b'\x11'), ((0, 0, 2), b'\x22'), ((0, 0, 3), None), ((5, 1, 1), b'\x55')]
+
+
+def test_write_raw_to(disk):
+    raw = io.BytesIO()
+    disk.write_raw_to(raw, fill_byte=0xe5)
+    # The second head only has sector 1, sectors 2 and 3 are padded
+    assert raw.getvalue() == b''.join(bytes([fill]) * SECTOR_SIZE for fill in [0x11, 0x22, 0xe5, 0x55, 0xe5, 0xe5])
+
+
+def test_write_raw_to_pads_gaps():
+    data = HEADER + make_track(0, 0, [(1, normal(0x01)), (3, normal(0x03))]) \
+        + make_track(2, 0, [(2, compressed(0x22)), (1, normal(0x21)), (3, normal(0x23))])
+    raw = io.BytesIO()
+    Disk.from_bytes(data).write_raw_to(raw, fill_byte=0xe5)
+    # Sector 2 of cylinder 0 and all of cylinder 1 are missing
+    fills = [0x01, 0xe5, 0x03, 0xe5, 0xe5, 0xe5, 0x21, 0x22, 0x23]
+    assert raw.getvalue() == b''.join(bytes([fill]) * SECTOR_SIZE for fill in fills)
+
+
+def test_disk_stats():
+    stats = DiskStats.from_bytes(IMD_DATA)
+    assert (stats.track_count, stats.sector_count, stats.error_count, stats.unavailable_count) == (2, 4, 1, 1)
+    assert stats.modes == [TrackMode.MFM_250KBPS]
+
+
+def test_missing_header_terminator():
+    with pytest.raises(ValueError):
+        Disk.from_bytes(IMD_DATA[:20])
+
+
+def test_close_lazy_disk(tmp_path):
+    path = tmp_path / 'disk.imd'
+    path.write_bytes(IMD_DATA)
+    with Disk.open(str(path), lazy=True) as disk:
+        assert bytes(disk.read_sector(0, 0, 2))[:1] == b'\x22'
+    assert disk._mmap is None
+
+
+def test_close_lazy_disk_while_sector_is_held(tmp_path):
+    path = tmp_path / 'disk.imd'
+    path.write_bytes(IMD_DATA)
+    disk = Disk.open(str(path), lazy=True)
+    sector = disk.read_sector(0, 0, 2)
+    track = disk.tracks[1]
+    disk.close()
+    assert disk._mmap is None
+    # The mapping stays alive for the views which still point into it
+    assert bytes(sector) == b'\x22' * SECTOR_SIZE
+    assert bytes(track.sector_data_records[0].data) == b'\x55' * SECTOR_SIZE
+    disk.close()
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import time
+
+import msgspec
+
+from leases import LeaseOwner, _break_abandoned_lease, get_lease_owner, get_lease_path, try_acquire_lease
+
+
+def test_lease_is_exclusive(tmp_path):
+    target = tmp_path / 'disk-0001'
+    lease = try_acquire_lease(target)
+    assert lease is not None
+    assert try_acquire_lease(target) is None
+    lease.release()
+    assert not get_lease_path(target).exists()
+    assert try_acquire_lease(target) is not None
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    target = tmp_path / 'disk-0001'
+    stale = try_acquire_lease(target)
+    assert stale is not None
+    old = time.time() - 3600
+    os.utime(stale.path, (old, old))
+
+    lease = try_acquire_lease(target, timeout=60)
+    assert lease is not None
+    assert lease.is_held() and not stale.is_held()
+    # Releasing the lost lease leaves the new one alone
+    stale.release()
+    assert lease.is_held()
+
+
+def test_released_lease_is_not_broken(tmp_path):
+    path = get_lease_path(tmp_path / 'disk-0001')
+    assert _break_abandoned_lease(path, timeout=60)
+    assert not path.with_name(path.name + '.break').exists()
+
+    lease = try_acquire_lease(tmp_path / 'disk-0001')
+    assert lease is not None
+    assert not _break_abandoned_lease(lease.path, timeout=60)
+    assert lease.is_held()
+
+
+def write_lease(target, host: str, pid: int) -> None:
+    get_lease_path(target).write_bytes(msgspec.json.encode(LeaseOwner(host=host, pid=pid, token='other')))
+
+
+def test_lease_of_dead_local_process_is_taken_over(tmp_path):
+    target = tmp_path / 'disk-0001'
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    write_lease(target, os.uname().nodename, process.pid)
+    assert get_lease_owner(target) == LeaseOwner(host=os.uname().nodename, pid=process.pid, token='other')
+
+    lease = try_acquire_lease(target)
+    assert lease is not None and lease.is_held()
+
+
+def test_fresh_lease_of_live_or_remote_process_is_kept(tmp_path):
+    target = tmp_path / 'disk-0001'
+    write_lease(target, os.uname().nodename, os.getppid())
+    assert try_acquire_lease(target) is None
+
+    write_lease(target, 'other-node', 1 << 22)
+    assert try_acquire_lease(target) is None
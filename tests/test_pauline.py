@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import asyncssh
+
+import pauline
+from pauline import UPLOAD_NICENESS, Pauline
+
+CAPTURES_DIR = '/home/pauline/Disks_Captures'
+
+
+class FakeSSH:
+    """Records the commands run on Pauline and keeps track of the captures left in Disks_Captures."""
+
+    def __init__(self, captures: list[str], failing: set[str] = set()) -> None:
+        self.captures = [f'{CAPTURES_DIR}/{name}' for name in captures]
+        self.failing = set(failing)
+        self.commands: list[str] = []
+        self.uploading = 0
+        self.max_uploading = 0
+
+    async def run(self, command: str, check: bool = False):
+        self.commands.append(command)
+        if command.startswith('find '):
+            return SimpleNamespace(stdout='\n'.join(self.captures) + '\n', stderr='', exit_status=0)
+        if 'scp ' in command:
+            subdir = command.split(' -r ')[1].split()[0]
+            self.uploading += 1
+            self.max_uploading = max(self.max_uploading, self.uploading)
+            await asyncio.sleep(0.01)
+            self.uploading -= 1
+            if subdir.rsplit('/', 1)[1] in self.failing:
+                self.failing.remove(subdir.rsplit('/', 1)[1])
+                raise asyncssh.process.ProcessError(
+                    None, command, None, 1, None, 1, '', 'ssh: connect to host nas.herniarchiv.cz: Network is unreachable'
+                )
+        if command.startswith('mkdir -p /home/pauline/Disks_Captures_Done && mv '):
+            self.captures.remove(command.split(' mv ')[1].split()[0])
+        return SimpleNamespace(stdout='', stderr='', exit_status=0)
+
+    def uploads(self) -> list[str]:
+        return [command for command in self.commands if 'scp ' in command]
+
+
+def make_pauline(ssh: FakeSSH, has_ionice: bool = True) -> Pauline:
+    device = Pauline(address='pauline')
+    device.ssh = ssh
+    device.has_ionice = has_ionice
+    return device
+
+
+def test_background_uploads_run_at_low_priority():
+    ssh = FakeSSH(['disk-0001'])
+
+    async def upload():
+        device = make_pauline(ssh)
+        device.start_upload('disk-0001')
+        await device.finish_uploads()
+
+    asyncio.run(upload())
+    assert ssh.uploads() == [
+        f'nice -n {UPLOAD_NICENESS} ionice -c 3 scp -P 7722 -r {CAPTURES_DIR}/disk-0001 '
+        'dumper@nas.herniarchiv.cz:dumps/pauline2/Disks_Captures/'
+    ]
+    assert ssh.captures == []
+
+
+def test_upload_without_ionice():
+    ssh = FakeSSH(['disk-0001'])
+    asyncio.run(make_pauline(ssh, has_ionice=False).upload_capture_directory(f'{CAPTURES_DIR}/disk-0001',
+                                                                             low_priority=True))
+    assert ssh.uploads()[0].startswith(f'nice -n {UPLOAD_NICENESS} scp ')
+
+
+def test_failed_uploads_are_retried_after_the_batch(capsys):
+    names = ['disk-0001', 'disk-0002', 'disk-0003']
+    ssh = FakeSSH(names, failing={'disk-0002'})
+
+    async def upload():
+        device = make_pauline(ssh)
+        for name in names:
+            device.start_upload(name)
+        await device.finish_uploads()
+        assert not device.upload_tasks
+
+    asyncio.run(upload())
+    assert 'Failed to upload disk-0002, retrying after the batch' in capsys.readouterr().out
+    assert ssh.max_uploading == pauline.UPLOAD_CONCURRENCY
+    # The retry runs at normal priority, the dump is over
+    assert ssh.uploads()[-1].startswith(f'scp -P 7722 -r {CAPTURES_DIR}/disk-0002 ')
+    assert ssh.captures == []
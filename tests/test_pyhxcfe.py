@@ -0,0 +1,480 @@
+import os
+from types import SimpleNamespace
+import uuid
+from pathlib import Path
+
+import click
+import pytest
+from click.testing import CliRunner
+
+import pyhxcfe
+from conversion_manifest import ConversionInput, ConversionManifest, get_capture_inputs, read_manifest, write_manifest
+from leases import LeaseKeeper, get_lease_path
+from pyhxcfe import (
+    FORMATS, IMAGE_FORMATS, SUMMARY_FILES, ConversionPlan, PyHXCFERunId, SummaryPipeline, convert_disk_capture_directory,
+    convert_leased_capture,
+    estimate_conversion_cost, get_summary_signature, paginate_summaries, parse_generic_xml, plan_conversion, parse_generic_xml_with_track_stats,
+    run_conversions, split_conversion_plan
+)
+
+FINGERPRINT = 'current-hxcfe'
+
+
+@pytest.fixture
+def capture(tmp_path) -> Path:
+    floppy_subdir = tmp_path / 'collection' / 'disk-0001'
+    floppy_subdir.mkdir(parents=True)
+    (floppy_subdir / 'track00.0.hxcstream').write_bytes(b'CHKH')
+    return floppy_subdir
+
+
+def write_outdated_conversion(floppy_subdir: Path, formats: list[str]) -> None:
+    parsed_dir = floppy_subdir.with_name(floppy_subdir.name + '_parsed')
+    parsed_dir.mkdir()
+    write_manifest(parsed_dir, ConversionManifest(
+        inputs=[ConversionInput(name='track00.0.hxcstream', size=4, mtime_ns=0, sha256='0' * 64)],
+        hxcfe_fingerprint='old-hxcfe',
+        formats=formats
+    ))
+
+
+def convert_fast_lane(floppy_subdir: Path, monkeypatch) -> list[tuple[str, str]]:
+    converted: list[tuple[list[tuple[str, str]], bool]] = []
+
+    def convert_disk_capture_directory(pyhxcfe_run_id, hxcfe_binary_path, floppy_subdir, hxcfe_fingerprint,
+                                       formats, replace, *args):
+        converted.append((formats, replace))
+        return []
+
+    monkeypatch.setattr(pyhxcfe, 'convert_disk_capture_directory', convert_disk_capture_directory)
+    fast_plan, _ = split_conversion_plan(ConversionPlan(formats=FORMATS, replace=False))
+    assert fast_plan is not None
+    with LeaseKeeper() as lease_keeper:
+        events = convert_leased_capture(lease_keeper, PyHXCFERunId(uuid.uuid4()), Path('hxcfe'),
+                                        floppy_subdir, FINGERPRINT, fast_plan, raw_from_imd=False)
+    assert events == []
+    assert not get_lease_path(floppy_subdir).exists()
+    assert len(converted) == 1
+    formats, replace = converted[0]
+    assert replace
+    return formats
+
+
+def test_outdated_capture_leaves_images_to_image_lane(capture, monkeypatch):
+    write_outdated_conversion(capture, [fmt for fmt, _ in FORMATS] + ['PNG_DISK_IMAGE', 'HXC_HFE'])
+    formats = convert_fast_lane(capture, monkeypatch)
+    assert not [fmt for fmt, _ in formats if fmt in IMAGE_FORMATS]
+    # Formats outside the requested ones are still regenerated with the rest
+    assert ('HXC_HFE', 'hfe') in formats
+    assert ('GENERIC_XML', 'xml') in formats
+
+
+def test_unconverted_capture_is_converted_by_fast_lane(capture, monkeypatch):
+    formats = convert_fast_lane(capture, monkeypatch)
+    assert formats == [(fmt, extension) for fmt, extension in FORMATS if fmt not in IMAGE_FORMATS]
+
+
+def test_summary_signature_follows_raw_capture(capture):
+    parsed_dir = capture.with_name(capture.name + '_parsed')
+    parsed_dir.mkdir()
+    assert get_summary_signature(parsed_dir) is None
+
+    for file_name in SUMMARY_FILES:
+        (parsed_dir / file_name).write_bytes(b'output')
+    signature = get_summary_signature(parsed_dir)
+    assert signature is not None
+    assert get_summary_signature(parsed_dir) == signature
+
+    (capture / 'track00.1.hxcstream').write_bytes(b'CHKH')
+    assert get_summary_signature(parsed_dir) != signature
+
+
+GENERIC_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<disk_layout>
+	<disk_layout_name>AUTOGENERATED_LAYOUT</disk_layout_name>
+	<file_size>2048</file_size>
+	<layout>
+		<number_of_track>1</number_of_track>
+		<number_of_side>2</number_of_side>
+		<format>IBM_MFM</format>
+		<sector_per_track>2</sector_per_track>
+		<sector_size>512</sector_size>
+		<bitrate>250000</bitrate>
+		<rpm>300</rpm>
+		<track_list>
+			<track track_number="00" side_number="0">
+				<format>IBM_MFM</format>
+				<sector_list>
+					<sector sector_id="1" sector_size="512"><data_offset>0x000000</data_offset></sector>
+					<sector sector_id="2" sector_size="512"><data_offset>0x000200</data_offset></sector>
+				</sector_list>
+			</track>
+			<track track_number="00" side_number="1">
+				<format>IBM_FM</format>
+				<sector_list>
+					<sector sector_id="1" sector_size="256"><data_offset>0x000400</data_offset></sector>
+				</sector_list>
+			</track>
+		</track_list>
+		<crc32>0xDEADBEEF</crc32>
+	</layout>
+</disk_layout>
+"""
+
+
+def test_parse_generic_xml(tmp_path):
+    xml_path = tmp_path / 'GENERIC_XML.xml'
+    xml_path.write_bytes(GENERIC_XML)
+    xml_info = parse_generic_xml(xml_path)
+    assert (xml_info.file_size, xml_info.number_of_tracks, xml_info.number_of_sides) == (2048, 1, 2)
+    assert (xml_info.format, xml_info.sector_per_track, xml_info.sector_size) == ('IBM_MFM', 2, 512)
+    assert (xml_info.bitrate, xml_info.rpm, xml_info.crc32) == (250000, 300, 0xDEADBEEF)
+    assert xml_info.short_tracks == []
+
+    xml_info_with_stats, track_stats = parse_generic_xml_with_track_stats(xml_path)
+    assert xml_info_with_stats.crc32 == xml_info.crc32
+    assert [(stats.name, stats.format, stats.sector_count, stats.data_size) for stats in track_stats] == [
+        ('00.0', 'IBM_MFM', 2, 1024), ('00.1', 'IBM_FM', 1, 256)
+    ]
+    assert xml_info_with_stats.short_tracks == ['00.1']
+
+
+def test_parse_generic_xml_missing_field(tmp_path):
+    xml_path = tmp_path / 'GENERIC_XML.xml'
+    xml_path.write_bytes(GENERIC_XML.replace(b'<rpm>300</rpm>', b''))
+    with pytest.raises(ValueError, match='rpm'):
+        parse_generic_xml(xml_path)
+
+
+@pytest.fixture
+def run_main(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyhxcfe.EventStore, 'push', lambda self: None)
+    hxcfe_binary_path = tmp_path / 'hxcfe'
+    hxcfe_binary_path.write_bytes(b'')
+
+    def run_main(disk_captures_dir: Path, *args: str):
+        return CliRunner().invoke(pyhxcfe.main, [
+            str(disk_captures_dir), '--hxcfe-binary-path', str(hxcfe_binary_path), '--workers', '2',
+            '--image-workers', '0', '--output', str(tmp_path / 'summary.html'), *args
+        ], catch_exceptions=False)
+
+    return run_main
+
+
+def test_watch_retries_captures_failing_in_first_batch(capture, run_main, monkeypatch):
+    def convert_leased_capture(*args):
+        raise OSError('broken upload')
+
+    retried: list[Path] = []
+
+    def wait(self):
+        retried.extend(self.retry_at)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(pyhxcfe, 'convert_leased_capture', convert_leased_capture)
+    monkeypatch.setattr(pyhxcfe.CaptureWatcher, 'wait', wait)
+    result = run_main(capture.parent.parent, '--watch', '--settle-seconds', '0')
+    assert result.exit_code == 0
+    assert 'Stopped watching' in result.output
+    assert retried == [capture]
+
+
+def test_worker_does_not_summarize(capture, run_main, monkeypatch):
+    def summary_pipeline(*args, **kwargs):
+        raise AssertionError('workers leave the summary to the main node')
+
+    converted: list[Path] = []
+
+    def convert_leased_capture(lease_keeper, pyhxcfe_run_id, hxcfe_binary_path, floppy_subdir, *args):
+        converted.append(floppy_subdir)
+        return []
+
+    monkeypatch.setattr(pyhxcfe, 'SummaryPipeline', summary_pipeline)
+    monkeypatch.setattr(pyhxcfe, 'convert_leased_capture', convert_leased_capture)
+    result = run_main(capture.parent.parent, '--worker')
+    assert result.exit_code == 0
+    assert converted == [capture]
+
+
+def test_estimate_conversion_cost(capture, tmp_path):
+    (capture / 'track00.1.hxcstream').write_bytes(bytes(100))
+    (capture / 'dump.log').write_bytes(bytes(1000))
+    assert estimate_conversion_cost(capture) == 104
+    # A capture removed after it was found is left to its conversion to report
+    assert estimate_conversion_cost(tmp_path / 'collection' / 'disk-0002') == 0
+
+
+def test_largest_captures_are_converted_first(tmp_path, monkeypatch):
+    sizes = {'disk-0001': 10, 'disk-0002': 30, 'disk-0003': 20}
+    for name, size in sizes.items():
+        floppy_subdir = tmp_path / 'collection' / name
+        floppy_subdir.mkdir(parents=True)
+        (floppy_subdir / 'track00.0.hxcstream').write_bytes(bytes(size))
+
+    converted: list[str] = []
+
+    def convert_leased_capture(lease_keeper, pyhxcfe_run_id, hxcfe_binary_path, floppy_subdir, *args):
+        converted.append(floppy_subdir.name)
+        return []
+
+    monkeypatch.setattr(pyhxcfe, 'convert_leased_capture', convert_leased_capture)
+    plans = {tmp_path / 'collection' / name: ConversionPlan(formats=FORMATS, replace=True) for name in sizes}
+    run_conversions(PyHXCFERunId(uuid.uuid4()), Path('hxcfe'), FINGERPRINT, plans, workers=1, raw_from_imd=False,
+                    desc='convert')
+    assert converted == ['disk-0002', 'disk-0003', 'disk-0001']
+
+
+def test_auto_workers():
+    assert 1 <= pyhxcfe.get_auto_workers() <= (os.process_cpu_count() or 1)
+
+
+def test_workers_option(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyhxcfe, 'get_auto_workers', lambda: 3)
+    hxcfe_binary_path = tmp_path / 'hxcfe'
+    hxcfe_binary_path.write_bytes(b'')
+
+    def parse(workers: str) -> int:
+        args = [str(tmp_path), '--hxcfe-binary-path', str(hxcfe_binary_path), '--workers', workers]
+        return pyhxcfe.main.make_context('pyhxcfe', args).params['workers']
+
+    assert parse('auto') == 3
+    assert parse('5') == 5
+    for value in ('0', 'many'):
+        with pytest.raises(click.BadParameter):
+            parse(value)
+
+
+def test_paginate_summaries():
+    rows = [SimpleNamespace(floppy_subdir=Path(collection) / f'disk-{i:04}_parsed')
+            for collection, count in [('hh1', 3), ('hh2', 1)] for i in range(count)]
+    output_file = Path('summary.html')
+
+    def describe(pages):
+        return [(page.title, page.file_name, page.floppy_count, page.first_name, page.last_name) for page in pages]
+
+    assert describe(paginate_summaries(rows, output_file, page_size=2, split_by_collection=True)) == [
+        ('hh1, page 1 of 2', 'summary_hh1_0001.html', 2, 'disk-0000_parsed', 'disk-0001_parsed'),
+        ('hh1, page 2 of 2', 'summary_hh1_0002.html', 1, 'disk-0002_parsed', 'disk-0002_parsed'),
+        ('hh2', 'summary_hh2.html', 1, 'disk-0000_parsed', 'disk-0000_parsed'),
+    ]
+    assert describe(paginate_summaries(rows, output_file, page_size=3)) == [
+        ('page 1 of 2', 'summary_0001.html', 3, 'disk-0000_parsed', 'disk-0002_parsed'),
+        ('page 2 of 2', 'summary_0002.html', 1, 'disk-0000_parsed', 'disk-0000_parsed'),
+    ]
+    assert describe(paginate_summaries([], output_file, page_size=3)) == [('', 'summary.html', 0, '', '')]
+
+
+def make_converted_capture(disk_captures_dir: Path, name: str) -> Path:
+    parsed_dir = disk_captures_dir / 'collection' / f'{name}_parsed'
+    parsed_dir.mkdir(parents=True)
+    (parsed_dir / 'GENERIC_XML.xml').write_bytes(GENERIC_XML)
+    (parsed_dir / 'IMD_IMG.imd').write_bytes(b'IMD 1.18\x1a')
+    floppy_subdir = parsed_dir.with_name(name)
+    floppy_subdir.mkdir()
+    (floppy_subdir / 'track00.0.hxcstream').write_bytes(b'CHKH')
+    return parsed_dir
+
+
+def test_summary_pipeline(tmp_path):
+    parsed_dirs = [make_converted_capture(tmp_path, f'2025-10-01_16-52-50_sanqui_hh1_35fd4-{i:04}') for i in (2, 1)]
+    broken_dir = make_converted_capture(tmp_path, '2025-10-01_16-52-50_sanqui_hh1_35fd4-0003')
+    (broken_dir / 'GENERIC_XML.xml').unlink()
+
+    with SummaryPipeline(PyHXCFERunId(uuid.uuid4()), tmp_path, workers=2, use_summary_cache=False) as pipeline:
+        for parsed_dir in parsed_dirs + [broken_dir]:
+            pipeline.submit(parsed_dir)
+        rows = pipeline.collect()
+
+    # Sorted, and a capture which fails to summarize is left out
+    assert [row.floppy_subdir for row in rows] == sorted(parsed_dirs)
+    assert [row.summary_event.name_info.dump_index for row in rows] == [1, 2]
+    assert rows[0].summary_event.xml_info.short_tracks == ['00.1']
+    assert rows[0].image_files == ['FLUX_STREAM_THUMB.png', 'FLUX_DISK_THUMB.png']
+
+
+def test_summary_pipeline_uses_cache(tmp_path, capsys):
+    parsed_dir = make_converted_capture(tmp_path, '2025-10-01_16-52-50_sanqui_hh1_35fd4-0001')
+    run_id = PyHXCFERunId(uuid.uuid4())
+
+    with SummaryPipeline(run_id, tmp_path, workers=1) as pipeline:
+        pipeline.submit(parsed_dir)
+        parsed_row, = pipeline.collect()
+    assert 'Summary cache: 0 cached, 1 parsed.' in capsys.readouterr().out
+
+    with SummaryPipeline(run_id, tmp_path, workers=1) as pipeline:
+        pipeline.submit(parsed_dir)
+        cached_row, = pipeline.collect()
+    assert 'Summary cache: 1 cached, 0 parsed.' in capsys.readouterr().out
+    assert cached_row.summary_event.xml_info == parsed_row.summary_event.xml_info
+    assert cached_row.summary_event.flux_info == parsed_row.summary_event.flux_info
+
+    # Changed outputs are parsed again
+    (parsed_dir / 'GENERIC_XML.xml').write_bytes(GENERIC_XML.replace(b'<rpm>300</rpm>', b'<rpm>360</rpm>'))
+    with SummaryPipeline(run_id, tmp_path, workers=1) as pipeline:
+        pipeline.submit(parsed_dir)
+        changed_row, = pipeline.collect()
+    assert 'Summary cache: 0 cached, 1 parsed.' in capsys.readouterr().out
+    assert changed_row.summary_event.xml_info.rpm == 360
+
+
+def write_current_conversion(floppy_subdir: Path, formats: list[str]) -> Path:
+    parsed_dir = floppy_subdir.with_name(floppy_subdir.name + '_parsed')
+    parsed_dir.mkdir()
+    write_manifest(parsed_dir, ConversionManifest(
+        inputs=get_capture_inputs(floppy_subdir), hxcfe_fingerprint=FINGERPRINT, formats=formats
+    ))
+    return parsed_dir
+
+
+def test_plan_conversion(capture):
+    formats = [('GENERIC_XML', 'xml'), ('IMD_IMG', 'imd')]
+    write_current_conversion(capture, ['GENERIC_XML', 'IMD_IMG', 'HXC_HFE'])
+    assert plan_conversion(capture, FINGERPRINT, formats) is None
+
+    # A new hxcfe build outdates every output, including formats which were not requested again
+    plan = plan_conversion(capture, 'new-hxcfe', formats)
+    assert plan is not None and plan.replace
+    assert plan.formats == formats + [('HXC_HFE', 'hfe')]
+
+    (capture / 'track00.0.hxcstream').write_bytes(b'CHKH changed')
+    plan = plan_conversion(capture, FINGERPRINT, formats)
+    assert plan is not None and plan.replace
+    assert plan.formats == formats + [('HXC_HFE', 'hfe')]
+
+
+def test_plan_conversion_without_manifest(capture):
+    parsed_dir = capture.with_name(capture.name + '_parsed')
+    parsed_dir.mkdir()
+    (parsed_dir / 'GENERIC_XML.xml').write_bytes(GENERIC_XML)
+    assert plan_conversion(capture, FINGERPRINT, [('GENERIC_XML', 'xml')]) is None
+    plan = plan_conversion(capture, FINGERPRINT, [('GENERIC_XML', 'xml'), ('IMD_IMG', 'imd')])
+    assert plan is not None and not plan.replace
+    assert plan.formats == [('IMD_IMG', 'imd')]
+
+
+@pytest.fixture
+def fake_hxcfe(tmp_path) -> Path:
+    """An hxcfe which writes the name of the run into every output."""
+    hxcfe_binary_path = tmp_path / 'bin' / 'hxcfe'
+    hxcfe_binary_path.parent.mkdir()
+    hxcfe_binary_path.write_text(
+        '#!/bin/sh\n'
+        'for arg; do case "$arg" in -foutput:*) echo "$RUN" > "${arg#-foutput:}";; esac; done\n'
+        'echo "$RUN"\n'
+    )
+    hxcfe_binary_path.chmod(0o755)
+    return hxcfe_binary_path
+
+
+def test_convert_merges_missing_formats(capture, fake_hxcfe, monkeypatch):
+    parsed_dir = capture.with_name(capture.name + '_parsed')
+    run_id = PyHXCFERunId(uuid.uuid4())
+
+    monkeypatch.setenv('RUN', 'first')
+    convert_disk_capture_directory(run_id, fake_hxcfe, capture, FINGERPRINT,
+                                   [('GENERIC_XML', 'xml'), ('IMD_IMG', 'imd')], replace=True)
+    xml_inode = os.stat(parsed_dir / 'GENERIC_XML.xml').st_ino
+
+    monkeypatch.setenv('RUN', 'second')
+    convert_disk_capture_directory(run_id, fake_hxcfe, capture, FINGERPRINT, [('RAW_IMG', 'img')], replace=False)
+
+    # Only the missing format was converted, the others are left in place
+    assert (parsed_dir / 'RAW_IMG.img').read_text() == 'second\n'
+    assert (parsed_dir / 'GENERIC_XML.xml').read_text() == 'first\n'
+    assert os.stat(parsed_dir / 'GENERIC_XML.xml').st_ino == xml_inode
+    assert (parsed_dir / 'stdout.txt').read_text() == 'first\nsecond\n'
+    manifest = read_manifest(parsed_dir)
+    assert manifest is not None and manifest.formats == ['GENERIC_XML', 'IMD_IMG', 'RAW_IMG']
+    assert plan_conversion(capture, FINGERPRINT, [('GENERIC_XML', 'xml'), ('RAW_IMG', 'img')]) is None
+    assert not capture.with_name(capture.name + '_parsed_wip').exists()
+
+
+def test_convert_replaces_outdated_outputs(capture, fake_hxcfe, monkeypatch):
+    parsed_dir = capture.with_name(capture.name + '_parsed')
+    run_id = PyHXCFERunId(uuid.uuid4())
+
+    monkeypatch.setenv('RUN', 'first')
+    convert_disk_capture_directory(run_id, fake_hxcfe, capture, FINGERPRINT,
+                                   [('GENERIC_XML', 'xml'), ('IMD_IMG', 'imd')], replace=True)
+
+    monkeypatch.setenv('RUN', 'second')
+    convert_disk_capture_directory(run_id, fake_hxcfe, capture, 'new-hxcfe', [('GENERIC_XML', 'xml')], replace=True)
+
+    assert sorted(path.name for path in parsed_dir.iterdir()) == [
+        'GENERIC_XML.xml', 'conversion_manifest.json', 'stderr.txt', 'stdout.txt'
+    ]
+    assert (parsed_dir / 'GENERIC_XML.xml').read_text() == 'second\n'
+    manifest = read_manifest(parsed_dir)
+    assert manifest is not None and (manifest.hxcfe_fingerprint, manifest.formats) == ('new-hxcfe', ['GENERIC_XML'])
+    assert not capture.with_name(capture.name + '_parsed_old').exists()
+
+
+def test_image_lane(capture, monkeypatch, capsys):
+    converted: list[tuple[Path, list[tuple[str, str]], int]] = []
+
+    def convert_leased_capture(lease_keeper, pyhxcfe_run_id, hxcfe_binary_path, floppy_subdir, hxcfe_fingerprint,
+                               plan, raw_from_imd, niceness=0):
+        converted.append((floppy_subdir, plan.formats, niceness))
+        return []
+
+    monkeypatch.setattr(pyhxcfe, 'convert_leased_capture', convert_leased_capture)
+    fast_plans, image_plans = pyhxcfe.split_conversion_plans({capture: ConversionPlan(formats=FORMATS, replace=True)})
+    assert ('PNG_IMAGE', 'png') not in fast_plans[capture].formats
+    assert image_plans[capture].formats == [('PNG_IMAGE', 'png')]
+    # The image lane is merged into the output of the fast lane
+    assert not image_plans[capture].replace
+
+    event_store = pyhxcfe.EventStore(namespace='hhfloppy', app='pyhxcfe')
+    run_id = PyHXCFERunId(uuid.uuid4())
+    pyhxcfe.run_image_conversions(run_id, event_store, Path('hxcfe'), FINGERPRINT, image_plans, image_workers=0,
+                                  raw_from_imd=False)
+    assert converted == []
+    assert 'Skipping images for 1 directories' in capsys.readouterr().out
+
+    pyhxcfe.run_image_conversions(run_id, event_store, Path('hxcfe'), FINGERPRINT, image_plans, image_workers=1,
+                                  raw_from_imd=False)
+    assert converted == [(capture, [('PNG_IMAGE', 'png')], pyhxcfe.IMAGE_NICENESS)]
+
+
+def test_summary_pipeline_caches_uncollected_summaries(tmp_path, capsys):
+    parsed_dir = make_converted_capture(tmp_path, '2025-10-01_16-52-50_sanqui_hh1_35fd4-0001')
+    run_id = PyHXCFERunId(uuid.uuid4())
+
+    # A conversion failing before the summaries are collected
+    with pytest.raises(OSError):
+        with SummaryPipeline(run_id, tmp_path, workers=1) as pipeline:
+            pipeline.submit(parsed_dir)
+            pipeline.pending[parsed_dir][2].result()
+            raise OSError('conversion failed')
+
+    with SummaryPipeline(run_id, tmp_path, workers=1) as pipeline:
+        pipeline.submit(parsed_dir)
+        pipeline.collect()
+    assert 'Summary cache: 1 cached, 0 parsed.' in capsys.readouterr().out
+
+
+def test_converted_captures_are_passed_on_right_away(tmp_path, monkeypatch):
+    floppy_subdirs = [tmp_path / 'collection' / f'disk-{i:04}' for i in range(3)]
+    for floppy_subdir in floppy_subdirs:
+        floppy_subdir.mkdir(parents=True)
+    # Converted before, but now leased by another node
+    floppy_subdirs[2].with_name('disk-0002_parsed').mkdir()
+
+    events: list[str] = []
+
+    def convert_leased_capture(lease_keeper, pyhxcfe_run_id, hxcfe_binary_path, floppy_subdir, *args):
+        if floppy_subdir.name == 'disk-0002':
+            return None
+        events.append(f'converted {floppy_subdir.name}')
+        return []
+
+    monkeypatch.setattr(pyhxcfe, 'convert_leased_capture', convert_leased_capture)
+    plans = {floppy_subdir: ConversionPlan(formats=FORMATS, replace=True) for floppy_subdir in floppy_subdirs}
+    run_conversions(PyHXCFERunId(uuid.uuid4()), Path('hxcfe'), FINGERPRINT, plans, workers=1, raw_from_imd=False,
+                    desc='convert', on_converted=lambda floppy_subdir: events.append(f'summarize {floppy_subdir.name}'))
+    assert sorted(events) == [
+        'converted disk-0000', 'converted disk-0001', 'summarize disk-0000', 'summarize disk-0001',
+        'summarize disk-0002'
+    ]
+    for name in ('disk-0000', 'disk-0001'):
+        assert events.index(f'summarize {name}') > events.index(f'converted {name}')
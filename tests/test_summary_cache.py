@@ -0,0 +1,68 @@
+import os
+import sqlite3
+
+from event.datatypes import FloppyInfoFromFlux, FloppyInfoFromIMD, FloppyInfoFromXML
+from summary_cache import SUMMARY_CACHE_SCHEMA_VERSION, SummaryCache, get_file_signature
+
+XML_INFO = FloppyInfoFromXML(
+    file_size=737280, number_of_tracks=80, number_of_sides=2, format='IBM_MFM', sector_per_track=9,
+    sector_size=512, bitrate=250000, rpm=300, crc32=0xDEADBEEF, short_tracks=['79.1']
+)
+IMD_INFO = FloppyInfoFromIMD(parsing_success=True, tracks=160, modes=['250kbps MFM'], error_count=0,
+                             parsing_errors=None)
+FLUX_INFO = FloppyInfoFromFlux(encoding='MFM', bitrate_kbps=250, formatted_tracks=160, blank_tracks=0, sides=2,
+                               quality=0.9, weak_tracks=[], damaged_tracks=[])
+
+
+def test_get_file_signature(tmp_path):
+    paths = [tmp_path / 'GENERIC_XML.xml', tmp_path / 'IMD_IMG.imd']
+    assert get_file_signature(paths) is None
+    for path in paths:
+        path.write_bytes(b'data')
+    signature = get_file_signature(paths)
+    assert signature is not None
+
+    os.utime(paths[1], ns=(0, 0))
+    assert get_file_signature(paths) != signature
+
+
+def test_round_trip(tmp_path):
+    cache = SummaryCache(tmp_path / 'cache.sqlite3', parser_version=1)
+    assert cache.get('hh1/disk-0001_parsed', 'signature') is None
+    cache.put('hh1/disk-0001_parsed', 'signature', XML_INFO, IMD_INFO, FLUX_INFO)
+    cache.put('hh1/disk-0002_parsed', 'signature', XML_INFO, IMD_INFO, None)
+    cache.close()
+
+    cache = SummaryCache(tmp_path / 'cache.sqlite3', parser_version=1)
+    assert cache.get('hh1/disk-0001_parsed', 'signature') == (XML_INFO, IMD_INFO, FLUX_INFO)
+    assert cache.get('hh1/disk-0002_parsed', 'signature') == (XML_INFO, IMD_INFO, None)
+    cache.close()
+
+
+def test_invalidation(tmp_path):
+    cache = SummaryCache(tmp_path / 'cache.sqlite3', parser_version=1)
+    cache.put('hh1/disk-0001_parsed', 'signature', XML_INFO, IMD_INFO, FLUX_INFO)
+    # Changed outputs
+    assert cache.get('hh1/disk-0001_parsed', 'changed') is None
+    cache.close()
+
+    # Changed parser
+    cache = SummaryCache(tmp_path / 'cache.sqlite3', parser_version=2)
+    assert cache.get('hh1/disk-0001_parsed', 'signature') is None
+    cache.put('hh1/disk-0001_parsed', 'signature', XML_INFO, IMD_INFO, FLUX_INFO)
+    assert cache.get('hh1/disk-0001_parsed', 'signature') == (XML_INFO, IMD_INFO, FLUX_INFO)
+    cache.close()
+
+
+def test_old_schema_is_dropped(tmp_path):
+    connection = sqlite3.connect(tmp_path / 'cache.sqlite3')
+    connection.execute("CREATE TABLE summary_cache (capture_directory TEXT PRIMARY KEY, xml_info BLOB)")
+    connection.execute(f"PRAGMA user_version = {SUMMARY_CACHE_SCHEMA_VERSION - 1}")
+    connection.commit()
+    connection.close()
+
+    cache = SummaryCache(tmp_path / 'cache.sqlite3', parser_version=1)
+    assert cache.get('hh1/disk-0001_parsed', 'signature') is None
+    cache.put('hh1/disk-0001_parsed', 'signature', XML_INFO, IMD_INFO, FLUX_INFO)
+    assert cache.get('hh1/disk-0001_parsed', 'signature') == (XML_INFO, IMD_INFO, FLUX_INFO)
+    cache.close()